@@ -3,27 +3,369 @@ Named Entity Recognition Web Application
 Real-time entity extraction with beautiful web interface
 """
 
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, g, request, jsonify, render_template_string, stream_with_context
 from flask_cors import CORS
-import spacy
+import os
+import time
 import json
-from collections import defaultdict, Counter
+from collections import defaultdict, namedtuple, Counter
 import re
+from ner_core import (
+    CUSTOM_PATTERNS, BatchEngine, DocumentChunker, EntityAggregator, EntityCoverageCheck, IncrementalAnalyzer,
+    ModelCascade, PatternMatcher, PipelineRegistry, Redactor, RelationExtractor, RulePipelines
+)
+from ner_metrics import LENGTH_BUCKETS, MetricsRegistry, resident_memory_bytes
+from ner_cache import build_cache, cache_key
+from ner_jobs import JobQueue, JobStore
+from request_log import RequestLogger
+from entity_index import EntityIndex
+# Aliased: model_version below is the default tier's version string
+from doc_store import model_version as pipeline_version
 
 app = Flask(__name__)
 CORS(app)
 
-# Load spaCy model
+import secrets
 import sys
 import subprocess
+import threading
+import atexit
+from contextlib import contextmanager
+from functools import wraps
 
-# Load spaCy model
-try:
-    nlp = spacy.load('en_core_web_lg')
-except OSError:
-    print("Downloading language model 'en_core_web_lg'...")
-    subprocess.check_call([sys.executable, "-m", "spacy", "download", "en_core_web_lg"])
-    nlp = spacy.load('en_core_web_lg')
+# Prometheus metrics, served at /metrics; with several worker processes set
+# NER_METRICS_DIR so /metrics reports all of them rather than the one that answered
+metrics = MetricsRegistry(directory=os.environ.get('NER_METRICS_DIR') or None)
+request_count = metrics.counter('ner_requests_total', 'HTTP requests by endpoint, method and status')
+requests_in_flight = metrics.gauge('ner_requests_in_flight', 'Requests currently being handled')
+request_latency = metrics.histogram('ner_request_duration_seconds', 'Request latency by endpoint')
+stage_latency = metrics.histogram('ner_stage_duration_seconds', 'Latency of each request stage')
+component_latency = metrics.histogram('ner_component_duration_seconds', 'Latency of each spaCy pipeline component')
+text_length = metrics.histogram('ner_text_length_chars', 'Length of submitted texts', LENGTH_BUCKETS)
+memory_bytes = metrics.gauge('ner_memory_bytes', 'Process and model memory usage')
+cache_requests = metrics.counter('ner_cache_requests_total', 'Response cache lookups by endpoint and result')
+tier_texts = metrics.counter('ner_tier_texts_total', 'Texts processed by requested tier and the tier that answered')
+
+# The spaCy model is loaded lazily (on the first request, or ahead of time through
+# start_model_loading / load_model) so importing this module stays fast
+MODEL_NAME = os.environ.get('NER_MODEL', 'en_core_web_lg')
+MODEL_WAIT_TIMEOUT = float(os.environ.get('NER_MODEL_WAIT_TIMEOUT', 60))
+# After a failed load, requests get 503 straight away until this many seconds have passed
+MODEL_RETRY_SECONDS = float(os.environ.get('NER_MODEL_RETRY_SECONDS', 30))
+
+def parse_model_tiers(spec):
+    """{tier: model} from "fast=en_core_web_sm,accurate=en_core_web_lg" (in the given order)"""
+    tiers = {}
+    for item in (spec or '').split(','):
+        if item.strip():
+            name, sep, model = item.partition('=')
+            if not sep or not name.strip() or not model.strip():
+                raise ValueError(f'Bad NER_MODEL_TIERS entry: {item!r} (expected tier=model)')
+            tiers[name.strip()] = model.strip()
+    return tiers
+
+# Models loaded side by side, selected per request with "model": <tier>. Without
+# NER_MODEL_TIERS, NER_MODEL is the single 'default' tier. The 'cascade' tier (when both
+# NER_CASCADE_TIERS exist) runs the fast model first and escalates doubtful texts. The
+# 'rules' tier skips the models: NER_GAZETTEER phrases plus the custom regex patterns.
+MODEL_TIERS = parse_model_tiers(os.environ.get('NER_MODEL_TIERS')) or {'default': MODEL_NAME}
+RULES_TIER = 'rules'
+GAZETTEER_PATH = os.environ.get('NER_GAZETTEER')
+if RULES_TIER in MODEL_TIERS or 'cascade' in MODEL_TIERS:
+    raise ValueError("'rules' and 'cascade' are reserved tier names")
+CASCADE_TIERS = tuple(name.strip() for name in os.environ.get('NER_CASCADE_TIERS', 'fast,accurate').split(','))
+CASCADE_AVAILABLE = len(CASCADE_TIERS) == 2 and all(name in MODEL_TIERS for name in CASCADE_TIERS)
+CASCADE_MAX_UNCOVERED = float(os.environ.get('NER_CASCADE_MAX_UNCOVERED', 0.2))
+DEFAULT_TIER = os.environ.get('NER_DEFAULT_TIER', next(iter(MODEL_TIERS)))
+if not (DEFAULT_TIER in MODEL_TIERS or DEFAULT_TIER == RULES_TIER or (DEFAULT_TIER == 'cascade' and CASCADE_AVAILABLE)):
+    raise ValueError(f'NER_DEFAULT_TIER {DEFAULT_TIER!r} is not a configured model tier')
+# Reported by /health and /ready: the model(s) behind the default tier
+if DEFAULT_TIER == RULES_TIER:
+    MODEL_NAME = RULES_TIER
+else:
+    MODEL_NAME = MODEL_TIERS.get(DEFAULT_TIER) or '+'.join(MODEL_TIERS[name] for name in CASCADE_TIERS)
+
+ModelTier = namedtuple('ModelTier', 'name pipelines batch_engine version')
+
+tiers = {}
+cascade = None
+# The default tier's objects, used by every endpoint that does not take a "model" option
+nlp = None
+model_version = None
+pipelines = None
+batch_engine = None
+incremental = None
+relation_extractor = None
+
+model_ready = threading.Event()
+model_error = None
+_model_failed_at = None
+_model_lock = threading.Lock()
+_loader_lock = threading.Lock()
+_loader_thread = None
+
+def _load_spacy_model(name):
+    import spacy
+    try:
+        return spacy.load(name)
+    except OSError:
+        print(f"Downloading language model '{name}'...")
+        subprocess.check_call([sys.executable, "-m", "spacy", "download", name])
+        return spacy.load(name)
+
+# Longest text a batch or job accepts (single-text endpoints chunk longer texts instead)
+MAX_TEXT_LENGTH = int(os.environ.get('NER_MAX_TEXT_LENGTH', 100000))
+
+def _batch_engine(loaded, tier_pipelines):
+    # Shared nlp.pipe engine for batch requests (tunable through the environment)
+    return BatchEngine(
+        loaded,
+        pipelines=tier_pipelines,
+        batch_size=int(os.environ.get('NER_BATCH_SIZE', 256)),
+        n_process=int(os.environ.get('NER_N_PROCESS', 1)),
+        max_texts=int(os.environ.get('NER_MAX_BATCH_TEXTS', 10000)),
+        max_text_length=MAX_TEXT_LENGTH
+    )
+
+def load_model():
+    """Load every tier's spaCy model and build the pipelines (blocking; safe to call repeatedly)"""
+    global tiers, cascade, nlp, model_version, pipelines, batch_engine, incremental, relation_extractor, model_error
+    global _model_failed_at
+    
+    with _model_lock:
+        if model_ready.is_set():
+            return
+        
+        try:
+            rss_before_model = resident_memory_bytes()
+            models = {}
+            for model_name in MODEL_TIERS.values():
+                if model_name not in models:
+                    models[model_name] = _load_spacy_model(model_name)
+            memory_bytes.set(resident_memory_bytes() - rss_before_model, kind='model_load_rss')
+            memory_bytes.set(
+                sum(getattr(loaded.vocab.vectors.data, 'nbytes', 0) for loaded in models.values()), kind='model_vectors'
+            )
+            
+            loaded_tiers = {}
+            for tier, model_name in MODEL_TIERS.items():
+                loaded = models[model_name]
+                # Component-trimmed views of the model; each endpoint runs only what it needs
+                tier_pipelines = PipelineRegistry(
+                    loaded,
+                    on_component=lambda name, seconds: component_latency.observe(seconds, component=name)
+                )
+                loaded_tiers[tier] = ModelTier(
+                    tier, tier_pipelines, _batch_engine(loaded, tier_pipelines), pipeline_version(loaded)
+                )
+            
+            loaded_cascade = None
+            if CASCADE_AVAILABLE:
+                fast, accurate = (loaded_tiers[name] for name in CASCADE_TIERS)
+                loaded_cascade = ModelCascade(
+                    fast.pipelines, accurate.pipelines, EntityCoverageCheck(CASCADE_MAX_UNCOVERED),
+                    fast_name=fast.name, accurate_name=accurate.name
+                )
+                loaded_tiers['cascade'] = ModelTier(
+                    'cascade', loaded_cascade, _batch_engine(loaded_cascade.nlp, loaded_cascade),
+                    f'{fast.version}>{accurate.version}:{CASCADE_MAX_UNCOVERED}'
+                )
+            
+            first = models[next(iter(MODEL_TIERS.values()))]
+            rules = RulePipelines(GAZETTEER_PATH, CUSTOM_PATTERNS, lang=first.lang)
+            loaded_tiers[RULES_TIER] = ModelTier(RULES_TIER, rules, _batch_engine(rules.nlp, rules), rules.version)
+            
+            default = loaded_tiers[DEFAULT_TIER]
+            pipelines = default.pipelines
+            batch_engine = default.batch_engine
+            
+            # Per-document sessions for incremental re-analysis of edited texts
+            incremental = IncrementalAnalyzer(
+                pipelines, chunker, max_documents=int(os.environ.get('NER_INCREMENTAL_DOCS', 256))
+            )
+            
+            relation_extractor = RelationExtractor(pipelines)
+            
+            tiers = loaded_tiers
+            cascade = loaded_cascade
+            nlp = pipelines.nlp
+            model_version = default.version
+            model_error = None
+            model_ready.set()
+        except Exception as e:
+            model_error = e
+            _model_failed_at = time.monotonic()
+            raise
+
+def _load_model_in_background():
+    try:
+        load_model()
+    except Exception as e:
+        print(f"Error loading model '{MODEL_NAME}': {e}")
+
+def _retry_in():
+    """Seconds until a failed model load may be retried (0 when it may be retried now)"""
+    if model_error is None or _model_failed_at is None:
+        return 0
+    return max(0, MODEL_RETRY_SECONDS - (time.monotonic() - _model_failed_at))
+
+def start_model_loading():
+    """
+    Start loading the model in a background thread
+    No-op if it is loaded, already loading, or failed less than NER_MODEL_RETRY_SECONDS ago.
+    """
+    global _loader_thread
+    
+    with _loader_lock:
+        if model_ready.is_set() or (_loader_thread is not None and _loader_thread.is_alive()):
+            return
+        if _retry_in() > 0:
+            return
+        _loader_thread = threading.Thread(target=_load_model_in_background, name='model-loader', daemon=True)
+        _loader_thread.start()
+
+def model_status():
+    if model_ready.is_set():
+        return 'ready'
+    if _loader_thread is not None and _loader_thread.is_alive():
+        return 'loading'
+    if model_error is not None:
+        return 'error'
+    return 'not_loaded'
+
+def requires_model(*fields):
+    """
+    Wait (up to NER_MODEL_WAIT_TIMEOUT seconds) for the model, else answer 503
+    fields: JSON body fields of which at least one must be given; checked first, so a bad
+    request gets its 400 without waiting for the model. After a failed load, requests get
+    503 at once until the retry delay has passed.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if fields:
+                data = request.get_json(silent=True)
+                if not isinstance(data, dict) or all(data.get(name) in (None, '') for name in fields):
+                    return jsonify({'error': f'No {fields[0]} provided'}), 400
+            if not model_ready.is_set():
+                start_model_loading()
+                loader = _loader_thread
+                if loader is not None and loader.is_alive():
+                    loader.join(MODEL_WAIT_TIMEOUT)
+                if not model_ready.is_set():
+                    body = {'error': 'Model is not ready yet', 'status': model_status()}
+                    retry_after = 5
+                    if body['status'] == 'error':
+                        body['error'] = f'Model failed to load: {model_error}'
+                        retry_after = max(1, round(_retry_in()))
+                    response = jsonify(body)
+                    response.headers['Retry-After'] = str(retry_after)
+                    return response, 503
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Response cache for repeated texts: NER_CACHE_BACKEND is 'memory', 'sqlite',
+# 'memory,sqlite' or 'none'; the SQLite store lives under database/
+result_cache = build_cache(
+    os.environ.get('NER_CACHE_BACKEND', 'memory'),
+    sqlite_path=os.environ.get('NER_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database', 'ner_cache.db')),
+    max_bytes=int(os.environ.get('NER_CACHE_MAX_BYTES', 64 * 1024 * 1024)),
+    ttl=int(os.environ.get('NER_CACHE_TTL', 86400)) or None
+)
+
+def cached_lookup(endpoint, text, options=None, version=None):
+    """Return (key, cached response body or None); honours Cache-Control: no-cache"""
+    if result_cache is None:
+        return None, None
+    key = cache_key(text, version or model_version, dict(options or {}, endpoint=endpoint))
+    if 'no-cache' in request.headers.get('Cache-Control', ''):
+        cache_requests.inc(endpoint=endpoint, result='bypass')
+        return key, None
+    body = result_cache.get(key)
+    cache_requests.inc(endpoint=endpoint, result='hit' if body is not None else 'miss')
+    return key, body
+
+def select_tier(name=None):
+    """The model tier a request asked for ("model" option), or the default tier"""
+    if name is None:
+        return tiers[DEFAULT_TIER]
+    if name not in tiers:
+        raise ValueError(f"Unknown model tier: {name!r} (available: {', '.join(tiers)})")
+    return tiers[name]
+
+def count_tier(tier, docs):
+    """Record which tier answered each text (a cascade answers from either of its tiers)"""
+    for doc in docs:
+        tier_texts.inc(tier=tier.name, model_tier=doc.user_data.get('model_tier', tier.name))
+
+def entity_spans(tier, text):
+    """
+    (start, end, label) entity spans for one text, and the tier that answered
+    Texts longer than NER_CHUNK_SIZE are parsed in overlapping chunks through nlp.pipe
+    """
+    if len(text) > chunker.max_chars:
+        return chunker.entity_spans(tier.pipelines, text, task='ner'), tier.name
+    doc = tier.pipelines(text, 'ner')
+    count_tier(tier, [doc])
+    spans = [(ent.start_char, ent.end_char, ent.label_) for ent in doc.ents]
+    return spans, doc.user_data.get('model_tier', tier.name)
+
+# Async batch jobs, persisted in the SQLite database under database/
+DATABASE_PATH = os.environ.get('NER_DB_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database', 'ner_logs.db'))
+MAX_JOB_TEXTS = int(os.environ.get('NER_MAX_JOB_TEXTS', 1000000))
+# Largest page of job results per request (?limit=)
+MAX_RESULTS_PAGE = 10000
+
+def _job_engine():
+    load_model()
+    return batch_engine
+
+job_queue = JobQueue(
+    JobStore(DATABASE_PATH),
+    _job_engine,
+    workers=int(os.environ.get('NER_JOB_WORKERS', 1)),
+    chunk_size=int(os.environ.get('NER_JOB_CHUNK_SIZE', 256))
+)
+
+# Offline entity linking ("link": true on /api/extract) when a knowledge-base alias table is configured
+entity_linker = None
+if os.environ.get('NER_KB_PATH'):
+    from entity_linker import EntityLinker
+    entity_linker = EntityLinker.from_path(os.environ['NER_KB_PATH'], url_template=os.environ.get('NER_KB_URL_TEMPLATE'))
+
+# Corpus-level inverted index of entities (documents added through /api/index)
+entity_index = EntityIndex(
+    os.environ.get('NER_INDEX_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database', 'ner_index.db'))
+)
+
+# Audit log of /api/extract and /api/batch requests, written off the request path
+LOGGED_ENDPOINTS = {'/api/extract', '/api/batch'}
+request_logger = RequestLogger(DATABASE_PATH) if os.environ.get('NER_REQUEST_LOG', '1') != '0' else None
+if request_logger is not None:
+    atexit.register(request_logger.flush)
+
+def record_stage(endpoint, stage, seconds):
+    stage_latency.observe(seconds, endpoint=endpoint, stage=stage)
+    g.setdefault('stages', {})[stage] = round(seconds * 1000, 3)
+
+@contextmanager
+def stage_timer(endpoint, stage):
+    """Time a request stage for both /metrics and the request log"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(endpoint, stage, time.perf_counter() - start)
+
+# Long texts are parsed in overlapping chunks and merged back to global offsets
+chunker = DocumentChunker(
+    max_chars=int(os.environ.get('NER_CHUNK_SIZE', 100000)),
+    overlap=int(os.environ.get('NER_CHUNK_OVERLAP', 1000))
+)
+
+# Redacts model entities plus EMAIL/SSN/CREDIT_CARD pattern matches in one pass
+redactor = Redactor(PatternMatcher(CUSTOM_PATTERNS))
 
 # HTML Template
 HTML_TEMPLATE = """
@@ -642,6 +984,10 @@ HTML_TEMPLATE = """
             document.getElementById('results').style.display = 'none';
         }
         
+        // The server keeps the last analyzed version of this document and re-parses only edited paragraphs
+        const documentId = 'doc-' + Date.now().toString(36) + Math.random().toString(36).slice(2);
+        let session = null;
+        
         async function extractEntities() {
             const text = document.getElementById('inputText').value.trim();
             
@@ -660,10 +1006,13 @@ HTML_TEMPLATE = """
                 const response = await fetch('/api/extract', {
                     method: 'POST',
                     headers: { 'Content-Type': 'application/json' },
-                    body: JSON.stringify({ text: text })
+                    body: JSON.stringify({ text: text, doc_id: documentId, session: session })
                 });
                 
                 const data = await response.json();
+                if (data.incremental) {
+                    session = data.incremental.session;
+                }
                 displayResults(data);
             } catch (error) {
                 alert('Error analyzing text. Please try again.');
@@ -722,108 +1071,508 @@ HTML_TEMPLATE = """
 </html>
 """
 
+# Request instrumentation
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    requests_in_flight.inc()
+
+@app.after_request
+def record_request(response):
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    request_count.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    elapsed = time.perf_counter() - g.request_start
+    request_latency.observe(elapsed, endpoint=endpoint)
+    if request_logger is not None and endpoint in LOGGED_ENDPOINTS:
+        request_logger.log(
+            endpoint=endpoint,
+            method=request.method,
+            status=response.status_code,
+            latency_ms=round(elapsed * 1000, 3),
+            remote_addr=request.remote_addr,
+            user_agent=request.headers.get('User-Agent'),
+            num_texts=g.get('num_texts'),
+            text_length=g.get('text_length'),
+            entity_count=g.get('entity_count'),
+            cache=response.headers.get('X-Cache'),
+            stages=g.get('stages')
+        )
+    return response
+
+@app.teardown_request
+def finish_request(exc=None):
+    requests_in_flight.dec()
+
 # API Routes
 @app.route('/')
 def home():
     return render_template_string(HTML_TEMPLATE)
 
 @app.route('/api/extract', methods=['POST'])
+@requires_model('text', 'edits')
 def extract_entities():
+    """
+    Extract entities from text
+    Optional incremental mode: pass a doc_id with either the full text or a list of edits
+    ({start, end, text} against base_version); only the changed paragraphs are re-parsed.
+    Documents live in the session returned by the first request (incremental.session), which
+    later requests must send back, so one client can't read another's documents by doc_id.
+    "model" picks a model tier (see NER_MODEL_TIERS); incremental mode uses the default tier.
+    """
     try:
-        data = request.get_json()
+        with stage_timer('extract', 'parse_json'):
+            data = request.get_json()
         text = data.get('text', '')
+        doc_id = data.get('doc_id')
+        edits = data.get('edits')
         
-        if not text:
+        if not text and not (doc_id and edits is not None):
+            return jsonify({'error': 'No text provided'}), 400
+        
+        link = bool(data.get('link')) and entity_linker is not None
+        tier = select_tier(data.get('model'))
+        model_tier = tier.name
+        result_key = None
+        info = None
+        if doc_id is not None:
+            if tier.name != DEFAULT_TIER:
+                raise ValueError(f'Incremental mode always uses the default model tier ({DEFAULT_TIER})')
+            session = data.get('session')
+            if not isinstance(session, str) or not session:
+                session = secrets.token_urlsafe(16)
+            # Incremental mode always updates the session, so it bypasses the response cache
+            with stage_timer('extract', 'nlp'):
+                text, entities, info = incremental.update(
+                    f'{session}/{doc_id}', text=text or None, edits=edits, base_version=data.get('base_version')
+                )
+            info = dict(info, doc_id=str(doc_id), session=session)
+        else:
+            result_key, cached = cached_lookup('extract', text, {'link': True} if link else None, tier.version)
+            if cached is not None:
+                text_length.observe(len(text), endpoint='extract')
+                g.num_texts, g.text_length = 1, len(text)
+                return Response(cached, mimetype='application/json', headers={'X-Cache': 'HIT'})
+            
+            # Process with spaCy (entity recognition only; long texts in chunks)
+            with stage_timer('extract', 'nlp'):
+                spans, model_tier = entity_spans(tier, text)
+            entities = [
+                {'text': text[start:end], 'label': label, 'start': start, 'end': end}
+                for start, end, label in spans
+            ]
+        text_length.observe(len(text), endpoint='extract')
+        g.num_texts, g.text_length = 1, len(text)
+        if link:
+            with stage_timer('extract', 'link'):
+                entity_linker.link(entities)
+        
+        # Group entities (de-duplicated, in first-seen order) in one pass
+        collect_start = time.perf_counter()
+        aggregator = EntityAggregator(keep_occurrences=False).add_entities(entities)
+        record_stage('extract', 'collect', time.perf_counter() - collect_start)
+        g.entity_count = len(entities)
+        
+        # Create highlighted HTML
+        with stage_timer('extract', 'highlight'):
+            highlighted_html = create_highlighted_text(text, entities)
+        
+        with stage_timer('extract', 'serialize'):
+            result = {
+                'total_entities': len(entities),
+                'entities': entities,
+                'entities_by_type': aggregator.entities_by_type(unique=True),
+                'people': aggregator.unique('PERSON'),
+                'organizations': aggregator.unique('ORG'),
+                'locations': aggregator.unique('GPE', 'LOC'),
+                'dates': aggregator.unique('DATE'),
+                'highlighted_html': highlighted_html,
+                'model': model_tier
+            }
+            if info is not None:
+                result['incremental'] = info
+            response = jsonify(result)
+        
+        if result_key is not None:
+            result_cache.set(result_key, response.get_data())
+            response.headers['X-Cache'] = 'MISS'
+        return response
+    
+    except KeyError:
+        # Unknown document or session, or stale base_version: the client should resend the full text
+        return jsonify({'error': 'Document not found in this session or not at base_version; send the full text'}), 409
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/batch', methods=['POST'])
+@requires_model('texts')
+def batch_extract():
+    try:
+        with stage_timer('batch', 'parse_json'):
+            data = request.get_json()
+        texts = data.get('texts', [])
+        
+        if not texts:
+            return jsonify({'error': 'No texts provided'}), 400
+        
+        tier = select_tier(data.get('model'))
+        tier.batch_engine.validate(texts)
+        for text in texts:
+            text_length.observe(len(text), endpoint='batch')
+        g.num_texts, g.text_length = len(texts), sum(len(text) for text in texts)
+        
+        # "columnar" returns label/text tables plus parallel offset arrays instead of one dict per entity
+        if data.get('format') == 'columnar':
+            with stage_timer('batch', 'nlp'):
+                table = tier.batch_engine.process_table(texts)
+            g.entity_count = len(table)
+            with stage_timer('batch', 'serialize'):
+                return jsonify({'format': 'columnar', 'entities': table.to_columnar()})
+        
+        results = []
+        # "summary": true adds corpus-level analyze_text statistics, aggregated as results come in
+        aggregator = EntityAggregator(keep_occurrences=False) if data.get('summary') else None
+        with stage_timer('batch', 'nlp'):
+            for text, doc in zip(texts, tier.batch_engine.docs(texts)):
+                count_tier(tier, [doc])
+                entities = BatchEngine.doc_entities(doc)
+                results.append({
+                    'text': text[:100] + '...',
+                    'entities': entities,
+                    'model': doc.user_data.get('model_tier', tier.name)
+                })
+                if aggregator is not None:
+                    aggregator.add_entities(entities)
+        g.entity_count = sum(len(result['entities']) for result in results)
+        
+        with stage_timer('batch', 'serialize'):
+            body = {'results': results}
+            if aggregator is not None:
+                body['summary'] = aggregator.summary()
+            return jsonify(body)
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/batch/stream', methods=['POST'])
+@requires_model()
+def stream_extract():
+    """
+    Streaming bulk extraction
+    Request body: newline-delimited JSON, one {"id": ..., "text": ...} object (or bare string) per line
+    Response: newline-delimited JSON, one result per input line, flushed after every batch
+    ?model=<tier> picks a model tier for the whole stream
+    """
+    try:
+        tier = select_tier(request.args.get('model'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    engine = tier.batch_engine
+    
+    def read_records(stream):
+        for index, line in enumerate(stream):
+            line = line.strip()
+            if not line:
+                continue
+            context = {'index': index}
+            try:
+                record = json.loads(line)
+                if isinstance(record, dict):
+                    if 'id' in record:
+                        context['id'] = record['id']
+                    text = record.get('text')
+                else:
+                    text = record
+                if not isinstance(text, str):
+                    raise ValueError('text must be a string')
+                if engine.max_text_length and len(text) > engine.max_text_length:
+                    raise ValueError(f'text is too long: {len(text)} characters '
+                                     f'(limit {engine.max_text_length})')
+            except ValueError as e:
+                # Bad lines are reported in place so output order still matches input order
+                context['error'] = str(e)
+                text = ''
+            yield text, context
+    
+    def generate(stream):
+        lines = []
+        for entities, context in engine.process_tuples(read_records(stream)):
+            if 'error' not in context:
+                context['entities'] = entities
+            lines.append(json.dumps(context))
+            if len(lines) >= engine.batch_size:
+                yield '\n'.join(lines) + '\n'
+                lines = []
+        if lines:
+            yield '\n'.join(lines) + '\n'
+    
+    return Response(stream_with_context(generate(request.stream)), mimetype='application/x-ndjson')
+
+@app.route('/api/relations', methods=['POST'])
+@requires_model('text', 'texts')
+def extract_relations():
+    """
+    Entity-anchored subject-relation-object triples from the dependency parse
+    Request body: {"text": ...} or {"texts": [...]} (parsed together with nlp.pipe)
+    """
+    try:
+        data = request.get_json()
+        texts = data.get('texts')
+        single = texts is None
+        if single:
+            texts = [data.get('text', '')]
+        
+        if not any(texts):
             return jsonify({'error': 'No text provided'}), 400
+        batch_engine.validate(texts)
         
-        # Process with spaCy
-        doc = nlp(text)
+        with stage_latency.time(endpoint='relations', stage='nlp'):
+            results = list(relation_extractor.process(texts, batch_size=batch_engine.batch_size))
+        
+        if single:
+            return jsonify({'relations': results[0], 'total_relations': len(results[0])})
+        return jsonify({'results': [{'relations': relations} for relations in results]})
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/anonymize', methods=['POST'])
+@requires_model('text')
+def anonymize():
+    """
+    Redact entities and sensitive patterns
+    Optional fields: entity_types, pattern_types (label lists), model (tier) and stream
+    (return chunked text/plain)
+    """
+    try:
+        data = request.get_json()
+        text = data.get('text', '')
         
-        # Extract entities
-        entities = []
-        entities_by_type = defaultdict(list)
+        if not text:
+            return jsonify({'error': 'No text provided'}), 400
+        if not isinstance(text, str):
+            return jsonify({'error': 'text must be a string'}), 400
         
-        for ent in doc.ents:
-            entities.append({
-                'text': ent.text,
-                'label': ent.label_,
-                'start': ent.start_char,
-                'end': ent.end_char
-            })
-            entities_by_type[ent.label_].append(ent.text)
+        entity_types = data.get('entity_types')
+        pattern_types = data.get('pattern_types')
+        for field, labels in (('entity_types', entity_types), ('pattern_types', pattern_types)):
+            if labels is not None and not (isinstance(labels, list) and all(isinstance(label, str) for label in labels)):
+                return jsonify({'error': f'{field} must be a list of labels'}), 400
         
-        # Remove duplicates
-        for key in entities_by_type:
-            entities_by_type[key] = list(set(entities_by_type[key]))
+        entities, model_tier = entity_spans(select_tier(data.get('model')), text)
         
-        # Get specific types
-        people = [ent.text for ent in doc.ents if ent.label_ == 'PERSON']
-        organizations = [ent.text for ent in doc.ents if ent.label_ == 'ORG']
-        locations = [ent.text for ent in doc.ents if ent.label_ in ['GPE', 'LOC']]
-        dates = [ent.text for ent in doc.ents if ent.label_ == 'DATE']
+        spans = redactor.spans(text, entities, entity_types, pattern_types)
         
-        # Create highlighted HTML
-        highlighted_html = create_highlighted_text(text, doc)
+        if data.get('stream'):
+            return Response(redactor.render(text, spans), mimetype='text/plain')
         
         return jsonify({
-            'total_entities': len(entities),
-            'entities': entities,
-            'entities_by_type': dict(entities_by_type),
-            'people': list(set(people)),
-            'organizations': list(set(organizations)),
-            'locations': list(set(locations)),
-            'dates': list(set(dates)),
-            'highlighted_html': highlighted_html
+            'anonymized_text': ''.join(redactor.render(text, spans, chunk_size=len(text) + 1)),
+            'redactions': len(spans),
+            'model': model_tier
         })
     
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/batch', methods=['POST'])
-def batch_extract():
+@app.route('/api/jobs', methods=['POST'])
+def submit_job():
+    """Queue a large batch for background processing; returns 202 with the job id"""
     try:
         data = request.get_json()
         texts = data.get('texts', [])
         
         if not texts:
             return jsonify({'error': 'No texts provided'}), 400
-        
-        results = []
-        for text in texts:
-            doc = nlp(text)
-            entities = [{'text': ent.text, 'label': ent.label_} for ent in doc.ents]
-            results.append({'text': text[:100] + '...', 'entities': entities})
-        
-        return jsonify({'results': results})
+        if not isinstance(texts, list) or not all(isinstance(text, str) for text in texts):
+            return jsonify({'error': 'texts must be a list of strings'}), 400
+        if len(texts) > MAX_JOB_TEXTS:
+            return jsonify({'error': f'Too many texts: {len(texts)} (limit {MAX_JOB_TEXTS})'}), 400
+        # Checked here rather than by the worker, which would fail the whole job on one long text
+        for i, text in enumerate(texts):
+            if MAX_TEXT_LENGTH and len(text) > MAX_TEXT_LENGTH:
+                return jsonify({'error': f'texts[{i}] is too long: {len(text)} characters (limit {MAX_TEXT_LENGTH})'}), 400
+        
+        job_id = job_queue.submit(texts)
+        return jsonify({
+            'job_id': job_id,
+            'status': 'queued',
+            'total': len(texts),
+            'status_url': f'/api/jobs/{job_id}',
+            'results_url': f'/api/jobs/{job_id}/results'
+        }), 202
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.status(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job)
+
+@app.route('/api/jobs/<job_id>/results', methods=['GET'])
+def job_results(job_id):
+    """
+    Processed results in input order
+    Query: offset/limit for paging, or format=ndjson to download everything as a stream
+    """
+    job = job_queue.status(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    if request.args.get('format') == 'ndjson':
+        def generate():
+            offset = 0
+            while True:
+                page = job_queue.results(job_id, offset, 1000)
+                if not page:
+                    break
+                yield ''.join(json.dumps({'index': idx, 'entities': entities}) + '\n' for idx, entities in page)
+                offset = page[-1][0] + 1
+        return Response(generate(), mimetype='application/x-ndjson')
+    
+    offset = request.args.get('offset', 0, type=int)
+    limit = request.args.get('limit', 1000, type=int)
+    if offset < 0:
+        return jsonify({'error': 'offset must not be negative'}), 400
+    if not 1 <= limit <= MAX_RESULTS_PAGE:
+        return jsonify({'error': f'limit must be between 1 and {MAX_RESULTS_PAGE}'}), 400
+    page = job_queue.results(job_id, offset, limit)
+    return jsonify({
+        'job_id': job_id,
+        'status': job['status'],
+        'results': [{'index': idx, 'entities': entities} for idx, entities in page],
+        'next_offset': page[-1][0] + 1 if len(page) == limit else None
+    })
+
+@app.route('/api/index', methods=['POST'])
+@requires_model('documents')
+def index_documents():
+    """
+    Extract entities and add documents to the corpus index
+    Request body: {"documents": [{"id": ..., "text": ...}, ...]}; re-adding an id replaces it
+    """
+    try:
+        data = request.get_json()
+        documents = data.get('documents', [])
+        
+        if not documents:
+            return jsonify({'error': 'No documents provided'}), 400
+        if not isinstance(documents, list) or not all(isinstance(doc, dict) and 'id' in doc for doc in documents):
+            return jsonify({'error': 'documents must be a list of {"id", "text"} objects'}), 400
+        texts = [doc.get('text') for doc in documents]
+        batch_engine.validate(texts)
+        
+        pairs = ((doc['text'], doc) for doc in documents)
+        records = [
+            (str(doc['id']), doc['text'], entities)
+            for entities, doc in batch_engine.process_tuples(pairs)
+        ]
+        postings = entity_index.add_many(records)
+        return jsonify({'indexed': len(records), 'postings': postings})
     
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def create_highlighted_text(text, doc):
-    """Create HTML with highlighted entities"""
+@app.route('/api/index', methods=['GET'])
+def index_stats():
+    return jsonify(entity_index.stats())
+
+@app.route('/api/index/search', methods=['GET'])
+def index_search():
+    """
+    Where does an entity appear across the indexed corpus
+    Query: entity (required), label, window (context characters), limit, offset
+    """
+    entity = request.args.get('entity', '')
+    if not entity.strip():
+        return jsonify({'error': 'No entity provided'}), 400
+    label = request.args.get('label')
+    occurrences = entity_index.lookup(
+        entity,
+        label=label,
+        window=request.args.get('window', 50, type=int),
+        limit=request.args.get('limit', 100, type=int),
+        offset=request.args.get('offset', 0, type=int)
+    )
+    return jsonify({'entity': entity, 'label': label, **entity_index.count(entity, label), 'occurrences': occurrences})
+
+@app.route('/api/index/entities', methods=['GET'])
+def index_entities():
+    """Indexed entities starting with ?prefix=, most mentioned first"""
+    return jsonify({'entities': entity_index.search(
+        request.args.get('prefix', ''),
+        label=request.args.get('label'),
+        limit=request.args.get('limit', 20, type=int)
+    )})
+
+@app.route('/api/stats', methods=['GET'])
+def request_stats():
+    """Aggregate usage from the request log; ?hours=N limits it to the last N hours"""
+    if request_logger is None:
+        return jsonify({'error': 'Request logging is disabled'}), 404
+    hours = request.args.get('hours', type=float)
+    since = time.time() - hours * 3600 if hours else None
+    return jsonify(request_logger.stats(since))
+
+def create_highlighted_text(text, entities):
+    """Create HTML with highlighted entities (dicts with text, label, start and end)"""
     html_parts = []
     last_end = 0
     
-    for ent in doc.ents:
+    for ent in entities:
         # Add text before entity
-        html_parts.append(text[last_end:ent.start_char])
+        html_parts.append(text[last_end:ent['start']])
         
         # Add highlighted entity
         html_parts.append(
-            f'<span class="entity-mark entity-{ent.label_}">'
-            f'{ent.text} <small>[{ent.label_}]</small></span>'
+            f'<span class="entity-mark entity-{ent["label"]}">'
+            f'{ent["text"]} <small>[{ent["label"]}]</small></span>'
         )
         
-        last_end = ent.end_char
+        last_end = ent['end']
     
     # Add remaining text
     html_parts.append(text[last_end:])
     
     return ''.join(html_parts)
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    """Prometheus text-format metrics for this process (for every worker with NER_METRICS_DIR)"""
+    memory_bytes.set(resident_memory_bytes(), kind='process_rss')
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/health', methods=['GET'])
 def health():
-    return jsonify({'status': 'healthy', 'model': 'en_core_web_lg'})
+    """Liveness: the process is up, whether or not the model has finished loading"""
+    body = {'status': 'healthy', 'model': MODEL_NAME, 'model_status': model_status(),
+            'tiers': MODEL_TIERS, 'default_tier': DEFAULT_TIER}
+    if cascade is not None:
+        body['cascade'] = cascade.stats()
+    return jsonify(body)
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness: 200 once the model is loaded, 503 (and loading kicked off) until then"""
+    if model_ready.is_set():
+        return jsonify({'status': 'ready', 'model': MODEL_NAME})
+    start_model_loading()
+    body = {'status': model_status(), 'model': MODEL_NAME}
+    if model_error is not None:
+        body['error'] = str(model_error)
+    return jsonify(body), 503
 
 if __name__ == '__main__':
     print("="*60)
@@ -833,7 +1582,21 @@ if __name__ == '__main__':
     print("\nEndpoints:")
     print("  POST /api/extract - Extract entities from text")
     print("  POST /api/batch - Batch entity extraction")
+    print("  POST /api/batch/stream - Streaming NDJSON bulk extraction")
+    print("  POST /api/anonymize - Redact entities and sensitive data")
+    print("  POST /api/relations - Entity relation triples")
+    print("  POST /api/jobs - Submit an async batch job")
+    print("  GET  /api/jobs/<id> - Job status and progress")
+    print("  GET  /api/jobs/<id>/results - Job results")
+    print("  GET  /api/stats - Request log statistics")
+    print("  POST /api/index - Add documents to the entity index")
+    print("  GET  /api/index/search - Find an entity across indexed documents")
+    print("  GET  /metrics - Prometheus metrics")
     print("  GET  /health - Health check")
+    print("  GET  /ready - Readiness check (model loaded)")
     print("\nPress CTRL+C to stop\n")
     
+    start_model_loading()
+    job_queue.resume()
+    
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
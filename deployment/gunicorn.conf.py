@@ -0,0 +1,69 @@
+"""
+Gunicorn configuration for multi-worker serving
+
+The app is imported once in the master (preload_app) and its spaCy model is loaded
+there before any worker starts, so forked workers share the model's memory pages
+copy-on-write.
+
+Environment:
+    WEB_CONCURRENCY    number of worker processes (default: CPU count)
+    GUNICORN_THREADS   threads per worker (default: 1; >1 switches to the gthread worker)
+    GUNICORN_TIMEOUT   worker timeout in seconds (default: 120)
+    GUNICORN_BIND      listen address (default: 0.0.0.0:5000)
+    NER_METRICS_DIR    directory where workers share their metrics (default: <tmp>/ner-metrics);
+                       set it empty and /metrics reports only the worker that answered
+"""
+
+import gc
+import multiprocessing
+import os
+import tempfile
+
+# One BLAS/OpenMP thread per worker; parallelism comes from the worker processes
+os.environ.setdefault('OMP_NUM_THREADS', '1')
+os.environ.setdefault('OPENBLAS_NUM_THREADS', '1')
+os.environ.setdefault('MKL_NUM_THREADS', '1')
+# Read by the app when the master imports it
+os.environ.setdefault('NER_METRICS_DIR', os.path.join(tempfile.gettempdir(), 'ner-metrics'))
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+# Load the model once in the master before forking
+preload_app = True
+
+
+def on_starting(server):
+    # Totals restart with the server; files left by a previous run would be counted again
+    import app
+    app.metrics.remove_published()
+
+
+def when_ready(server):
+    # The app loads its model lazily; load it here in the master so workers inherit it
+    import app
+    app.load_model()
+    server.log.info('Model %s loaded in master', app.MODEL_NAME)
+
+
+def pre_fork(server, worker):
+    # Move everything allocated so far (the model included) out of the cyclic GC's
+    # reach, so collections in the workers don't write to and un-share those pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    server.log.info('Worker %s forked with shared model (%s frozen objects)', worker.pid, gc.get_freeze_count())
+    # Pick up async jobs left unfinished by a previous run (each job is claimed by one worker)
+    import app
+    app.job_queue.resume()
+    app.metrics.start_publishing()
+
+
+def worker_exit(server, worker):
+    # Publish the last few seconds of this worker's metrics before it goes
+    import app
+    app.metrics.publish()
@@ -0,0 +1,189 @@
+"""
+On-disk store of parsed spaCy documents
+Docs are serialized into DocBin shards under a directory per model version, and a SQLite
+manifest maps each document id to its shard and position. Loading a stored parse is a
+deserialization instead of a model run, and a new model version never reads stale parses.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    doc_id TEXT PRIMARY KEY,
+    shard INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    text_hash TEXT NOT NULL,
+    components TEXT NOT NULL
+);
+"""
+
+
+def model_version(nlp):
+    """Version key of a loaded pipeline, e.g. en_core_web_lg-3.7.1"""
+    return f"{nlp.meta.get('lang')}_{nlp.meta.get('name')}-{nlp.meta.get('version')}"
+
+
+def text_hash(text):
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class DocStore:
+    """
+    Parsed documents keyed by document id, for one model version
+    put() buffers docs in memory and writes a DocBin shard every shard_size docs (call flush()
+    or close() before exiting, or use the store as a context manager). Re-putting a document id points it at the new copy; the old one is left
+    in its shard. The last max_shards deserialized shards are kept for sequential reads.
+    """
+    
+    def __init__(self, path, nlp, shard_size=1000, max_shards=4):
+        self.nlp = nlp
+        self.version = model_version(nlp)
+        self.directory = os.path.join(path, self.version)
+        self.shard_size = shard_size
+        self.max_shards = max_shards
+        self._conn = None
+        self._lock = threading.Lock()
+        self._pending = OrderedDict()
+        self._shards = OrderedDict()
+        self._next_shard = None
+    
+    def _connect(self):
+        # Opened on first use so constructing a store never touches the disk
+        if self._conn is None:
+            os.makedirs(self.directory, exist_ok=True)
+            self._conn = sqlite3.connect(os.path.join(self.directory, 'manifest.db'), check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(SCHEMA)
+            self._next_shard = self._conn.execute('SELECT COALESCE(MAX(shard) + 1, 0) FROM docs').fetchone()[0]
+        return self._conn
+    
+    def _shard_path(self, shard):
+        return os.path.join(self.directory, f'shard-{shard:06d}.spacy')
+    
+    def _load_shard(self, shard):
+        docs = self._shards.get(shard)
+        if docs is None:
+            from spacy.tokens import DocBin
+            doc_bin = DocBin().from_disk(self._shard_path(shard))
+            docs = list(doc_bin.get_docs(self.nlp.vocab))
+            self._shards[shard] = docs
+            while len(self._shards) > self.max_shards:
+                self._shards.popitem(last=False)
+        self._shards.move_to_end(shard)
+        return docs
+    
+    def get(self, doc_id, text=None, components=frozenset()):
+        """
+        The stored Doc for doc_id if it was parsed with at least these components
+        When text is given, a stored parse of a different text counts as missing.
+        """
+        doc_id = str(doc_id)
+        with self._lock:
+            pending = self._pending.get(doc_id)
+            if pending is not None:
+                doc, parsed_with = pending
+            else:
+                row = self._connect().execute(
+                    'SELECT shard, position, text_hash, components FROM docs WHERE doc_id = ?', (doc_id,)
+                ).fetchone()
+                if row is None:
+                    return None
+                shard, position, stored_hash, stored = row
+                parsed_with = frozenset(stored.split(',')) if stored else frozenset()
+                # Checked against the manifest so a mismatch never deserializes a shard
+                if not components <= parsed_with or (text is not None and text_hash(text) != stored_hash):
+                    return None
+                doc = self._load_shard(shard)[position]
+        if not components <= parsed_with or (text is not None and doc.text != text):
+            return None
+        return doc
+    
+    def put(self, doc_id, doc, components=frozenset()):
+        with self._lock:
+            self._pending[str(doc_id)] = (doc, frozenset(components))
+            if len(self._pending) >= self.shard_size:
+                self._flush()
+    
+    def _flush(self):
+        if not self._pending:
+            return
+        from spacy.tokens import DocBin
+        conn = self._connect()
+        shard = self._next_shard
+        doc_bin = DocBin(store_user_data=False)
+        rows = []
+        for position, (doc_id, (doc, components)) in enumerate(self._pending.items()):
+            doc_bin.add(doc)
+            rows.append((doc_id, shard, position, text_hash(doc.text), ','.join(sorted(components))))
+        # The shard is on disk before the manifest points at it
+        doc_bin.to_disk(self._shard_path(shard))
+        with conn:
+            conn.executemany(
+                'INSERT OR REPLACE INTO docs (doc_id, shard, position, text_hash, components) VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+        self._next_shard += 1
+        self._pending.clear()
+    
+    def flush(self):
+        """Write buffered docs as a new shard"""
+        with self._lock:
+            self._flush()
+    
+    def close(self):
+        """Write buffered docs and close the manifest; the store reopens on next use"""
+        with self._lock:
+            self._flush()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def __contains__(self, doc_id):
+        doc_id = str(doc_id)
+        with self._lock:
+            if doc_id in self._pending:
+                return True
+            return self._connect().execute('SELECT 1 FROM docs WHERE doc_id = ?', (doc_id,)).fetchone() is not None
+    
+    def __len__(self):
+        with self._lock:
+            conn = self._connect()
+            count = conn.execute('SELECT COUNT(*) FROM docs').fetchone()[0]
+            for doc_id in self._pending:
+                if conn.execute('SELECT 1 FROM docs WHERE doc_id = ?', (doc_id,)).fetchone() is None:
+                    count += 1
+            return count
+    
+    def docs(self):
+        """Yield (doc_id, Doc) for every flushed document, one shard at a time"""
+        with self._lock:
+            rows = self._connect().execute('SELECT doc_id, shard, position FROM docs ORDER BY shard, position').fetchall()
+        current, docs = None, None
+        for doc_id, shard, position in rows:
+            if shard != current:
+                with self._lock:
+                    docs = self._load_shard(shard)
+                current = shard
+            yield doc_id, docs[position]
+    
+    def stats(self):
+        with self._lock:
+            conn = self._connect()
+            documents, shards = conn.execute('SELECT COUNT(*), COUNT(DISTINCT shard) FROM docs').fetchone()
+            return {
+                'path': self.directory,
+                'model_version': self.version,
+                'documents': documents,
+                'shards': shards,
+                'pending': len(self._pending)
+            }
@@ -0,0 +1,225 @@
+"""
+Corpus-level inverted index of extracted entities
+Normalized entity text and label map to postings of (document, start, end), stored in
+SQLite with postings clustered by entity so a lookup is one range scan. Document text is
+stored alongside, and contexts are windowed out of it by SQLite without re-running spaCy.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    doc_key TEXT NOT NULL UNIQUE,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS entities (
+    id INTEGER PRIMARY KEY,
+    norm TEXT NOT NULL,
+    label TEXT NOT NULL,
+    surface TEXT NOT NULL,
+    mentions INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (norm, label)
+);
+CREATE TABLE IF NOT EXISTS postings (
+    entity_id INTEGER NOT NULL,
+    doc_id INTEGER NOT NULL,
+    start INTEGER NOT NULL,
+    end INTEGER NOT NULL,
+    PRIMARY KEY (entity_id, doc_id, start)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+"""
+
+WHITESPACE = re.compile(r'\s+')
+EDGE_PUNCTUATION = '.,;:!?"\'()[]{}'
+
+
+def normalize(text):
+    """Index key for an entity mention: NFKC, case-folded, single-spaced, trimmed of edge punctuation"""
+    text = unicodedata.normalize('NFKC', text).casefold()
+    return WHITESPACE.sub(' ', text).strip().strip(EDGE_PUNCTUATION).strip()
+
+
+def _spans(entities):
+    """(start, end, label) from entity dicts or span tuples"""
+    for ent in entities:
+        if isinstance(ent, dict):
+            yield ent['start'], ent['end'], ent['label']
+        else:
+            yield ent[0], ent[1], ent[2]
+
+
+class EntityIndex:
+    """Inverted entity index in a SQLite file; documents can be added (or replaced) at any time"""
+    
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+    
+    def _connect(self):
+        # Opened on first use so importing the app never touches the database
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+        return self._conn
+    
+    def _remove(self, conn, doc_id):
+        conn.execute(
+            'UPDATE entities SET mentions = mentions - '
+            '(SELECT COUNT(*) FROM postings WHERE postings.entity_id = entities.id AND postings.doc_id = ?) '
+            'WHERE id IN (SELECT entity_id FROM postings WHERE doc_id = ?)',
+            (doc_id, doc_id)
+        )
+        conn.execute('DELETE FROM postings WHERE doc_id = ?', (doc_id,))
+    
+    def _entity_ids(self, conn, keys):
+        """Ids for (norm, label, surface) keys, creating missing entities"""
+        conn.executemany(
+            'INSERT OR IGNORE INTO entities (norm, label, surface) VALUES (?, ?, ?)', keys.values()
+        )
+        ids = {}
+        for norm, label, _ in keys.values():
+            ids[(norm, label)] = conn.execute(
+                'SELECT id FROM entities WHERE norm = ? AND label = ?', (norm, label)
+            ).fetchone()[0]
+        return ids
+    
+    def add_many(self, documents):
+        """
+        Index (doc_key, text, entities) records in one transaction
+        entities are dicts with start/end/label or (start, end, label) tuples; re-adding a
+        doc_key replaces its text and postings. Returns the number of postings written.
+        """
+        written = 0
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                for doc_key, text, entities in documents:
+                    row = conn.execute('SELECT id FROM documents WHERE doc_key = ?', (doc_key,)).fetchone()
+                    if row is not None:
+                        doc_id = row[0]
+                        self._remove(conn, doc_id)
+                        conn.execute('UPDATE documents SET text = ? WHERE id = ?', (text, doc_id))
+                    else:
+                        doc_id = conn.execute(
+                            'INSERT INTO documents (doc_key, text) VALUES (?, ?)', (doc_key, text)
+                        ).lastrowid
+                    
+                    mentions = []
+                    keys = {}
+                    for start, end, label in _spans(entities):
+                        norm = normalize(text[start:end])
+                        if not norm:
+                            continue
+                        keys.setdefault((norm, label), (norm, label, text[start:end]))
+                        mentions.append((norm, label, start, end))
+                    if not mentions:
+                        continue
+                    
+                    ids = self._entity_ids(conn, keys)
+                    rows = [(ids[(norm, label)], doc_id, start, end) for norm, label, start, end in mentions]
+                    conn.executemany(
+                        'INSERT OR IGNORE INTO postings (entity_id, doc_id, start, end) VALUES (?, ?, ?, ?)', rows
+                    )
+                    conn.executemany(
+                        'UPDATE entities SET mentions = mentions + ? WHERE id = ?',
+                        ((n, entity_id) for entity_id, n in Counter(row[0] for row in rows).items())
+                    )
+                    written += len(rows)
+        return written
+    
+    def add(self, doc_key, text, entities):
+        return self.add_many([(doc_key, text, entities)])
+    
+    def remove(self, doc_key):
+        with self._lock:
+            conn = self._connect()
+            with conn:
+                row = conn.execute('SELECT id FROM documents WHERE doc_key = ?', (doc_key,)).fetchone()
+                if row is None:
+                    return False
+                self._remove(conn, row[0])
+                conn.execute('DELETE FROM documents WHERE id = ?', (row[0],))
+        return True
+    
+    def _entity_filter(self, entity, label):
+        clause = 'e.norm = ?'
+        params = [normalize(entity)]
+        if label:
+            clause += ' AND e.label = ?'
+            params.append(label)
+        return clause, params
+    
+    def lookup(self, entity, label=None, window=50, limit=100, offset=0):
+        """
+        Occurrences of an entity across the corpus, with context windowed from the stored text
+        Matching is on the normalized text, so case and spacing differences still match.
+        """
+        clause, params = self._entity_filter(entity, label)
+        with self._lock:
+            rows = self._connect().execute(
+                'SELECT d.doc_key, e.label, p.start, p.end, '
+                'substr(d.text, p.start + 1, p.end - p.start), '
+                'substr(d.text, max(p.start - ?, 0) + 1, p.end + ? - max(p.start - ?, 0)), '
+                'max(p.start - ?, 0) '
+                'FROM entities e JOIN postings p ON p.entity_id = e.id JOIN documents d ON d.id = p.doc_id '
+                f'WHERE {clause} ORDER BY p.doc_id, p.start LIMIT ? OFFSET ?',
+                [window, window, window, window] + params + [limit, offset]
+            ).fetchall()
+        return [
+            {
+                'doc_id': doc_key,
+                'label': label,
+                'start': start,
+                'end': end,
+                'text': text,
+                'context': context,
+                'context_start': context_start
+            }
+            for doc_key, label, start, end, text, context, context_start in rows
+        ]
+    
+    def count(self, entity, label=None):
+        """Mention and document counts for an entity"""
+        clause, params = self._entity_filter(entity, label)
+        with self._lock:
+            mentions, documents = self._connect().execute(
+                'SELECT COUNT(*), COUNT(DISTINCT p.doc_id) FROM entities e JOIN postings p ON p.entity_id = e.id '
+                f'WHERE {clause}',
+                params
+            ).fetchone()
+        return {'mentions': mentions, 'documents': documents}
+    
+    def search(self, prefix, label=None, limit=20):
+        """Indexed entities whose normalized text starts with prefix, most mentioned first"""
+        norm = normalize(prefix)
+        query = 'SELECT surface, label, mentions FROM entities WHERE norm >= ? AND norm < ? AND mentions > 0'
+        params = [norm, norm + '\U0010ffff']
+        if label:
+            query += ' AND label = ?'
+            params.append(label)
+        query += ' ORDER BY mentions DESC, norm LIMIT ?'
+        params.append(limit)
+        with self._lock:
+            rows = self._connect().execute(query, params).fetchall()
+        return [{'text': surface, 'label': label, 'mentions': mentions} for surface, label, mentions in rows]
+    
+    def stats(self):
+        with self._lock:
+            conn = self._connect()
+            documents = conn.execute('SELECT COUNT(*) FROM documents').fetchone()[0]
+            entities = conn.execute('SELECT COUNT(*) FROM entities WHERE mentions > 0').fetchone()[0]
+            postings = conn.execute('SELECT COUNT(*) FROM postings').fetchone()[0]
+        return {'path': self.path, 'documents': documents, 'entities': entities, 'postings': postings}
@@ -0,0 +1,234 @@
+"""
+Offline entity linking against a local knowledge base
+A knowledge base (alias -> candidate ids with priors) is compiled once into a sorted alias
+table file. At run time the file is memory-mapped and searched by binary search over an
+offset array, so millions of aliases are served without loading them into Python objects.
+"""
+
+import heapq
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from itertools import groupby
+
+from entity_index import normalize
+
+MAGIC = b'NERKB001'
+HEADER = struct.Struct('<8sQ')
+OFFSET = struct.Struct('<Q')
+FIELD_SEP = '\x1f'
+CANDIDATE_SEP = '\x1e'
+
+LINKABLE_TYPES = ('PERSON', 'ORG', 'GPE')
+
+
+def _read_source(path):
+    """
+    (alias, kb_id, prior, label) rows from a knowledge-base source file
+    .jsonl: {"alias", "id", "prior", "label"} objects; otherwise tab-separated
+    alias, id, prior and an optional label per line
+    """
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if not line.strip():
+                continue
+            if path.endswith('.jsonl'):
+                record = json.loads(line)
+                yield record['alias'], str(record['id']), float(record.get('prior', 1.0)), record.get('label', '')
+            else:
+                fields = line.split('\t')
+                yield fields[0], fields[1], float(fields[2]) if len(fields) > 2 else 1.0, fields[3] if len(fields) > 3 else ''
+
+
+def _clean(value):
+    return str(value).replace('\t', ' ').replace('\n', ' ').replace(FIELD_SEP, ' ').replace(CANDIDATE_SEP, ' ')
+
+
+def build_alias_table(source, output, run_size=500000):
+    """
+    Compile a knowledge-base source file into a memory-mappable alias table
+    Rows are sorted in runs of run_size and merged from disk, so building stays within
+    bounded memory for very large knowledge bases. Returns the number of distinct aliases.
+    """
+    runs = []
+    with tempfile.TemporaryDirectory() as tmp:
+        rows = []
+        
+        def flush_run():
+            rows.sort()
+            path = os.path.join(tmp, f'run-{len(runs)}.tsv')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.writelines('\t'.join(row) + '\n' for row in rows)
+            runs.append(path)
+            rows.clear()
+        
+        for alias, kb_id, prior, label in _read_source(source):
+            key = normalize(alias)
+            if key:
+                rows.append((_clean(key), _clean(kb_id), repr(prior), _clean(label)))
+            if len(rows) >= run_size:
+                flush_run()
+        if rows or not runs:
+            flush_run()
+        
+        files = [open(path, encoding='utf-8') for path in runs]
+        try:
+            merged = heapq.merge(*((line.rstrip('\n').split('\t') for line in f) for f in files))
+            offsets = array('Q')
+            with open(output + '.data', 'wb') as data:
+                position = 0
+                for key, group in groupby(merged, key=lambda row: row[0]):
+                    # Keep the best prior per id, then order candidates by prior
+                    best = {}
+                    for _, kb_id, prior, label in group:
+                        prior = float(prior)
+                        if kb_id not in best or prior > best[kb_id][0]:
+                            best[kb_id] = (prior, label)
+                    candidates = sorted(best.items(), key=lambda item: -item[1][0])
+                    record = key + '\t' + CANDIDATE_SEP.join(
+                        f'{kb_id}{FIELD_SEP}{prior!r}{FIELD_SEP}{label}' for kb_id, (prior, label) in candidates
+                    ) + '\n'
+                    encoded = record.encode('utf-8')
+                    offsets.append(position)
+                    data.write(encoded)
+                    position += len(encoded)
+                offsets.append(position)
+        finally:
+            for f in files:
+                f.close()
+    
+    # Header, offset array (count + 1 little-endian uint64s), then the records
+    base = HEADER.size + 8 * len(offsets)
+    with open(output, 'wb') as out, open(output + '.data', 'rb') as data:
+        out.write(HEADER.pack(MAGIC, len(offsets) - 1))
+        table = array('Q', (base + offset for offset in offsets))
+        if sys.byteorder == 'big':
+            table.byteswap()
+        out.write(table.tobytes())
+        while True:
+            block = data.read(1 << 20)
+            if not block:
+                break
+            out.write(block)
+    os.remove(output + '.data')
+    return len(offsets) - 1
+
+
+class AliasTable:
+    """Read-only, memory-mapped alias table built by build_alias_table"""
+    
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f'{path} is not an alias table')
+    
+    def __len__(self):
+        return self.count
+    
+    def close(self):
+        self._map.close()
+        self._file.close()
+    
+    def _offset(self, i):
+        return OFFSET.unpack_from(self._map, HEADER.size + OFFSET.size * i)[0]
+    
+    def _key(self, i):
+        start = self._offset(i)
+        return self._map[start:self._map.find(b'\t', start)]
+    
+    def _bisect(self, key, lo=0):
+        """First record index whose key is >= key (keys are sorted UTF-8 bytes)"""
+        hi = self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+    
+    def _record(self, i):
+        start, end = self._offset(i), self._offset(i + 1)
+        key, _, candidates = self._map[start:end - 1].decode('utf-8').partition('\t')
+        parsed = []
+        for candidate in candidates.split(CANDIDATE_SEP):
+            kb_id, prior, label = candidate.split(FIELD_SEP)
+            parsed.append({'id': kb_id, 'prior': float(prior), 'label': label})
+        return key, parsed
+    
+    def candidates(self, alias):
+        """Candidates for an alias (normalized before lookup), highest prior first"""
+        key = normalize(alias).encode('utf-8')
+        i = self._bisect(key)
+        if i < self.count and self._key(i) == key:
+            return self._record(i)[1]
+        return []
+    
+    def lookup_many(self, aliases):
+        """
+        Resolve many aliases in one sorted pass: each search starts where the previous one ended
+        Returns {alias: candidates} for the aliases that were found
+        """
+        keyed = sorted((normalize(alias).encode('utf-8'), alias) for alias in set(aliases))
+        found = {}
+        lo = 0
+        for key, alias in keyed:
+            lo = self._bisect(key, lo)
+            if lo < self.count and self._key(lo) == key:
+                found[alias] = self._record(lo)[1]
+        return found
+    
+    def prefix(self, prefix, limit=20):
+        """(alias key, candidates) for aliases starting with prefix, in key order"""
+        key = normalize(prefix).encode('utf-8')
+        i = self._bisect(key)
+        results = []
+        while i < self.count and len(results) < limit and self._key(i).startswith(key):
+            results.append(self._record(i))
+            i += 1
+        return results
+
+
+class EntityLinker:
+    """
+    Links PERSON/ORG/GPE mentions to knowledge-base ids
+    Among an alias's candidates, the highest-prior one whose KB label agrees with the
+    entity type wins (candidates without a label match any type).
+    url_template: optional format string for a link, e.g. 'https://www.wikidata.org/wiki/{id}'
+    """
+    
+    def __init__(self, table, types=LINKABLE_TYPES, url_template=None):
+        self.table = table
+        self.types = set(types)
+        self.url_template = url_template
+    
+    @classmethod
+    def from_path(cls, path, **kwargs):
+        return cls(AliasTable(path), **kwargs)
+    
+    def disambiguate(self, candidates, label):
+        for candidate in candidates:
+            if not candidate['label'] or candidate['label'] == label:
+                return candidate
+        return None
+    
+    def link(self, entities):
+        """Add kb_id/kb_prior (and kb_url) to every linkable entity dict, resolving all aliases at once"""
+        linkable = [ent for ent in entities if ent['label'] in self.types]
+        found = self.table.lookup_many(ent['text'] for ent in linkable)
+        for ent in linkable:
+            best = self.disambiguate(found.get(ent['text'], []), ent['label'])
+            ent['kb_id'] = best['id'] if best else None
+            ent['kb_prior'] = best['prior'] if best else None
+            if self.url_template and best:
+                ent['kb_url'] = self.url_template.format(id=best['id'])
+        return entities
@@ -28,12 +28,10 @@ def install_requirements():
         subprocess.check_call([sys.executable, "-m", "pip", "install", "--user", "flask", "flask-cors", "spacy", "gunicorn", "python-dotenv"])
 
 def download_spacy_model():
-    """Download spaCy language model if not present"""
+    """Download spaCy language model if not present (without loading it)"""
     try:
-        import spacy
-        try:
-            spacy.load('en_core_web_lg')
-        except OSError:
+        import importlib.util
+        if importlib.util.find_spec('en_core_web_lg') is None:
             print("Downloading spaCy language model...")
             subprocess.check_call([sys.executable, "-m", "spacy", "download", "en_core_web_lg"])
     except Exception as e:
@@ -42,8 +40,9 @@ def download_spacy_model():
 def start_flask_app():
     """Start the Flask application"""
     try:
-        # Import the app module
-        from app import app
+        # Import the app module and warm the model up in the background
+        from app import app, start_model_loading
+        start_model_loading()
 
         # Run the app
         print("=" * 60)
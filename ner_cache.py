@@ -0,0 +1,192 @@
+"""
+Response cache for the NER API
+Results are keyed by a hash of the text, the model name/version and the request options,
+and stored in pluggable backends: an in-process LRU with a byte budget and an on-disk
+SQLite store that survives restarts.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+def cache_key(text, model, options=None):
+    """Stable key for one (text, model, options) combination"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps({'model': model, 'options': options or {}}, sort_keys=True).encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(text.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class MemoryCache:
+    """In-process LRU cache bounded by the total size of the stored values"""
+    
+    def __init__(self, max_bytes=64 * 1024 * 1024, ttl=None):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+    
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.time() + ttl if ttl else None)
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+    
+    def _remove(self, key):
+        value, _ = self._entries.pop(key)
+        self._bytes -= len(value)
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self):
+        with self._lock:
+            return {'backend': 'memory', 'entries': len(self._entries), 'bytes': self._bytes, 'max_bytes': self.max_bytes}
+
+
+class SQLiteCache:
+    """On-disk cache in a SQLite file; entries survive process restarts"""
+    
+    def __init__(self, path, ttl=None):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._conn = None
+    
+    def _connect(self):
+        # Opened on first use so importing the app never touches the database, and each
+        # preforked worker opens its own connection
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS result_cache ('
+                'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)'
+            )
+            self._conn.commit()
+        return self._conn
+    
+    def get(self, key):
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                'SELECT value, expires_at FROM result_cache WHERE key = ?', (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] <= time.time():
+                conn.execute('DELETE FROM result_cache WHERE key = ?', (key,))
+                conn.commit()
+                return None
+            return bytes(row[0])
+    
+    def set(self, key, value, ttl=None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                'INSERT OR REPLACE INTO result_cache (key, value, expires_at) VALUES (?, ?, ?)',
+                (key, sqlite3.Binary(value), time.time() + ttl if ttl else None)
+            )
+            conn.commit()
+    
+    def purge_expired(self):
+        """Delete expired rows; returns how many were removed"""
+        with self._lock:
+            conn = self._connect()
+            cursor = conn.execute(
+                'DELETE FROM result_cache WHERE expires_at IS NOT NULL AND expires_at <= ?', (time.time(),)
+            )
+            conn.commit()
+            return cursor.rowcount
+    
+    def clear(self):
+        with self._lock:
+            conn = self._connect()
+            conn.execute('DELETE FROM result_cache')
+            conn.commit()
+    
+    def stats(self):
+        with self._lock:
+            conn = self._connect()
+            entries, size = conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM result_cache'
+            ).fetchone()
+        return {'backend': 'sqlite', 'path': self.path, 'entries': entries, 'bytes': size}
+
+
+class TieredCache:
+    """Checks backends in order; a hit in a slower tier is copied into the faster ones"""
+    
+    def __init__(self, backends):
+        self.backends = list(backends)
+    
+    def get(self, key):
+        for i, backend in enumerate(self.backends):
+            value = backend.get(key)
+            if value is not None:
+                for faster in self.backends[:i]:
+                    faster.set(key, value)
+                return value
+        return None
+    
+    def set(self, key, value, ttl=None):
+        for backend in self.backends:
+            backend.set(key, value, ttl)
+    
+    def clear(self):
+        for backend in self.backends:
+            backend.clear()
+    
+    def stats(self):
+        return [backend.stats() for backend in self.backends]
+
+
+def build_cache(spec, sqlite_path, max_bytes=64 * 1024 * 1024, ttl=None):
+    """
+    Build a cache from a comma-separated backend list, e.g. 'memory', 'sqlite' or 'memory,sqlite'
+    Returns None when caching is disabled ('' or 'none')
+    """
+    backends = []
+    for name in (part.strip().lower() for part in spec.split(',')):
+        if name in ('', 'none', 'off'):
+            continue
+        if name == 'memory':
+            backends.append(MemoryCache(max_bytes=max_bytes, ttl=ttl))
+        elif name == 'sqlite':
+            backends.append(SQLiteCache(sqlite_path, ttl=ttl))
+        else:
+            raise ValueError(f'Unknown cache backend: {name}')
+    if not backends:
+        return None
+    return backends[0] if len(backends) == 1 else TieredCache(backends)
@@ -4,18 +4,1214 @@ Advanced NLP-based entity extraction and classification
 Extracts: PERSON, ORGANIZATION, LOCATION, DATE, MONEY, etc.
 """
 
+import atexit
 import re
-import spacy
-from collections import Counter, defaultdict
+import difflib
+import hashlib
+import mmap
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
 import json
+from array import array
+from collections.abc import Sequence
 from datetime import datetime
+from itertools import islice
+
+# Pipeline components each task needs; everything else is disabled for it
+TASK_COMPONENTS = {
+    'ner': {'ner', 'entity_ruler'},
+    'parse': {'tagger', 'attribute_ruler', 'lemmatizer', 'parser', 'senter', 'sentencizer', 'ner', 'entity_ruler'},
+    'full': None
+}
+
+# Regex entities recognised alongside the statistical model
+CUSTOM_PATTERNS = {
+    'EMAIL': r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
+    'PHONE': r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b',
+    'URL': r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+',
+    'IP_ADDRESS': r'\b(?:\d{1,3}\.){3}\d{1,3}\b',
+    'CREDIT_CARD': r'\b\d{4}[- ]?\d{4}[- ]?\d{4}[- ]?\d{4}\b',
+    'SSN': r'\b\d{3}-\d{2}-\d{4}\b',
+    'HASHTAG': r'#\w+',
+    'MENTION': r'@\w+'
+}
+
+
+def resolve_overlaps(spans):
+    """Sort (start, end, label) spans; on overlap the earlier (then longer) span wins"""
+    resolved = []
+    last_end = 0
+    for start, end, label in sorted(spans, key=lambda span: (span[0], span[0] - span[1])):
+        if start >= last_end:
+            resolved.append((start, end, label))
+            last_end = end
+    return resolved
+
+
+class PipelineRegistry:
+    """Component-trimmed views of one loaded pipeline, selected by task name"""
+    
+    def __init__(self, nlp, tasks=None, on_component=None):
+        """
+        on_component: optional callback(name, seconds) invoked after each component
+        runs on a single text, for per-component latency metrics
+        """
+        self.nlp = nlp
+        self.on_component = on_component
+        tasks = TASK_COMPONENTS if tasks is None else tasks
+        self._disabled = {task: self._disabled_for(required) for task, required in tasks.items()}
+    
+    def _disabled_for(self, required):
+        if required is None:
+            return []
+        keep = {name for name in self.nlp.pipe_names if name in required}
+        # Shared embedding layers stay on when a kept component listens to them
+        for name in self.nlp.pipe_names:
+            listeners = getattr(self.nlp.get_pipe(name), 'listening_components', None)
+            if listeners and keep.intersection(listeners):
+                keep.add(name)
+        return [name for name in self.nlp.pipe_names if name not in keep]
+    
+    def disabled(self, task):
+        """Components skipped for a task"""
+        try:
+            return self._disabled[task]
+        except KeyError:
+            raise ValueError(f'Unknown pipeline task: {task}')
+    
+    def components(self, task):
+        """Components that run for a task"""
+        disabled = self.disabled(task)
+        return frozenset(name for name in self.nlp.pipe_names if name not in disabled)
+    
+    def __call__(self, text, task='full'):
+        if self.on_component is None:
+            return self.nlp(text, disable=self.disabled(task))
+        
+        # Same steps as Language.__call__, timed one component at a time
+        disabled = self.disabled(task)
+        doc = self.nlp.make_doc(text)
+        for name, proc in self.nlp.pipeline:
+            if name in disabled:
+                continue
+            start = time.perf_counter()
+            doc = proc(doc)
+            self.on_component(name, time.perf_counter() - start)
+        return doc
+    
+    def pipe(self, texts, task='full', **kwargs):
+        return self.nlp.pipe(texts, disable=self.disabled(task), **kwargs)
+
+
+class EntityCoverageCheck:
+    """
+    Cascade heuristic: a fast model's Doc is trusted unless too many capitalized words go unlabeled
+    Counts alphabetic, capitalized, non-stop-word tokens that do not start a sentence (likely
+    names), and fails when more than max_uncovered of them fall outside every entity.
+    """
+    
+    SENTENCE_END = {'.', '!', '?', ':', ';', '"'}
+    
+    def __init__(self, max_uncovered=0.2):
+        self.max_uncovered = max_uncovered
+    
+    def _sentence_start(self, doc, i):
+        return i == 0 or doc[i - 1].text in self.SENTENCE_END or doc[i - 1].is_space or '\n' in doc[i - 1].whitespace_
+    
+    def uncovered(self, doc):
+        """(capitalized candidate tokens, how many of them no entity covers)"""
+        candidates = missed = 0
+        for token in doc:
+            if not (token.is_alpha and token.text[0].isupper()) or token.is_stop or self._sentence_start(doc, token.i):
+                continue
+            candidates += 1
+            if token.ent_iob_ not in ('B', 'I'):
+                missed += 1
+        return candidates, missed
+    
+    def __call__(self, doc):
+        candidates, missed = self.uncovered(doc)
+        return missed <= self.max_uncovered * candidates
+
+
+class ModelCascade:
+    """
+    Drop-in for PipelineRegistry that serves most texts from a fast model
+    Every text is parsed by the fast pipelines; the ones whose Doc fails check (default:
+    EntityCoverageCheck) are parsed again by the accurate pipelines. The tier a Doc came
+    from is recorded in doc.user_data['model_tier'].
+    """
+    
+    def __init__(self, fast, accurate, check=None, fast_name='fast', accurate_name='accurate'):
+        self.fast = fast
+        self.accurate = accurate
+        self.check = check or EntityCoverageCheck()
+        self.fast_name = fast_name
+        self.accurate_name = accurate_name
+        self.nlp = fast.nlp
+        self._lock = threading.Lock()
+        self.texts = 0
+        self.escalated = 0
+    
+    def disabled(self, task):
+        return self.fast.disabled(task)
+    
+    def components(self, task):
+        return self.fast.components(task)
+    
+    def _count(self, texts, escalated):
+        with self._lock:
+            self.texts += texts
+            self.escalated += escalated
+    
+    def __call__(self, text, task='full'):
+        doc = self.fast(text, task)
+        if self.check(doc):
+            doc.user_data['model_tier'] = self.fast_name
+            self._count(1, 0)
+            return doc
+        doc = self.accurate(text, task)
+        doc.user_data['model_tier'] = self.accurate_name
+        self._count(1, 1)
+        return doc
+    
+    def pipe(self, texts, task='full', as_tuples=False, batch_size=256, n_process=1, **kwargs):
+        """
+        nlp.pipe over both tiers, in input order
+        Input is taken batch_size texts at a time: the batch goes through the fast model, then
+        its doubtful texts through the accurate model, so each tier still sees whole batches.
+        n_process is not used; the per-batch hand-off runs in this process.
+        """
+        items = iter(texts)
+        while True:
+            window = list(islice(items, batch_size))
+            if not window:
+                return
+            window_texts = [item[0] for item in window] if as_tuples else window
+            docs = list(self.fast.pipe(window_texts, task=task, batch_size=batch_size, **kwargs))
+            doubtful = [i for i, doc in enumerate(docs) if not self.check(doc)]
+            for doc in docs:
+                doc.user_data['model_tier'] = self.fast_name
+            rerun = self.accurate.pipe([window_texts[i] for i in doubtful], task=task, batch_size=batch_size, **kwargs)
+            for i, doc in zip(doubtful, rerun):
+                doc.user_data['model_tier'] = self.accurate_name
+                docs[i] = doc
+            self._count(len(docs), len(doubtful))
+            if as_tuples:
+                yield from ((doc, item[1]) for doc, item in zip(docs, window))
+            else:
+                yield from docs
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'texts': self.texts,
+                'escalated': self.escalated,
+                'escalation_rate': round(self.escalated / self.texts, 4) if self.texts else 0.0
+            }
+
+
+class RulePipelines:
+    """
+    Model-free stand-in for PipelineRegistry, for structured inputs
+    A blank, tokenizer-only pipeline with an EntityRuler holding the gazetteer's phrases
+    (matched on LOWER unless case_sensitive), plus the custom regex patterns matched in one
+    pass over the text. Docs come back with both kinds of matches as doc.ents.
+    """
+    
+    def __init__(self, gazetteer=None, patterns=None, lang='en', case_sensitive=False):
+        import spacy
+        self.nlp = spacy.blank(lang)
+        self.case_sensitive = case_sensitive
+        # Added with the first gazetteer entries; regex-only use runs the bare tokenizer
+        self.ruler = None
+        self.patterns = dict(CUSTOM_PATTERNS if patterns is None else patterns)
+        self.pattern_matcher = PatternMatcher(self.patterns)
+        self._digest = hashlib.sha1(json.dumps(sorted(self.patterns.items())).encode('utf-8'))
+        if gazetteer:
+            self.load_gazetteer(gazetteer)
+    
+    @staticmethod
+    def read_gazetteer(path):
+        """
+        EntityRuler patterns from a gazetteer file
+        .jsonl: EntityRuler pattern objects; otherwise one "LABEL<tab>phrase" per line
+        """
+        patterns = []
+        with open(path, encoding='utf-8') as f:
+            for lineno, line in enumerate(f, 1):
+                line = line.rstrip('\n')
+                if not line.strip() or line.startswith('#'):
+                    continue
+                if path.endswith('.jsonl'):
+                    patterns.append(json.loads(line))
+                    continue
+                label, sep, phrase = line.partition('\t')
+                if not sep or not label.strip() or not phrase.strip():
+                    raise ValueError(f'{path}:{lineno}: expected LABEL<tab>phrase')
+                patterns.append({'label': label.strip(), 'pattern': phrase.strip()})
+        return patterns
+    
+    def load_gazetteer(self, path):
+        self.add_patterns(self.read_gazetteer(path))
+    
+    def add_terms(self, label, terms):
+        """Add known names of one entity type"""
+        self.add_patterns([{'label': label, 'pattern': term} for term in terms])
+    
+    def add_patterns(self, patterns):
+        if self.ruler is None:
+            self.ruler = self.nlp.add_pipe(
+                'entity_ruler', config={'phrase_matcher_attr': None if self.case_sensitive else 'LOWER'}
+            )
+        self.ruler.add_patterns(patterns)
+        self._digest.update(json.dumps(patterns, sort_keys=True).encode('utf-8'))
+    
+    @property
+    def version(self):
+        """Key for caches: changes whenever patterns or gazetteer entries are added"""
+        return f'rules-{self._digest.hexdigest()[:16]}'
+    
+    def disabled(self, task):
+        return []
+    
+    def components(self, task):
+        return frozenset(self.nlp.pipe_names)
+    
+    def _add_pattern_entities(self, doc):
+        matches = list(self.pattern_matcher.finditer(doc.text))
+        if not matches:
+            return doc
+        spans = [(ent.start_char, ent.end_char, ent.label_) for ent in doc.ents]
+        for label, start, end in matches:
+            span = doc.char_span(start, end, label=label, alignment_mode='expand')
+            if span is not None:
+                spans.append((span.start_char, span.end_char, label))
+        doc.ents = [
+            doc.char_span(start, end, label=label, alignment_mode='expand')
+            for start, end, label in resolve_overlaps(spans)
+        ]
+        return doc
+    
+    def __call__(self, text, task='ner'):
+        return self._add_pattern_entities(self.nlp(text))
+    
+    def pipe(self, texts, task='ner', as_tuples=False, **kwargs):
+        if as_tuples:
+            for doc, context in self.nlp.pipe(texts, as_tuples=True, **kwargs):
+                yield self._add_pattern_entities(doc), context
+        else:
+            for doc in self.nlp.pipe(texts, **kwargs):
+                yield self._add_pattern_entities(doc)
+
+
+class DocCache:
+    """Size-bounded LRU cache of parsed Doc objects keyed by a hash of the text"""
+    
+    def __init__(self, maxsize=128):
+        self.maxsize = maxsize
+        self._docs = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def key(text):
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+    
+    def get(self, text, components=frozenset()):
+        """Return the cached Doc for text if it was parsed with at least these components"""
+        key = self.key(text)
+        with self._lock:
+            entry = self._docs.get(key)
+            if entry is None or not components <= entry[1]:
+                self.misses += 1
+                return None
+            self._docs.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, text, doc, components=frozenset()):
+        """Store a parsed Doc, evicting the least recently used entries"""
+        if self.maxsize <= 0:
+            return
+        key = self.key(text)
+        with self._lock:
+            self._docs[key] = (doc, frozenset(components))
+            self._docs.move_to_end(key)
+            while len(self._docs) > self.maxsize:
+                self._docs.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self):
+        with self._lock:
+            self._docs.clear()
+    
+    def stats(self):
+        """Hit/miss/eviction counters"""
+        with self._lock:
+            return {
+                'size': len(self._docs),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+
+class EntityTable:
+    """
+    Compact columnar entity results for one or more documents
+    Labels and entity strings are interned into tables; label ids, text ids and offsets
+    live in parallel int arrays instead of one dict per entity.
+    """
+    
+    def __init__(self):
+        self.labels = []
+        self.texts = []
+        self.label_ids = array('i')
+        self.text_ids = array('i')
+        self.starts = array('i')
+        self.ends = array('i')
+        # Entity index at which each document starts (one extra trailing entry)
+        self.doc_offsets = array('i', [0])
+        self._label_index = {}
+        self._text_index = {}
+    
+    @classmethod
+    def from_docs(cls, docs):
+        table = cls()
+        for doc in docs:
+            table.add_doc(doc)
+        return table
+    
+    def add_doc(self, doc):
+        """Append one Doc's entities in a single pass over doc.ents"""
+        label_index = self._label_index
+        text_index = self._text_index
+        for ent in doc.ents:
+            # ent.label is the label's hash, so the label string is only built once per label
+            label_id = label_index.get(ent.label)
+            if label_id is None:
+                label_id = label_index[ent.label] = len(self.labels)
+                self.labels.append(ent.label_)
+            text = ent.text
+            text_id = text_index.get(text)
+            if text_id is None:
+                text_id = text_index[text] = len(self.texts)
+                self.texts.append(text)
+            self.label_ids.append(label_id)
+            self.text_ids.append(text_id)
+            self.starts.append(ent.start_char)
+            self.ends.append(ent.end_char)
+        self.doc_offsets.append(len(self.starts))
+    
+    def __len__(self):
+        return len(self.starts)
+    
+    @property
+    def num_docs(self):
+        return len(self.doc_offsets) - 1
+    
+    def entity(self, i):
+        """Dict view of entity i, in the same shape as the row-oriented results"""
+        return {
+            'text': self.texts[self.text_ids[i]],
+            'label': self.labels[self.label_ids[i]],
+            'start': self.starts[i],
+            'end': self.ends[i]
+        }
+    
+    def document(self, i):
+        """Lazy sequence of entity dicts for document i"""
+        return DocumentEntities(self, self.doc_offsets[i], self.doc_offsets[i + 1])
+    
+    def documents(self):
+        return [self.document(i) for i in range(self.num_docs)]
+    
+    def to_columnar(self):
+        """JSON-ready column layout"""
+        return {
+            'labels': self.labels,
+            'texts': self.texts,
+            'label': self.label_ids.tolist(),
+            'text': self.text_ids.tolist(),
+            'start': self.starts.tolist(),
+            'end': self.ends.tolist(),
+            'doc_offsets': self.doc_offsets.tolist()
+        }
+
+
+class DocumentEntities(Sequence):
+    """Read-only list-like view over one document's rows in an EntityTable"""
+    
+    def __init__(self, table, start, stop):
+        self.table = table
+        self.start = start
+        self.stop = stop
+    
+    def __len__(self):
+        return self.stop - self.start
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError('entity index out of range')
+        return self.table.entity(self.start + index)
+    
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, DocumentEntities)):
+            return list(self) == list(other)
+        return NotImplemented
+    
+    def __repr__(self):
+        return repr(list(self))
+
+
+class BatchEngine:
+    """Batched entity extraction on top of nlp.pipe, shared by the API and batch_process"""
+    
+    def __init__(self, nlp, batch_size=256, n_process=1, max_texts=10000, max_text_length=100000,
+                 pipelines=None):
+        self.nlp = nlp
+        self.pipelines = pipelines or PipelineRegistry(nlp)
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.max_texts = max_texts
+        self.max_text_length = max_text_length
+    
+    def validate(self, texts):
+        """Check a batch against the per-request limits"""
+        if not isinstance(texts, (list, tuple)):
+            raise ValueError('texts must be a list of strings')
+        if self.max_texts and len(texts) > self.max_texts:
+            raise ValueError(f'Too many texts: {len(texts)} (limit {self.max_texts})')
+        for i, text in enumerate(texts):
+            if not isinstance(text, str):
+                raise ValueError(f'texts[{i}] is not a string')
+            if self.max_text_length and len(text) > self.max_text_length:
+                raise ValueError(f'texts[{i}] is too long: {len(text)} characters (limit {self.max_text_length})')
+    
+    def docs(self, texts, batch_size=None, n_process=None, task='ner'):
+        """Yield parsed Docs in input order"""
+        return self.pipelines.pipe(
+            texts,
+            task=task,
+            batch_size=batch_size or self.batch_size,
+            n_process=n_process or self.n_process
+        )
+    
+    @staticmethod
+    def doc_entities(doc):
+        """Entity dicts with character offsets for one Doc"""
+        return [
+            {
+                'text': ent.text,
+                'label': ent.label_,
+                'start': ent.start_char,
+                'end': ent.end_char
+            }
+            for ent in doc.ents
+        ]
+    
+    def process(self, texts, batch_size=None, n_process=None):
+        """Yield one entity list (with character offsets) per text, in input order"""
+        for doc in self.docs(texts, batch_size, n_process, task='ner'):
+            yield self.doc_entities(doc)
+    
+    def process_table(self, texts, batch_size=None, n_process=None):
+        """Process texts into one columnar EntityTable (one document per text, in input order)"""
+        return EntityTable.from_docs(self.docs(texts, batch_size, n_process, task='ner'))
+    
+    def process_tuples(self, pairs, batch_size=None, n_process=None):
+        """
+        Lazily process (text, context) pairs, yielding (entities, context) in input order
+        Input is consumed one batch at a time, so arbitrarily long streams run in constant memory
+        """
+        docs = self.pipelines.pipe(
+            pairs,
+            task='ner',
+            as_tuples=True,
+            batch_size=batch_size or self.batch_size,
+            n_process=n_process or self.n_process
+        )
+        for doc, context in docs:
+            yield self.doc_entities(doc), context
+    
+    def process_corpus(self, corpus, batch_size=None, n_process=None):
+        """
+        Stream a MappedCorpus through nlp.pipe, yielding one result per document
+        For .txt corpora every entity also gets byte_start/byte_end: its position in the file.
+        JSON-escaped text has no such mapping, so .jsonl results only carry the line's range.
+        """
+        docs = self.pipelines.pipe(
+            iter(corpus),
+            task='ner',
+            as_tuples=True,
+            batch_size=batch_size or self.batch_size,
+            n_process=n_process or self.n_process
+        )
+        for doc, (index, byte_start, byte_end) in docs:
+            entities = self.doc_entities(doc)
+            if corpus.format == 'txt' and entities:
+                offsets = utf8_byte_offsets(doc.text, [ent[key] for ent in entities for key in ('start', 'end')])
+                for i, ent in enumerate(entities):
+                    ent['byte_start'] = byte_start + offsets[2 * i]
+                    ent['byte_end'] = byte_start + offsets[2 * i + 1]
+            yield {'index': index, 'byte_start': byte_start, 'byte_end': byte_end, 'entities': entities}
+
+
+def utf8_byte_offsets(text, char_offsets):
+    """Map character offsets in text to UTF-8 byte offsets, encoding each stretch of text once"""
+    if text.isascii():
+        return list(char_offsets)
+    result = [0] * len(char_offsets)
+    previous = size = 0
+    for i in sorted(range(len(char_offsets)), key=char_offsets.__getitem__):
+        offset = char_offsets[i]
+        size += len(text[previous:offset].encode('utf-8'))
+        previous = offset
+        result[i] = size
+    return result
+
+
+class MappedCorpus:
+    """
+    Lazy reader for large UTF-8 corpora: one document per line of a .txt or .jsonl file
+    The file is memory-mapped and only the document being handed to spaCy is decoded, so
+    memory stays flat regardless of file size. Iterating yields (text, (index, byte_start,
+    byte_end)) pairs ready for nlp.pipe(as_tuples=True); the byte range locates the line
+    in the file.
+    """
+    
+    def __init__(self, path, format=None, text_field='text'):
+        self.path = path
+        self.format = format or ('jsonl' if path.endswith('.jsonl') else 'txt')
+        self.text_field = text_field
+    
+    def __iter__(self):
+        with open(self.path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                size = len(mapped)
+                position = index = 0
+                while position < size:
+                    newline = mapped.find(b'\n', position)
+                    if newline == -1:
+                        newline = size
+                    end = newline
+                    if end > position and mapped[end - 1] == 0x0d:
+                        end -= 1
+                    raw = mapped[position:end]
+                    if raw.strip():
+                        if self.format == 'jsonl':
+                            text = json.loads(raw)[self.text_field]
+                        else:
+                            text = raw.decode('utf-8')
+                        yield text, (index, position, end)
+                        index += 1
+                    position = newline + 1
+    
+    def read(self, byte_start, byte_end):
+        """Raw bytes of a range of the file (e.g. an entity's byte_start/byte_end)"""
+        with open(self.path, 'rb') as f:
+            f.seek(byte_start)
+            return f.read(byte_end - byte_start)
+
+
+class PatternMatcher:
+    """
+    Single-pass multi-pattern regex matcher
+    Patterns are combined into one alternation of named groups, so the text is scanned once
+    per shard instead of once per pattern. New patterns only recompile the last shard.
+    Patterns with their own capturing groups (and so backreferences) are compiled and scanned
+    on their own, since wrapping them would renumber or clash with their groups.
+    In the combined scan the leftmost match wins, so a match can hide an overlapping one of
+    another pattern. That suits consumers that resolve overlaps anyway (find_all, the rules
+    tier); group() and finditer(text, labels) scan the patterns one by one and keep overlaps.
+    """
+    
+    INLINE_FLAGS = re.compile(r'^\(\?([aiLmsux]+)\)')
+    
+    def __init__(self, patterns=None, shard_size=64):
+        self.shard_size = shard_size
+        self.labels = []
+        self._group_labels = {}
+        self._shards = []
+        self._standalone = []
+        # Every pattern compiled on its own, for scans that must not lose overlapping matches
+        self._patterns = []
+        for label, pattern in (patterns or {}).items():
+            self.add(label, pattern, compile=False)
+        for shard in self._shards:
+            self._compile(shard)
+    
+    def __len__(self):
+        return len(self._group_labels) + len(self._standalone)
+    
+    def add(self, label, pattern, compile=True):
+        """Add a pattern; only the shard it lands in is recompiled"""
+        compiled = re.compile(pattern)  # fail fast on invalid user patterns
+        if label not in self.labels:
+            self.labels.append(label)
+        self._patterns.append((label, compiled))
+        if compiled.groups:
+            self._standalone.append((label, compiled))
+            return
+        
+        # Leading global flags such as (?i) are only legal at the very start, so scope them
+        flags = self.INLINE_FLAGS.match(pattern)
+        if flags:
+            pattern = f'(?{flags.group(1)}:{pattern[flags.end():]})'
+        
+        if not self._shards or len(self._shards[-1]['groups']) >= self.shard_size:
+            self._shards.append({'groups': [], 'regex': None})
+        shard = self._shards[-1]
+        group = f'p{len(self._group_labels)}'
+        self._group_labels[group] = label
+        shard['groups'].append((group, pattern))
+        if compile:
+            self._compile(shard)
+    
+    def _compile(self, shard):
+        shard['regex'] = re.compile('|'.join(f'(?P<{group}>{pattern})' for group, pattern in shard['groups']))
+    
+    def _shard_matches(self, text):
+        for shard in self._shards:
+            for match in shard['regex'].finditer(text):
+                yield self._group_labels[match.lastgroup], match.start(), match.end()
+    
+    def finditer(self, text, labels=None):
+        """
+        Yield (label, start, end) for every whole match, shard by shard, then standalone patterns
+        labels: scan only these labels, each pattern separately, so matches may overlap
+        """
+        if labels is not None:
+            for label, regex in self._patterns:
+                if label in labels:
+                    for match in regex.finditer(text):
+                        yield label, match.start(), match.end()
+            return
+        yield from self._shard_matches(text)
+        for label, regex in self._standalone:
+            for match in regex.finditer(text):
+                yield label, match.start(), match.end()
+    
+    def find_all(self, text):
+        """Typed matches with character offsets, ordered by position (from the combined scan)"""
+        matches = [
+            {'text': text[start:end], 'label': label, 'start': start, 'end': end}
+            for label, start, end in self.finditer(text)
+        ]
+        if len(self._shards) + len(self._standalone) > 1:
+            matches.sort(key=lambda m: m['start'])
+        return matches
+    
+    def group(self, text):
+        """
+        re.findall results grouped by label
+        Each pattern is scanned on its own, so matches overlapping another pattern's (the
+        MENTION inside an email address) are kept.
+        """
+        grouped = {label: [] for label in self.labels}
+        for label, regex in self._patterns:
+            grouped[label].extend(regex.findall(text))
+        return grouped
+
+
+class Redactor:
+    """
+    Linear-time redaction of model entities and sensitive pattern matches
+    Spans are merged, overlaps resolved, and the output is built in one forward pass
+    """
+    
+    ENTITY_TYPES = ['PERSON', 'ORG', 'GPE', 'DATE']
+    PATTERN_TYPES = ['EMAIL', 'SSN', 'CREDIT_CARD']
+    
+    def __init__(self, pattern_matcher=None, entity_types=None, pattern_types=None):
+        self.pattern_matcher = pattern_matcher if pattern_matcher is not None else PatternMatcher(CUSTOM_PATTERNS)
+        self.entity_types = self.ENTITY_TYPES if entity_types is None else entity_types
+        self.pattern_types = self.PATTERN_TYPES if pattern_types is None else pattern_types
+    
+    resolve_overlaps = staticmethod(resolve_overlaps)
+    
+    def spans(self, text, entities, entity_types=None, pattern_types=None):
+        """
+        Non-overlapping spans to redact
+        entities: iterable of (start, end, label) from the model
+        """
+        entity_types = set(self.entity_types if entity_types is None else entity_types)
+        pattern_types = set(self.pattern_types if pattern_types is None else pattern_types)
+        
+        spans = [span for span in entities if span[2] in entity_types]
+        if pattern_types:
+            # Scanned per requested type: in a combined scan an unrequested match (say a URL)
+            # could swallow a requested one inside it (an email in its query string)
+            spans.extend(
+                (start, end, label)
+                for label, start, end in self.pattern_matcher.finditer(text, labels=pattern_types)
+            )
+        return self.resolve_overlaps(spans)
+    
+    @staticmethod
+    def render(text, spans, chunk_size=65536):
+        """Yield text with resolved spans replaced by [LABEL], in chunks of roughly chunk_size characters"""
+        parts = []
+        size = 0
+        last_end = 0
+        for start, end, label in spans:
+            parts.append(text[last_end:start])
+            parts.append(f'[{label}]')
+            size += start - last_end + len(label) + 2
+            last_end = end
+            if size >= chunk_size:
+                yield ''.join(parts)
+                parts = []
+                size = 0
+        parts.append(text[last_end:])
+        yield ''.join(parts)
+    
+    def iter_redact(self, text, entities, entity_types=None, pattern_types=None, chunk_size=65536):
+        """Yield the redacted text in chunks"""
+        return self.render(text, self.spans(text, entities, entity_types, pattern_types), chunk_size)
+    
+    def redact(self, text, entities, entity_types=None, pattern_types=None):
+        """Redacted copy of text"""
+        return ''.join(self.iter_redact(text, entities, entity_types, pattern_types, chunk_size=len(text) + 1))
+
+
+class DocumentChunker:
+    """
+    Splits long text into overlapping chunks on paragraph or sentence boundaries
+    Each chunk owns a "core" region; entities are kept only from the chunk whose core
+    contains their start, so results from the overlap zones are not duplicated. An entity
+    running into a chunk's end may be cut short there, so it is taken from the next chunk,
+    which holds it whole, even when it starts before that chunk's core.
+    """
+    
+    SENTENCE_END = re.compile(r'[.!?][\'")\]]*\s+')
+    
+    def __init__(self, max_chars=100000, overlap=1000):
+        if overlap >= max_chars // 2:
+            raise ValueError('overlap must be less than half of max_chars')
+        self.max_chars = max_chars
+        self.overlap = overlap
+    
+    def _boundary(self, text, start):
+        """Best place to end a chunk beginning at start"""
+        limit = start + self.max_chars
+        floor = start + self.max_chars // 2
+        
+        paragraph = text.rfind('\n\n', floor, limit)
+        if paragraph != -1:
+            return paragraph + 2
+        
+        last_sentence = None
+        for last_sentence in self.SENTENCE_END.finditer(text, floor, limit):
+            pass
+        if last_sentence is not None:
+            return last_sentence.end()
+        
+        space = max(text.rfind(' ', floor, limit), text.rfind('\n', floor, limit))
+        return space + 1 if space != -1 else limit
+    
+    def _next_start(self, text, start, end):
+        """Start of the following chunk: a sentence or word start inside the overlap"""
+        lower = max(start + 1, end - self.overlap)
+        sentence = self.SENTENCE_END.search(text, lower, end)
+        if sentence is not None and sentence.end() < end:
+            return sentence.end()
+        space = text.find(' ', lower, end)
+        return space + 1 if space != -1 and space + 1 < end else lower
+    
+    def windows(self, text):
+        """Yield (start, end, core_start, core_end) for each chunk, in order"""
+        length = len(text)
+        start = core_start = 0
+        while length - start > self.max_chars:
+            end = self._boundary(text, start)
+            next_start = self._next_start(text, start, end)
+            core_end = (next_start + end) // 2
+            yield start, end, core_start, core_end
+            start, core_start = next_start, core_end
+        yield start, length, core_start, length
+    
+    def entity_spans(self, pipelines, text, task='ner', batch_size=8, n_process=1):
+        """
+        Run the chunks through nlp.pipe and merge entities back to global offsets
+        Returns non-overlapping (start, end, label) spans
+        """
+        windows = list(self.windows(text))
+        chunks = (
+            (text[start:end], (start, end, core_start, core_end,
+                               windows[i + 1][0] if i + 1 < len(windows) else None,
+                               windows[i - 1][1] if i else None))
+            for i, (start, end, core_start, core_end) in enumerate(windows)
+        )
+        spans = set()
+        docs = pipelines.pipe(chunks, task=task, as_tuples=True, batch_size=batch_size, n_process=n_process)
+        for doc, (offset, end, core_start, core_end, next_start, previous_end) in docs:
+            for ent in doc.ents:
+                start, stop = offset + ent.start_char, offset + ent.end_char
+                # Reaching the chunk end, it may be truncated; the next chunk has all of it
+                if next_start is not None and stop >= end and start >= next_start:
+                    continue
+                crossed_previous_end = previous_end is not None and start < core_start and stop >= previous_end
+                if core_start <= start < core_end or crossed_previous_end:
+                    spans.add((start, stop, ent.label_))
+        return resolve_overlaps(spans)
+
+
+class IncrementalAnalyzer:
+    """
+    Session-aware re-analysis of edited documents
+    Documents are split into paragraphs (long paragraphs into sentences). On each update only
+    the segments whose text changed are re-parsed; entities of unchanged segments are reused
+    with shifted offsets. Entities never cross a segment boundary.
+    """
+    
+    PARAGRAPH_BREAK = re.compile(r'\n[ \t]*\n\s*')
+    
+    def __init__(self, pipelines, chunker=None, max_documents=256, max_segment_chars=2000, task='ner'):
+        self.pipelines = pipelines
+        self.chunker = chunker
+        self.max_documents = max_documents
+        self.max_segment_chars = max_segment_chars
+        self.task = task
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def segments(self, text):
+        """Split text into consecutive segments that concatenate back to the text"""
+        segments = []
+        start = 0
+        breaks = [match.end() for match in self.PARAGRAPH_BREAK.finditer(text)] + [len(text)]
+        for end in breaks:
+            if end <= start:
+                continue
+            if end - start > self.max_segment_chars:
+                for match in DocumentChunker.SENTENCE_END.finditer(text, start, end):
+                    segments.append(text[start:match.end()])
+                    start = match.end()
+            if start < end:
+                segments.append(text[start:end])
+            start = end
+        return segments
+    
+    def _parse_segments(self, segments):
+        """(start, end, label) spans relative to each segment"""
+        results = [None] * len(segments)
+        short = [i for i, segment in enumerate(segments) if self.chunker is None or len(segment) <= self.chunker.max_chars]
+        for i, doc in zip(short, self.pipelines.pipe((segments[i] for i in short), task=self.task)):
+            results[i] = [(ent.start_char, ent.end_char, ent.label_) for ent in doc.ents]
+        for i, segment in enumerate(segments):
+            if results[i] is None:
+                results[i] = self.chunker.entity_spans(self.pipelines, segment, task=self.task)
+        return results
+    
+    @staticmethod
+    def apply_edits(text, edits):
+        """Apply {start, end, text} replacements in order, each against the result of the previous one"""
+        for edit in edits:
+            start = edit['start']
+            end = edit.get('end', start)
+            if not 0 <= start <= end <= len(text):
+                raise ValueError(f'Edit range {start}:{end} is outside the document (length {len(text)})')
+            text = text[:start] + edit.get('text', '') + text[end:]
+        return text
+    
+    def update(self, doc_id, text=None, edits=None, base_version=None):
+        """
+        Analyze a new version of a document
+        Pass either the full text (diffed against the previous version) or a list of edits
+        against version base_version. Raises KeyError when edits can't be applied because the
+        server no longer has (or has a different version of) the document, including when a
+        concurrent update stores a new version first.
+        Returns (text, entities, info)
+        """
+        with self._lock:
+            session = self._sessions.get(doc_id)
+        
+        if edits is not None:
+            if session is None:
+                raise KeyError(f'Unknown document {doc_id!r}; send the full text')
+            if base_version is not None and base_version != session['version']:
+                raise KeyError(f"Document {doc_id!r} is at version {session['version']}, not {base_version}; send the full text")
+            text = self.apply_edits(session['text'], edits)
+        elif text is None:
+            raise ValueError('Provide either text or edits')
+        
+        segments = self.segments(text)
+        spans = [None] * len(segments)
+        if session is not None:
+            matcher = difflib.SequenceMatcher(None, session['segments'], segments, autojunk=False)
+            for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+                if tag == 'equal':
+                    spans[j1:j2] = session['spans'][i1:i2]
+        changed = [j for j, segment_spans in enumerate(spans) if segment_spans is None]
+        for j, segment_spans in zip(changed, self._parse_segments([segments[j] for j in changed])):
+            spans[j] = segment_spans
+        
+        entities = []
+        offset = 0
+        for segment, segment_spans in zip(segments, spans):
+            for start, end, label in segment_spans:
+                entities.append({
+                    'text': text[offset + start:offset + end],
+                    'label': label,
+                    'start': offset + start,
+                    'end': offset + end
+                })
+            offset += len(segment)
+        
+        with self._lock:
+            # Parsing ran unlocked, so another update may have stored a newer version meanwhile
+            current = self._sessions.get(doc_id)
+            if edits is not None and current is not session:
+                raise KeyError(f'Document {doc_id!r} changed while the edits were applied; send the full text')
+            version = current['version'] + 1 if current is not None else 1
+            self._sessions[doc_id] = {'text': text, 'segments': segments, 'spans': spans, 'version': version}
+            self._sessions.move_to_end(doc_id)
+            while len(self._sessions) > self.max_documents:
+                self._sessions.popitem(last=False)
+        
+        info = {
+            'doc_id': doc_id,
+            'version': version,
+            'segments': len(segments),
+            'reparsed_segments': len(changed),
+            'reparsed_chars': sum(len(segments[j]) for j in changed)
+        }
+        return text, entities, info
+    
+    def forget(self, doc_id):
+        with self._lock:
+            self._sessions.pop(doc_id, None)
+    
+    def __len__(self):
+        return len(self._sessions)
+
+
+class EntityAggregator:
+    """
+    Single-pass entity statistics
+    Each entity updates the per-type groups, label and text counts and the first-seen
+    de-duplicated sets at once. Aggregators merge, so corpus-level statistics can be built
+    document by document without keeping any Doc around.
+    keep_occurrences: also keep every occurrence per type (entities_by_type with duplicates);
+    turn it off for large corpora to keep memory proportional to the distinct entities.
+    """
+    
+    def __init__(self, keep_occurrences=True):
+        self.keep_occurrences = keep_occurrences
+        self.total = 0
+        self.documents = 0
+        self.label_counts = Counter()
+        self.text_counts = Counter()
+        self.occurrences = defaultdict(list)
+        # label -> {text: position of its first occurrence}, in first-seen order
+        self.first_seen = defaultdict(dict)
+    
+    def add(self, text, label):
+        self.label_counts[label] += 1
+        self.text_counts[text] += 1
+        if self.keep_occurrences:
+            self.occurrences[label].append(text)
+        self.first_seen[label].setdefault(text, self.total)
+        self.total += 1
+    
+    def add_spans(self, text, spans):
+        """Add one document's (start, end, label) spans"""
+        for start, end, label in spans:
+            self.add(text[start:end], label)
+        self.documents += 1
+        return self
+    
+    def add_entities(self, entities):
+        """Add one document's entity dicts"""
+        for ent in entities:
+            self.add(ent['text'], ent['label'])
+        self.documents += 1
+        return self
+    
+    def add_doc(self, doc):
+        for ent in doc.ents:
+            self.add(ent.text, ent.label_)
+        self.documents += 1
+        return self
+    
+    def merge(self, other):
+        """Fold another aggregator into this one (other's entities count as coming after ours)"""
+        for label, texts in other.first_seen.items():
+            seen = self.first_seen[label]
+            for text, position in texts.items():
+                seen.setdefault(text, self.total + position)
+        self.label_counts.update(other.label_counts)
+        self.text_counts.update(other.text_counts)
+        if self.keep_occurrences:
+            for label, texts in other.occurrences.items():
+                self.occurrences[label].extend(texts)
+        self.total += other.total
+        self.documents += other.documents
+        return self
+    
+    __iadd__ = merge
+    
+    def unique(self, *labels):
+        """Distinct entity texts of the given types, in first-seen order"""
+        if len(labels) == 1:
+            return list(self.first_seen.get(labels[0], ()))
+        positions = {}
+        for label in labels:
+            for text, position in self.first_seen.get(label, {}).items():
+                if text not in positions or position < positions[text]:
+                    positions[text] = position
+        return sorted(positions, key=positions.get)
+    
+    def most_common(self, n=10):
+        return self.text_counts.most_common(n)
+    
+    def entities_by_type(self, unique=False):
+        """label -> entity texts; every occurrence, or distinct texts when unique (or not kept)"""
+        if unique or not self.keep_occurrences:
+            return {label: list(texts) for label, texts in self.first_seen.items()}
+        return {label: list(texts) for label, texts in self.occurrences.items()}
+    
+    def summary(self, top_k=10):
+        """The analyze_text result for everything added so far"""
+        return {
+            'total_entities': self.total,
+            'entity_counts': dict(self.label_counts),
+            'entities_by_type': self.entities_by_type(),
+            'most_common_entities': self.most_common(top_k),
+            'entity_types_found': list(self.label_counts.keys())
+        }
+
+
+class RelationExtractor:
+    """
+    Entity-anchored subject-verb-object triples from the dependency parse
+    Each doc is walked once: every token's dependency label assigns it a role (subject,
+    object, prepositional object, passive agent) under its verb, conjuncts inherit the
+    role of their head, and arguments are anchored to the doc.ents span that contains them
+    (or the first entity inside their subtree).
+    """
+    
+    SUBJECT_DEPS = {'nsubj', 'csubj'}
+    PASSIVE_SUBJECT_DEPS = {'nsubjpass', 'csubjpass'}
+    OBJECT_DEPS = {'dobj', 'obj', 'attr', 'oprd', 'dative'}
+    
+    def __init__(self, pipelines=None, entity_types=None, require_entities=True):
+        """
+        entity_types: only anchor arguments to entities of these labels (default: any)
+        require_entities: drop triples whose subject or object is not an entity
+        """
+        self.pipelines = pipelines
+        self.entity_types = set(entity_types) if entity_types else None
+        self.require_entities = require_entities
+    
+    def _argument(self, doc, token, entity_at):
+        ent = entity_at[token.i]
+        if ent is None:
+            for i in range(token.left_edge.i, token.right_edge.i + 1):
+                if entity_at[i] is not None:
+                    ent = entity_at[i]
+                    break
+        if ent is not None:
+            return {'text': ent.text, 'label': ent.label_, 'start': ent.start_char, 'end': ent.end_char}
+        if self.require_entities:
+            return None
+        span = doc[token.left_edge.i:token.right_edge.i + 1]
+        return {'text': span.text, 'label': None, 'start': span.start_char, 'end': span.end_char}
+    
+    def relations(self, doc):
+        """Triples for one parsed Doc, in order of their verbs"""
+        entity_at = [None] * len(doc)
+        for ent in doc.ents:
+            if self.entity_types is None or ent.label_ in self.entity_types:
+                for i in range(ent.start, ent.end):
+                    entity_at[i] = ent
+        
+        # One pass over the tokens: role per argument token, keyed by its verb
+        subjects = defaultdict(list)
+        objects = defaultdict(list)
+        roles = {}
+        conjuncts = []
+        for token in doc:
+            dep = token.dep_
+            head = token.head
+            if dep in self.SUBJECT_DEPS:
+                roles[token.i] = ('subject', head.i, None)
+            elif dep in self.PASSIVE_SUBJECT_DEPS:
+                roles[token.i] = ('object', head.i, None)
+            elif dep in self.OBJECT_DEPS:
+                roles[token.i] = ('object', head.i, None)
+            elif dep == 'pobj' and head.dep_ == 'agent':
+                roles[token.i] = ('subject', head.head.i, None)
+            elif dep == 'pobj' and head.dep_ == 'prep' and head.head.pos_ in ('VERB', 'AUX', ''):
+                roles[token.i] = ('object', head.head.i, head)
+            elif dep == 'conj':
+                conjuncts.append(token)
+        for token in conjuncts:
+            if token.head.i in roles:
+                roles[token.i] = roles[token.head.i]
+        for i, (role, verb, prep) in roles.items():
+            (subjects if role == 'subject' else objects)[verb].append((doc[i], prep))
+        
+        triples = []
+        for verb_i in sorted(subjects):
+            if verb_i not in objects:
+                continue
+            verb = doc[verb_i]
+            negated = any(child.dep_ == 'neg' for child in verb.children)
+            sentence = verb.sent
+            for subject_token, _ in subjects[verb_i]:
+                subject = self._argument(doc, subject_token, entity_at)
+                if subject is None:
+                    continue
+                for object_token, prep in objects[verb_i]:
+                    obj = self._argument(doc, object_token, entity_at)
+                    if obj is None or (obj['start'], obj['end']) == (subject['start'], subject['end']):
+                        continue
+                    relation = verb.lemma_ or verb.text.lower()
+                    if prep is not None:
+                        relation = f'{relation} {prep.text.lower()}'
+                    triples.append({
+                        'subject': subject,
+                        'relation': relation,
+                        'verb': {'text': verb.text, 'start': verb.idx, 'end': verb.idx + len(verb.text)},
+                        'object': obj,
+                        'negated': negated,
+                        'sentence': {'start': sentence.start_char, 'end': sentence.end_char}
+                    })
+        return triples
+    
+    def process(self, texts, batch_size=256, n_process=1):
+        """Yield the triples of each text, parsing the whole stream with nlp.pipe"""
+        for doc in self.pipelines.pipe(texts, task='parse', batch_size=batch_size, n_process=n_process):
+            yield self.relations(doc)
+
 
 class EntityRecognitionSystem:
-    def __init__(self, model='en_core_web_sm'):
+    def __init__(self, model='en_core_web_sm', cache_size=128, chunk_size=100000, chunk_overlap=1000,
+                 doc_store_path=None):
         """
         Initialize NER system with spaCy
         Models available: en_core_web_sm, en_core_web_md, en_core_web_lg
+        cache_size: number of parsed documents kept in the LRU doc cache (0 disables it)
+        chunk_size: texts longer than this many characters are parsed in overlapping chunks
+        doc_store_path: directory of stored parses (see doc_store.py), reused by document id
         """
+        # Imported here so that importing ner_core (e.g. from app.py) stays fast
+        import spacy
+        
         try:
             self.nlp = spacy.load(model)
         except OSError:
@@ -44,27 +1240,133 @@ class EntityRecognitionSystem:
             'ORDINAL': '"first", "second", etc.',
             'CARDINAL': 'Numerals that do not fall under another type'
         }
-    
-    def extract_entities(self, text):
-        """Extract all named entities from text"""
-        doc = self.nlp(text)
         
+        self.pipelines = PipelineRegistry(self.nlp)
+        self._doc_cache = DocCache(cache_size)
+        self.batch_engine = BatchEngine(self.nlp, pipelines=self.pipelines)
+        self.pattern_matcher = PatternMatcher()
+        self._pattern_matchers = {}
+        self.chunker = DocumentChunker(chunk_size, chunk_overlap)
+        self.incremental = IncrementalAnalyzer(self.pipelines, self.chunker)
+        self.relation_extractor = RelationExtractor(self.pipelines)
+        
+        self.doc_store = None
+        if doc_store_path:
+            self.open_doc_store(doc_store_path)
+        
+        self.rules = None
+        self.rule_engine = None
+    
+    def enable_rules(self, gazetteer=None, patterns=None, case_sensitive=False):
+        """
+        Set up the model-free fast path (rules=True on extraction methods)
+        gazetteer: file of known names (see RulePipelines.read_gazetteer)
+        patterns: regex patterns by label (default: the custom patterns)
+        """
+        if patterns is None:
+            patterns = getattr(self, 'custom_patterns', CUSTOM_PATTERNS)
+        self.rules = RulePipelines(gazetteer, patterns, lang=self.nlp.lang, case_sensitive=case_sensitive)
+        self.rule_engine = BatchEngine(self.rules.nlp, pipelines=self.rules, batch_size=self.batch_engine.batch_size)
+        return self.rules
+    
+    def _rule_pipelines(self):
+        if self.rules is None:
+            self.enable_rules()
+        return self.rules
+    
+    def open_doc_store(self, path, shard_size=1000):
+        """
+        Persist parses as DocBin shards under path, keyed by document id and model version
+        Parses are buffered until a shard fills up; close() writes the rest (it also runs at exit).
+        """
+        from doc_store import DocStore
+        self.close()
+        self.doc_store = DocStore(path, self.nlp, shard_size=shard_size)
+        atexit.register(self.doc_store.flush)
+        return self.doc_store
+    
+    def close(self):
+        """Write parses still buffered in the doc store and close it"""
+        if self.doc_store is not None:
+            atexit.unregister(self.doc_store.flush)
+            self.doc_store.close()
+            self.doc_store = None
+    
+    def _parse(self, text, task='ner', doc_id=None):
+        """
+        Parse text once; repeated calls on the same text reuse the cached Doc
+        task: 'ner' runs only entity recognition, 'parse' adds tagging and dependency parsing
+        doc_id: with a doc store open, load the stored parse of this document (text may then
+        be None) or parse text and store it under doc_id
+        """
+        components = self.pipelines.components(task)
+        if doc_id is not None and self.doc_store is not None:
+            doc = self.doc_store.get(doc_id, text, components)
+            if doc is None:
+                if text is None:
+                    raise KeyError(f'No stored parse for document {doc_id!r}')
+                doc = self.pipelines(text, task)
+                self.doc_store.put(doc_id, doc, components)
+            return doc
+        if text is None:
+            raise ValueError('text is required without a doc store')
+        doc = self._doc_cache.get(text, components)
+        if doc is None:
+            doc = self.pipelines(text, task)
+            self._doc_cache.put(text, doc, components)
+        return doc
+    
+    def cache_stats(self):
+        """Return doc cache hit/miss/eviction counters"""
+        return self._doc_cache.stats()
+    
+    def clear_cache(self):
+        """Drop all cached parses"""
+        self._doc_cache.clear()
+    
+    def extract_entity_spans(self, text, n_process=1, rules=False):
+        """
+        (start, end, label) for every entity
+        Texts longer than chunk_size are parsed in overlapping chunks, keeping memory bounded
+        rules: use the gazetteer and regex fast path instead of the statistical model
+        """
+        if rules:
+            pipelines = self._rule_pipelines()
+            if len(text) > self.chunker.max_chars:
+                return self.chunker.entity_spans(pipelines, text)
+            return [(ent.start_char, ent.end_char, ent.label_) for ent in pipelines(text).ents]
+        if len(text) > self.chunker.max_chars:
+            return self.chunker.entity_spans(self.pipelines, text, task='ner', n_process=n_process)
+        doc = self._parse(text)
+        return [(ent.start_char, ent.end_char, ent.label_) for ent in doc.ents]
+    
+    def extract_entities(self, text, rules=False):
+        """Extract all named entities from text (rules: skip the model, see enable_rules)"""
         entities = []
-        for ent in doc.ents:
+        for start, end, label in self.extract_entity_spans(text, rules=rules):
             entities.append({
-                'text': ent.text,
-                'label': ent.label_,
-                'start': ent.start_char,
-                'end': ent.end_char,
-                'description': self.entity_types.get(ent.label_, 'Unknown entity type')
+                'text': text[start:end],
+                'label': label,
+                'start': start,
+                'end': end,
+                'description': self.entity_types.get(label, 'Unknown entity type')
             })
         
         return entities
     
+    def extract_entities_incremental(self, doc_id, text=None, edits=None, base_version=None):
+        """
+        Extract entities from a new version of a tracked document, re-parsing only what changed
+        Returns (entities, info) where info reports the version and how much was re-parsed
+        """
+        _, entities, info = self.incremental.update(doc_id, text=text, edits=edits, base_version=base_version)
+        for ent in entities:
+            ent['description'] = self.entity_types.get(ent['label'], 'Unknown entity type')
+        return entities, info
+    
     def extract_by_type(self, text, entity_type):
         """Extract entities of a specific type"""
-        doc = self.nlp(text)
-        entities = [ent.text for ent in doc.ents if ent.label_ == entity_type]
+        entities = [text[start:end] for start, end, label in self.extract_entity_spans(text) if label == entity_type]
         return list(set(entities))  # Remove duplicates
     
     def get_people(self, text):
@@ -77,8 +1379,7 @@ class EntityRecognitionSystem:
     
     def get_locations(self, text):
         """Extract all locations (GPE and LOC)"""
-        doc = self.nlp(text)
-        locations = [ent.text for ent in doc.ents if ent.label_ in ['GPE', 'LOC']]
+        locations = [text[start:end] for start, end, label in self.extract_entity_spans(text) if label in ['GPE', 'LOC']]
         return list(set(locations))
     
     def get_dates(self, text):
@@ -89,33 +1390,27 @@ class EntityRecognitionSystem:
         """Extract all monetary values"""
         return self.extract_by_type(text, 'MONEY')
     
-    def analyze_text(self, text):
-        """Complete entity analysis of text"""
-        doc = self.nlp(text)
-        
-        # Extract entities by type
-        entities_by_type = defaultdict(list)
-        for ent in doc.ents:
-            entities_by_type[ent.label_].append(ent.text)
-        
-        # Count entity occurrences
-        entity_counts = Counter([ent.label_ for ent in doc.ents])
-        
-        # Get most common entities
-        all_entities = [ent.text for ent in doc.ents]
-        most_common = Counter(all_entities).most_common(10)
-        
-        return {
-            'total_entities': len(doc.ents),
-            'entity_counts': dict(entity_counts),
-            'entities_by_type': dict(entities_by_type),
-            'most_common_entities': most_common,
-            'entity_types_found': list(entity_counts.keys())
-        }
+    def analyze_text(self, text, doc_id=None):
+        """Complete entity analysis of text (or of the stored parse of doc_id)"""
+        if doc_id is not None and self.doc_store is not None:
+            return EntityAggregator().add_doc(self._parse(text, doc_id=doc_id)).summary()
+        return EntityAggregator().add_spans(text, self.extract_entity_spans(text)).summary()
+    
+    def analyze_corpus(self, texts, batch_size=None, n_process=None, top_k=10):
+        """
+        analyze_text over many texts, aggregated incrementally as the docs stream out of nlp.pipe
+        Per-type groups are de-duplicated so memory grows with distinct entities, not the corpus
+        """
+        aggregator = EntityAggregator(keep_occurrences=False)
+        for doc in self.batch_engine.docs(texts, batch_size, n_process, task='ner'):
+            aggregator.add_doc(doc)
+        result = aggregator.summary(top_k)
+        result['documents'] = aggregator.documents
+        return result
     
     def extract_relationships(self, text):
         """Extract subject-verb-object relationships"""
-        doc = self.nlp(text)
+        doc = self._parse(text, task='parse')
         relationships = []
         
         for sent in doc.sents:
@@ -133,15 +1428,28 @@ class EntityRecognitionSystem:
         
         return relationships
     
-    def extract_noun_phrases(self, text):
+    def extract_relations(self, text):
+        """Entity-anchored (subject, relation, object) triples with character offsets"""
+        return self.relation_extractor.relations(self._parse(text, task='parse'))
+    
+    def batch_relations(self, texts, batch_size=None, n_process=None):
+        """extract_relations over many texts through nlp.pipe; one list of triples per text"""
+        return list(self.relation_extractor.process(
+            texts,
+            batch_size=batch_size or self.batch_engine.batch_size,
+            n_process=n_process or self.batch_engine.n_process
+        ))
+    
+    def extract_noun_phrases(self, text, doc_id=None):
         """Extract all noun phrases"""
-        doc = self.nlp(text)
+        doc = self._parse(text, task='parse', doc_id=doc_id)
         noun_phrases = [chunk.text for chunk in doc.noun_chunks]
         return noun_phrases
     
-    def visualize_entities(self, text):
+    def visualize_entities(self, text, doc_id=None):
         """Create HTML visualization of entities"""
-        doc = self.nlp(text)
+        doc = self._parse(text, doc_id=doc_id)
+        text = doc.text
         
         html_parts = []
         last_end = 0
@@ -177,33 +1485,88 @@ class EntityRecognitionSystem:
         
         return ''.join(html_parts)
     
-    def extract_custom_patterns(self, text, pattern_dict):
+    def _matcher_for(self, pattern_dict):
+        """Compiled single-pass matcher for a pattern dict (defaults to the registered patterns)"""
+        if pattern_dict is None:
+            return self.pattern_matcher
+        key = tuple(pattern_dict.items())
+        matcher = self._pattern_matchers.get(key)
+        if matcher is None:
+            if len(self._pattern_matchers) >= 32:
+                self._pattern_matchers.clear()
+            matcher = self._pattern_matchers[key] = PatternMatcher(pattern_dict)
+        return matcher
+    
+    def extract_custom_patterns(self, text, pattern_dict=None):
         r"""
         Extract entities based on custom regex patterns
         pattern_dict: {'EMAIL': r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b', ...}
         """
-        custom_entities = defaultdict(list)
-        
-        for entity_type, pattern in pattern_dict.items():
-            matches = re.findall(pattern, text)
-            custom_entities[entity_type].extend(matches)
-        
-        return dict(custom_entities)
+        return self._matcher_for(pattern_dict).group(text)
     
-    def batch_process(self, texts):
-        """Process multiple texts efficiently"""
-        results = []
-        
-        for doc in self.nlp.pipe(texts):
-            entities = []
-            for ent in doc.ents:
-                entities.append({
-                    'text': ent.text,
-                    'label': ent.label_
-                })
-            results.append(entities)
-        
-        return results
+    def extract_custom_matches(self, text, pattern_dict=None):
+        """Custom pattern matches as typed entities with character offsets"""
+        return self._matcher_for(pattern_dict).find_all(text)
+    
+    def batch_process(self, texts, batch_size=None, n_process=None, columnar=False, rules=False):
+        """
+        Process multiple texts efficiently with nlp.pipe
+        columnar: return a compact EntityTable instead of a list of entity lists
+        rules: use the gazetteer and regex fast path instead of the statistical model
+        For corpora too large to hold in memory, use process_file
+        """
+        engine = self.batch_engine
+        if rules:
+            self._rule_pipelines()
+            engine = self.rule_engine
+        if columnar:
+            return engine.process_table(texts, batch_size=batch_size, n_process=n_process)
+        return list(engine.process(texts, batch_size=batch_size, n_process=n_process))
+    
+    def index_documents(self, index, documents, batch_size=None, n_process=None, commit_every=1000):
+        """
+        Extract entities from (doc_key, text) pairs and add them to an entity_index.EntityIndex
+        Documents are committed in groups of commit_every; returns the number indexed.
+        """
+        pairs = ((text, (doc_key, text)) for doc_key, text in documents)
+        pending = []
+        indexed = 0
+        for entities, (doc_key, text) in self.batch_engine.process_tuples(pairs, batch_size, n_process):
+            pending.append((doc_key, text, entities))
+            if len(pending) >= commit_every:
+                index.add_many(pending)
+                indexed += len(pending)
+                pending = []
+        if pending:
+            index.add_many(pending)
+            indexed += len(pending)
+        return indexed
+    
+    def store_documents(self, documents, batch_size=None, n_process=None, task='parse'):
+        """
+        Parse (doc_id, text) pairs through nlp.pipe into the doc store, skipping stored ids
+        Returns the number of documents parsed; later calls by doc_id only deserialize.
+        """
+        if self.doc_store is None:
+            raise ValueError('No doc store open (see open_doc_store)')
+        components = self.pipelines.components(task)
+        pairs = ((text, doc_id) for doc_id, text in documents if self.doc_store.get(doc_id, text, components) is None)
+        parsed = 0
+        for doc, doc_id in self.pipelines.pipe(
+            pairs, task=task, as_tuples=True,
+            batch_size=batch_size or self.batch_engine.batch_size, n_process=n_process or self.batch_engine.n_process
+        ):
+            self.doc_store.put(doc_id, doc, components)
+            parsed += 1
+        self.doc_store.flush()
+        return parsed
+    
+    def process_file(self, path, format=None, text_field='text', batch_size=None, n_process=None):
+        """
+        Lazily process a large .txt/.jsonl file (one document per line) through a MappedCorpus
+        Yields {index, byte_start, byte_end, entities} per document with flat memory use
+        """
+        return self.batch_engine.process_corpus(MappedCorpus(path, format, text_field), batch_size, n_process)
     
     def export_entities(self, text, format='json'):
         """Export entities in different formats"""
@@ -219,9 +1582,10 @@ class EntityRecognitionSystem:
         else:
             return entities
     
-    def get_entity_context(self, text, entity_text, window=50):
+    def get_entity_context(self, text, entity_text, window=50, doc_id=None):
         """Get context around a specific entity"""
-        doc = self.nlp(text)
+        doc = self._parse(text, doc_id=doc_id)
+        text = doc.text
         contexts = []
         
         for ent in doc.ents:
@@ -238,20 +1602,30 @@ class EntityRecognitionSystem:
 class AdvancedEntityExtractor(EntityRecognitionSystem):
     """Extended NER with custom entity recognition"""
     
-    def __init__(self):
-        super().__init__()
-        
-        # Custom patterns for additional entities
-        self.custom_patterns = {
-            'EMAIL': r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b',
-            'PHONE': r'\b\d{3}[-.]?\d{3}[-.]?\d{4}\b',
-            'URL': r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\\(\\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+',
-            'IP_ADDRESS': r'\b(?:\d{1,3}\.){3}\d{1,3}\b',
-            'CREDIT_CARD': r'\b\d{4}[- ]?\d{4}[- ]?\d{4}[- ]?\d{4}\b',
-            'SSN': r'\b\d{3}-\d{2}-\d{4}\b',
-            'HASHTAG': r'#\w+',
-            'MENTION': r'@\w+'
-        }
+    def __init__(self, model='en_core_web_sm', cache_size=128, chunk_size=100000, chunk_overlap=1000, kb_path=None,
+                 doc_store_path=None):
+        """kb_path: alias table built by entity_linker.build_alias_table, for offline entity linking"""
+        super().__init__(model=model, cache_size=cache_size, chunk_size=chunk_size, chunk_overlap=chunk_overlap,
+                         doc_store_path=doc_store_path)
+        
+        # Custom patterns for additional entities, compiled once into a single-pass matcher
+        self.custom_patterns = dict(CUSTOM_PATTERNS)
+        self.pattern_matcher = PatternMatcher(self.custom_patterns)
+        self.redactor = Redactor(self.pattern_matcher)
+        
+        self.linker = None
+        if kb_path:
+            self.load_knowledge_base(kb_path)
+    
+    def load_knowledge_base(self, kb_path, url_template=None):
+        """Link entities against a local, memory-mapped alias table instead of guessing Wikipedia URLs"""
+        from entity_linker import EntityLinker
+        self.linker = EntityLinker.from_path(kb_path, url_template=url_template)
+    
+    def add_custom_pattern(self, label, pattern):
+        """Register an extra regex entity type at runtime"""
+        self.pattern_matcher.add(label, pattern)
+        self.custom_patterns[label] = pattern
     
     def extract_all(self, text):
         """Extract both spaCy entities and custom patterns"""
@@ -259,34 +1633,35 @@ class AdvancedEntityExtractor(EntityRecognitionSystem):
         spacy_entities = self.extract_entities(text)
         
         # Get custom pattern entities
-        custom_entities = self.extract_custom_patterns(text, self.custom_patterns)
+        custom_entities = self.extract_custom_patterns(text)
         
         return {
             'standard_entities': spacy_entities,
             'custom_entities': custom_entities
         }
     
-    def anonymize_text(self, text, entity_types=None):
-        """Replace entities with placeholders for privacy"""
-        if entity_types is None:
-            entity_types = ['PERSON', 'ORG', 'GPE', 'DATE']
-        
-        doc = self.nlp(text)
-        anonymized = text
-        
-        # Sort entities by position (reverse to maintain indices)
-        entities = sorted(doc.ents, key=lambda x: x.start_char, reverse=True)
-        
-        for ent in entities:
-            if ent.label_ in entity_types:
-                placeholder = f'[{ent.label_}]'
-                anonymized = anonymized[:ent.start_char] + placeholder + anonymized[ent.end_char:]
-        
-        return anonymized
+    def iter_anonymized(self, text, entity_types=None, pattern_types=None, chunk_size=65536):
+        """
+        Stream the anonymized text in chunks
+        entity_types: model labels to redact (default PERSON, ORG, GPE, DATE)
+        pattern_types: custom pattern labels to redact (default EMAIL, SSN, CREDIT_CARD)
+        """
+        entities = self.extract_entity_spans(text)
+        return self.redactor.iter_redact(text, entities, entity_types, pattern_types, chunk_size)
+    
+    def anonymize_text(self, text, entity_types=None, pattern_types=None):
+        """Replace entities and sensitive patterns with placeholders for privacy"""
+        return ''.join(self.iter_anonymized(text, entity_types, pattern_types, chunk_size=len(text) + 1))
     
     def entity_linking(self, text):
-        """Link entities to Wikipedia (simple implementation)"""
+        """
+        Link entities to a knowledge base
+        With a knowledge base loaded, every PERSON/ORG/GPE mention is resolved offline in one
+        batch (kb_id, kb_prior); otherwise falls back to a Wikipedia URL built from the text.
+        """
         entities = self.extract_entities(text)
+        if self.linker is not None:
+            return self.linker.link(entities)
         
         for entity in entities:
             if entity['label'] in ['PERSON', 'ORG', 'GPE']:
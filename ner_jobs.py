@@ -0,0 +1,241 @@
+"""
+Asynchronous batch jobs for large submissions
+Jobs and their per-text results are persisted in SQLite (database/ner_logs.db by default),
+processed by a small pool of background worker threads through nlp.pipe, and can be
+polled for progress and downloaded once done.
+"""
+
+import json
+import os
+import queue
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    processed INTEGER NOT NULL DEFAULT 0,
+    options TEXT,
+    error TEXT,
+    owner TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    job_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    entities TEXT,
+    PRIMARY KEY (job_id, idx)
+);
+"""
+
+
+def _owner():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def _owner_alive(owner):
+    """Whether the process that claimed a job is still running (only checkable on this host)"""
+    host, _, pid = (owner or '').rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobStore:
+    """SQLite persistence for jobs and their per-text results"""
+    
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+    
+    def _connect(self):
+        # Opened on first use so importing the app never touches the database
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.executescript(SCHEMA)
+        return self._conn
+    
+    def create(self, texts, options=None):
+        job_id = uuid.uuid4().hex
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                'INSERT INTO jobs (id, status, total, options, created_at) VALUES (?, ?, ?, ?, ?)',
+                (job_id, 'queued', len(texts), json.dumps(options or {}), time.time())
+            )
+            conn.executemany(
+                'INSERT INTO job_items (job_id, idx, text) VALUES (?, ?, ?)',
+                ((job_id, i, text) for i, text in enumerate(texts))
+            )
+            conn.commit()
+        return job_id
+    
+    def claim(self, job_id):
+        """Mark a queued job as running in this process; False if someone else has it"""
+        with self._lock:
+            conn = self._connect()
+            cursor = conn.execute(
+                "UPDATE jobs SET status = 'running', owner = ?, started_at = COALESCE(started_at, ?) "
+                "WHERE id = ? AND status = 'queued'",
+                (_owner(), time.time(), job_id)
+            )
+            conn.commit()
+            return cursor.rowcount == 1
+    
+    def pending_items(self, job_id, limit):
+        with self._lock:
+            return self._connect().execute(
+                'SELECT idx, text FROM job_items WHERE job_id = ? AND entities IS NULL ORDER BY idx LIMIT ?',
+                (job_id, limit)
+            ).fetchall()
+    
+    def save_results(self, job_id, results):
+        """Store (idx, entities) pairs and advance the job's progress in one transaction"""
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                'UPDATE job_items SET entities = ? WHERE job_id = ? AND idx = ?',
+                ((json.dumps(entities), job_id, idx) for idx, entities in results)
+            )
+            conn.execute('UPDATE jobs SET processed = processed + ? WHERE id = ?', (len(results), job_id))
+            conn.commit()
+    
+    def finish(self, job_id, status, error=None):
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                'UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE id = ?',
+                (status, error, time.time(), job_id)
+            )
+            conn.commit()
+    
+    def get(self, job_id):
+        with self._lock:
+            conn = self._connect()
+            conn.row_factory = sqlite3.Row
+            try:
+                row = conn.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+            finally:
+                conn.row_factory = None
+        if row is None:
+            return None
+        job = dict(row)
+        job['options'] = json.loads(job['options'] or '{}')
+        job['progress'] = round(job['processed'] / job['total'], 4) if job['total'] else 1.0
+        return job
+    
+    def results(self, job_id, offset=0, limit=None):
+        """(idx, entities) for processed items, in input order"""
+        with self._lock:
+            rows = self._connect().execute(
+                'SELECT idx, entities FROM job_items WHERE job_id = ? AND entities IS NOT NULL '
+                'AND idx >= ? ORDER BY idx LIMIT ?',
+                (job_id, offset, -1 if limit is None else limit)
+            ).fetchall()
+        return [(idx, json.loads(entities)) for idx, entities in rows]
+    
+    def resumable(self):
+        """Queued jobs, plus running jobs whose owning process has died"""
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute("SELECT id, status, owner FROM jobs WHERE status IN ('queued', 'running')").fetchall()
+            job_ids = []
+            for job_id, status, owner in rows:
+                if status == 'running':
+                    if _owner_alive(owner):
+                        continue
+                    conn.execute("UPDATE jobs SET status = 'queued' WHERE id = ? AND status = 'running'", (job_id,))
+                job_ids.append(job_id)
+            conn.commit()
+        return job_ids
+
+
+class JobQueue:
+    """
+    Background job runner
+    engine_factory: callable returning a BatchEngine; called by the workers, so the model
+    can still be loading when a job is submitted
+    """
+    
+    def __init__(self, store, engine_factory, workers=1, chunk_size=256):
+        self.store = store
+        self.engine_factory = engine_factory
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+    
+    def _ensure_workers(self):
+        with self._lock:
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self.workers:
+                # Daemon threads: an interrupted job keeps its committed progress and is resumed later
+                thread = threading.Thread(target=self._work, name=f'ner-job-{len(self._threads)}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+    
+    def submit(self, texts, options=None):
+        job_id = self.store.create(texts, options)
+        self._ensure_workers()
+        self._queue.put(job_id)
+        return job_id
+    
+    def resume(self):
+        """Requeue unfinished jobs left over from a previous run"""
+        job_ids = self.store.resumable()
+        if job_ids:
+            self._ensure_workers()
+            for job_id in job_ids:
+                self._queue.put(job_id)
+        return job_ids
+    
+    def status(self, job_id):
+        return self.store.get(job_id)
+    
+    def results(self, job_id, offset=0, limit=None):
+        return self.store.results(job_id, offset, limit)
+    
+    def _work(self):
+        while True:
+            job_id = self._queue.get()
+            try:
+                self.run(job_id)
+            finally:
+                self._queue.task_done()
+    
+    def run(self, job_id):
+        """Process one job to completion in the calling thread"""
+        if not self.store.claim(job_id):
+            return
+        try:
+            engine = self.engine_factory()
+            while True:
+                items = self.store.pending_items(job_id, self.chunk_size)
+                if not items:
+                    break
+                pairs = ((text, idx) for idx, text in items)
+                results = [(idx, entities) for entities, idx in engine.process_tuples(pairs)]
+                self.store.save_results(job_id, results)
+            self.store.finish(job_id, 'done')
+        except Exception as e:
+            self.store.finish(job_id, 'failed', str(e))
@@ -0,0 +1,278 @@
+"""
+Lightweight in-process metrics for the NER service
+Counters, gauges and histograms rendered in the Prometheus text exposition format.
+With a shared directory, every process publishes snapshots there and /metrics reports
+the sum over all of them (multi-worker Gunicorn).
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds and text-length buckets in characters
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LENGTH_BUCKETS = (100, 500, 1000, 5000, 10000, 50000, 100000, 500000, 1000000)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in items) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = 'untyped'
+    
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values = {}
+    
+    def snapshot(self):
+        """JSON-serializable copy of the current values"""
+        with self._lock:
+            return [[list(key), value] for key, value in self._values.items()]
+    
+    def merge(self, snapshots):
+        """Values summed over (pid, alive, snapshot) triples from several processes"""
+        merged = {}
+        for _, _, entries in snapshots:
+            for key, value in entries:
+                key = tuple(tuple(item) for item in key)
+                merged[key] = merged.get(key, 0) + value
+        return merged
+    
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        for key, value in sorted(values.items()):
+            lines.append(f'{self.name}{_format_labels(key)} {_format_value(value)}')
+        return lines
+
+
+class CounterMetric(Metric):
+    kind = 'counter'
+    
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class GaugeMetric(Metric):
+    kind = 'gauge'
+    
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+    
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+    
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+    
+    def merge(self, snapshots):
+        # Gauges describe one process, so they are kept apart by pid and dropped when it exits
+        merged = {}
+        for pid, alive, entries in snapshots:
+            if not alive:
+                continue
+            for key, value in entries:
+                merged[tuple(sorted([tuple(item) for item in key] + [('pid', str(pid))]))] = value
+        return merged
+
+
+class HistogramMetric(Metric):
+    kind = 'histogram'
+    
+    def __init__(self, name, help_text, buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text)
+        self.buckets = tuple(buckets)
+    
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['counts'][i] += 1
+                    break
+            series['sum'] += value
+            series['count'] += 1
+    
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of the with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+    
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), dict(series, counts=list(series['counts']))] for key, series in self._values.items()]
+    
+    def merge(self, snapshots):
+        merged = {}
+        for _, _, entries in snapshots:
+            for key, series in entries:
+                key = tuple(tuple(item) for item in key)
+                total = merged.get(key)
+                if total is None:
+                    total = merged[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+                total['counts'] = [a + b for a, b in zip(total['counts'], series['counts'])]
+                total['sum'] += series['sum']
+                total['count'] += series['count']
+        return merged
+    
+    def render(self, values=None):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+        if values is None:
+            with self._lock:
+                values = {key: dict(series, counts=list(series['counts'])) for key, series in self._values.items()}
+        for key, series in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series['counts']):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels(key, [("le", _format_value(bound))])} {cumulative}')
+            lines.append(f'{self.name}_bucket{_format_labels(key, [("le", "+Inf")])} {series["count"]}')
+            lines.append(f'{self.name}_sum{_format_labels(key)} {_format_value(series["sum"])}')
+            lines.append(f'{self.name}_count{_format_labels(key)} {series["count"]}')
+        return lines
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class MetricsRegistry:
+    """
+    Named collection of metrics rendered together at /metrics
+    directory: optional directory shared by the worker processes of one server. Each process
+    writes its values to metrics-<pid>.json there (publish(), or every publish_interval
+    seconds once start_publishing() is called), and render() merges every file: counters and
+    histograms are summed, including those of exited processes so totals never go down, and
+    gauges of live processes get a pid label. Other processes' values are at most
+    publish_interval seconds old.
+    """
+    
+    def __init__(self, directory=None, publish_interval=5.0):
+        self._metrics = []
+        self.directory = directory
+        self.publish_interval = publish_interval
+        self._publisher = None
+    
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+    
+    def counter(self, name, help_text):
+        return self.register(CounterMetric(name, help_text))
+    
+    def gauge(self, name, help_text):
+        return self.register(GaugeMetric(name, help_text))
+    
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        return self.register(HistogramMetric(name, help_text, buckets))
+    
+    def publish(self):
+        """Write this process's values to the shared directory (no-op without one)"""
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        pid = os.getpid()
+        path = os.path.join(self.directory, f'metrics-{pid}.json')
+        # Written under a temporary name and renamed so readers never see a partial file
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump({metric.name: metric.snapshot() for metric in self._metrics}, f)
+        os.replace(f'{path}.tmp', path)
+    
+    def _publish_periodically(self):
+        while True:
+            time.sleep(self.publish_interval)
+            try:
+                self.publish()
+            except OSError:
+                pass
+    
+    def start_publishing(self):
+        """Publish in a background thread every publish_interval seconds; call once per worker"""
+        if self.directory is None or self._publisher is not None and self._publisher.is_alive():
+            return
+        self._publisher = threading.Thread(target=self._publish_periodically, name='metrics-publisher', daemon=True)
+        self._publisher.start()
+    
+    def remove_published(self):
+        """Delete every process's published values, e.g. when a new server starts"""
+        if self.directory is None or not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.startswith('metrics-'):
+                os.remove(os.path.join(self.directory, name))
+    
+    def _snapshots(self):
+        snapshots = []
+        for name in sorted(os.listdir(self.directory)):
+            if not (name.startswith('metrics-') and name.endswith('.json')):
+                continue
+            try:
+                pid = int(name[len('metrics-'):-len('.json')])
+                with open(os.path.join(self.directory, name)) as f:
+                    snapshots.append((pid, _process_alive(pid), json.load(f)))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+    
+    def render(self):
+        lines = []
+        if self.directory is None:
+            for metric in self._metrics:
+                lines.extend(metric.render())
+        else:
+            self.publish()
+            snapshots = self._snapshots()
+            for metric in self._metrics:
+                values = [(pid, alive, data.get(metric.name, [])) for pid, alive, data in snapshots]
+                lines.extend(metric.render(metric.merge(values)))
+        return '\n'.join(lines) + '\n'
+
+
+def resident_memory_bytes():
+    """Current resident set size of this process (0 where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
@@ -0,0 +1,156 @@
+"""
+Request audit log for the NER API
+Records are queued by the request path and written by a background thread in batched
+executemany inserts (SQLite, WAL mode), so logging never waits on disk.
+"""
+
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS request_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp REAL NOT NULL,
+    endpoint TEXT NOT NULL,
+    method TEXT,
+    status INTEGER,
+    latency_ms REAL,
+    remote_addr TEXT,
+    user_agent TEXT,
+    num_texts INTEGER,
+    text_length INTEGER,
+    entity_count INTEGER,
+    cache TEXT,
+    stages TEXT
+);
+CREATE INDEX IF NOT EXISTS request_log_timestamp ON request_log (timestamp);
+"""
+
+COLUMNS = ('timestamp', 'endpoint', 'method', 'status', 'latency_ms', 'remote_addr', 'user_agent',
+           'num_texts', 'text_length', 'entity_count', 'cache', 'stages')
+
+
+class RequestLogger:
+    """
+    Non-blocking request logger
+    log() only enqueues; records are dropped (and counted) if the queue is full rather
+    than slowing requests down.
+    """
+    
+    def __init__(self, path, batch_size=500, flush_interval=1.0, max_queue=10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._conn = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self.written = 0
+        self.dropped = 0
+    
+    def _connect(self):
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(SCHEMA)
+        return self._conn
+    
+    def _ensure_writer(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='request-log-writer', daemon=True)
+                    self._thread.start()
+    
+    def log(self, **record):
+        record.setdefault('timestamp', time.time())
+        if isinstance(record.get('stages'), dict):
+            record['stages'] = json.dumps(record['stages'])
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(tuple(record.get(column) for column in COLUMNS))
+        except queue.Full:
+            self.dropped += 1
+    
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except sqlite3.Error:
+                self.dropped += len(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+    
+    def _write(self, rows):
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                f"INSERT INTO request_log ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+                rows
+            )
+            conn.commit()
+        self.written += len(rows)
+    
+    def flush(self):
+        """Block until every queued record has been written"""
+        self._queue.join()
+    
+    def stats(self, since=None):
+        """Aggregate usage per endpoint, optionally only for records newer than since (epoch seconds)"""
+        since = since or 0
+        with self._lock:
+            conn = self._connect()
+            rows = conn.execute(
+                'SELECT endpoint, COUNT(*), SUM(status >= 400), AVG(latency_ms), MAX(latency_ms), '
+                'SUM(num_texts), SUM(text_length), SUM(entity_count), SUM(cache = \'HIT\') '
+                'FROM request_log WHERE timestamp >= ? GROUP BY endpoint ORDER BY endpoint',
+                (since,)
+            ).fetchall()
+            stage_rows = conn.execute(
+                'SELECT endpoint, stage.key, AVG(stage.value), MAX(stage.value) '
+                'FROM request_log, json_each(request_log.stages) AS stage '
+                'WHERE timestamp >= ? GROUP BY endpoint, stage.key',
+                (since,)
+            ).fetchall()
+        
+        endpoints = {}
+        for endpoint, count, errors, avg_ms, max_ms, texts, chars, entities, hits in rows:
+            endpoints[endpoint] = {
+                'requests': count,
+                'errors': errors or 0,
+                'avg_latency_ms': round(avg_ms or 0.0, 3),
+                'max_latency_ms': round(max_ms or 0.0, 3),
+                'texts': texts or 0,
+                'characters': chars or 0,
+                'entities': entities or 0,
+                'cache_hits': hits or 0,
+                'stages': {}
+            }
+        for endpoint, stage, avg_ms, max_ms in stage_rows:
+            if endpoint in endpoints:
+                endpoints[endpoint]['stages'][stage] = {'avg_ms': round(avg_ms, 3), 'max_ms': round(max_ms, 3)}
+        
+        return {
+            'since': since,
+            'endpoints': endpoints,
+            'logger': {'queued': self._queue.qsize(), 'written': self.written, 'dropped': self.dropped}
+        }
@@ -0,0 +1,270 @@
+"""
+Reproducible throughput benchmark for ner_core and the Flask API
+
+Generates (or loads) corpora of controlled size, times each operation and writes
+docs/sec, p50/p99 latency and peak RSS to JSON so runs can be compared.
+
+Usage:
+    python scripts/benchmark.py --output bench.json
+    python scripts/benchmark.py --corpus tweets --docs 2000 --skip-api
+    python scripts/benchmark.py --input data/sample_texts.txt --compare bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+PEOPLE = ['Tim Cook', 'Angela Merkel', 'Elon Musk', 'Satya Nadella', 'Serena Williams', 'Barack Obama']
+ORGS = ['Apple', 'Microsoft', 'the United Nations', 'Google', 'Tesla', 'Goldman Sachs']
+PLACES = ['Paris', 'California', 'Tokyo', 'Germany', 'New York', 'Lake Geneva']
+DATES = ['Monday', 'April 1, 1976', 'last year', 'March 2021', 'the 1990s']
+MONEY = ['$2.5 trillion', '$44 billion', '300 million euros', '$15']
+EXTRAS = ['Contact press@example.com for details.', 'Call 555-123-4567 today.',
+          'See https://example.com/news for more.', '#breaking @newsdesk']
+
+SENTENCES = [
+    '{person} met executives from {org} in {place} on {date}.',
+    '{org} reported revenue of {money} for {date}.',
+    '{person} said {org} would open a new office in {place}.',
+    'Shares of {org} fell after {person} left the company {date}.',
+    'Officials in {place} approved a {money} deal with {org}.',
+]
+
+# Target sizes in characters for the built-in corpora
+CORPORA = {
+    'tweets': {'chars': 140, 'docs': 1000},
+    'news': {'chars': 3000, 'docs': 200},
+    'large': {'chars': 1000000, 'docs': 2},
+}
+
+
+def make_sentence(rng):
+    sentence = rng.choice(SENTENCES).format(
+        person=rng.choice(PEOPLE), org=rng.choice(ORGS), place=rng.choice(PLACES),
+        date=rng.choice(DATES), money=rng.choice(MONEY)
+    )
+    if rng.random() < 0.2:
+        sentence += ' ' + rng.choice(EXTRAS)
+    return sentence
+
+
+def make_document(rng, chars):
+    """Join synthetic sentences until the document reaches the target length"""
+    parts = []
+    size = 0
+    while size < chars:
+        sentence = make_sentence(rng)
+        parts.append(sentence)
+        size += len(sentence) + 1
+        # Paragraph breaks every few sentences keep long documents realistic
+        if len(parts) % 6 == 0:
+            parts.append('\n')
+    return ' '.join(parts)[:max(chars, 1)]
+
+
+def build_corpus(name, docs, seed):
+    spec = CORPORA[name]
+    rng = random.Random(f'{seed}-{name}')
+    return [make_document(rng, spec['chars']) for _ in range(docs or spec['docs'])]
+
+
+def load_corpus(path):
+    """One document per line (.txt) or per JSON object with a "text" field (.jsonl)"""
+    texts = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if path.endswith('.jsonl'):
+                line = json.loads(line)['text']
+            texts.append(line)
+    return texts
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100.0 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def run(name, func, units, docs_per_unit=None):
+    """
+    Time func over every unit of work
+    docs_per_unit: documents in each unit (batches); defaults to 1 per unit
+    """
+    latencies = []
+    rss_before = peak_rss_mb()
+    start = time.perf_counter()
+    for unit in units:
+        t0 = time.perf_counter()
+        func(unit)
+        latencies.append(time.perf_counter() - t0)
+    elapsed = time.perf_counter() - start
+
+    docs = sum(docs_per_unit(unit) for unit in units) if docs_per_unit else len(units)
+    result = {
+        'name': name,
+        'docs': docs,
+        'calls': len(units),
+        'seconds': round(elapsed, 4),
+        'docs_per_sec': round(docs / elapsed, 2) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'peak_rss_growth_mb': round(peak_rss_mb() - rss_before, 1)
+    }
+    print(f"  {name:28} {result['docs_per_sec']:>10.1f} docs/s  "
+          f"p50 {result['p50_ms']:>9.2f} ms  p99 {result['p99_ms']:>9.2f} ms  "
+          f"peak RSS {result['peak_rss_mb']:.0f} MB")
+    return result
+
+
+def batches(texts, size):
+    return [texts[i:i + size] for i in range(0, len(texts), size)]
+
+
+def bench_core(engine, corpus_name, texts, batch_size):
+    from ner_core import CUSTOM_PATTERNS
+
+    results = []
+    prefix = f'{corpus_name}/'
+    results.append(run(prefix + 'extract_entities', engine.extract_entities, texts))
+    results.append(run(prefix + 'analyze_text', engine.analyze_text, texts))
+    results.append(run(prefix + 'anonymize_text', engine.anonymize_text, texts))
+    results.append(run(prefix + 'extract_custom_patterns',
+                       lambda text: engine.extract_custom_patterns(text, CUSTOM_PATTERNS), texts))
+    results.append(run(prefix + 'batch_process',
+                       lambda batch: engine.batch_process(batch, batch_size=batch_size),
+                       batches(texts, batch_size), docs_per_unit=len))
+    # Model-free fast path (gazetteer + regex patterns), for comparison with the model runs above
+    results.append(run(prefix + 'extract_entities_rules', lambda text: engine.extract_entities(text, rules=True), texts))
+    results.append(run(prefix + 'batch_process_rules',
+                       lambda batch: engine.batch_process(batch, batch_size=batch_size, rules=True),
+                       batches(texts, batch_size), docs_per_unit=len))
+    return results
+
+
+def bench_api(corpus_name, texts, batch_size):
+    import app as app_module
+
+    client = app_module.app.test_client()
+    app_module.load_model()
+
+    def post(path, payload, use_cache=False):
+        # The response cache would otherwise answer every repeated text without running the model
+        headers = {} if use_cache else {'Cache-Control': 'no-cache'}
+        response = client.post(path, data=json.dumps(payload), content_type='application/json', headers=headers)
+        if response.status_code != 200:
+            raise RuntimeError(f'{path} returned {response.status_code}: {response.data[:200]!r}')
+
+    prefix = f'{corpus_name}/'
+    results = [run(prefix + 'api_extract', lambda text: post('/api/extract', {'text': text}), texts)]
+    if app_module.result_cache is not None:
+        # Reported separately: the pass above filled the cache, so these are all hits
+        results.append(run(prefix + 'api_extract_cached',
+                           lambda text: post('/api/extract', {'text': text}, use_cache=True), texts))
+
+    # /api/batch rejects texts over NER_MAX_TEXT_LENGTH (/api/extract chunks them instead)
+    limit = app_module.batch_engine.max_text_length
+    batchable = [text for text in texts if not limit or len(text) <= limit]
+    if len(batchable) < len(texts):
+        print(f"  {prefix}api_batch: skipping {len(texts) - len(batchable)} docs over the "
+              f"{limit}-character batch limit (raise NER_MAX_TEXT_LENGTH to include them)")
+    if batchable:
+        results.append(run(prefix + 'api_batch', lambda batch: post('/api/batch', {'texts': batch}),
+                           batches(batchable, batch_size), docs_per_unit=len))
+    return results
+
+
+def compare(results, baseline_path):
+    """Print docs/sec and p99 ratios against an earlier run"""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {r['name']: r for r in json.load(f)['results']}
+
+    print(f"\nComparison with {baseline_path} (>1.00 is faster):")
+    for result in results:
+        old = baseline.get(result['name'])
+        if not old or not result['docs_per_sec'] or not old['docs_per_sec']:
+            continue
+        speedup = result['docs_per_sec'] / old['docs_per_sec']
+        p99 = old['p99_ms'] / result['p99_ms'] if result['p99_ms'] else 0.0
+        print(f"  {result['name']:28} throughput x{speedup:.2f}   p99 x{p99:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark ner_core and the Flask API')
+    parser.add_argument('--corpus', action='append', choices=sorted(CORPORA),
+                        help='built-in corpus to generate (repeatable, default: all)')
+    parser.add_argument('--input', help='benchmark a .txt or .jsonl corpus instead of generated ones')
+    parser.add_argument('--docs', type=int, default=0, help='documents per generated corpus')
+    parser.add_argument('--seed', type=int, default=13)
+    parser.add_argument('--model', default='en_core_web_sm', help='model for the ner_core benchmarks')
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--skip-core', action='store_true')
+    parser.add_argument('--skip-api', action='store_true')
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--compare', help='earlier JSON result to compare against')
+    args = parser.parse_args()
+
+    if args.input:
+        corpora = {os.path.basename(args.input): load_corpus(args.input)}
+    else:
+        corpora = {name: build_corpus(name, args.docs, args.seed) for name in (args.corpus or sorted(CORPORA))}
+
+    engine = None
+    if not args.skip_core:
+        from ner_core import AdvancedEntityExtractor
+        # Doc cache off: every call must pay for its own parse
+        engine = AdvancedEntityExtractor(model=args.model, cache_size=0)
+
+    results = []
+    for name, texts in corpora.items():
+        print(f"\n{name}: {len(texts)} docs, {sum(len(t) for t in texts)} chars")
+        if engine is not None:
+            results.extend(bench_core(engine, name, texts, args.batch_size))
+        if not args.skip_api:
+            results.extend(bench_api(name, texts, args.batch_size))
+
+    import spacy
+    report = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'spacy': spacy.__version__,
+        'model': {
+            'name': f"{engine.nlp.meta['lang']}_{engine.nlp.meta['name']}",
+            'version': engine.nlp.meta['version'],
+            'pipeline': engine.nlp.pipe_names
+        } if engine is not None else None,
+        'seed': args.seed,
+        'batch_size': args.batch_size,
+        'corpora': {name: {'docs': len(texts), 'chars': sum(len(t) for t in texts)} for name, texts in corpora.items()},
+        'results': results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, default=str)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
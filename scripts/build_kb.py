@@ -0,0 +1,36 @@
+"""
+Compile a knowledge base into the memory-mapped alias table used for offline entity linking
+
+Input is tab-separated (alias, id, prior, optional label) or JSONL with
+{"alias", "id", "prior", "label"} objects. The same id may appear under many aliases.
+
+Usage:
+    python scripts/build_kb.py kb/aliases.tsv --output database/kb_aliases.bin
+    NER_KB_PATH=database/kb_aliases.bin python app.py
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build an alias table for offline entity linking')
+    parser.add_argument('source', help='.tsv or .jsonl knowledge-base file')
+    parser.add_argument('--output', required=True, help='alias table file to write')
+    parser.add_argument('--run-size', type=int, default=500000, help='rows sorted in memory at a time')
+    args = parser.parse_args()
+
+    from entity_linker import build_alias_table
+
+    start = time.perf_counter()
+    count = build_alias_table(args.source, args.output, run_size=args.run_size)
+    print(f"Wrote {count} aliases to {args.output} in {time.perf_counter() - start:.1f}s "
+          f"({os.path.getsize(args.output) / (1024 * 1024):.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
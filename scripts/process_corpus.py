@@ -0,0 +1,288 @@
+"""
+Parallel corpus processor for offline entity extraction
+
+Reads text/JSONL documents from files, directories or glob patterns, shards them in
+batches across a process pool (one model per process, loaded once), and writes entity
+records as JSONL, CSV or Parquet. Completed document ids are appended to a checkpoint
+file, so an interrupted run picks up where it stopped.
+
+Usage:
+    python scripts/process_corpus.py archive/ --output entities.jsonl
+    python scripts/process_corpus.py "dumps/*.jsonl" --text-field body --id-field doc_id --output out.csv
+    python scripts/process_corpus.py data/sample_texts.txt --txt-mode line --workers 8 --output out.jsonl
+"""
+
+import argparse
+import csv
+import glob
+import json
+import multiprocessing
+import os
+import sys
+import time
+from collections import deque
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+EXTENSIONS = ('.txt', '.jsonl')
+CSV_FIELDS = ['id', 'source', 'text', 'label', 'start', 'end']
+
+# Per-process state set up by the pool initializer
+_system = None
+
+
+def expand_inputs(patterns):
+    """Files for every file path, directory (recursive) or glob pattern, sorted and deduplicated"""
+    paths = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                paths.extend(os.path.join(root, name) for name in files if name.endswith(EXTENSIONS))
+        elif os.path.isfile(pattern):
+            paths.append(pattern)
+        else:
+            paths.extend(path for path in glob.glob(pattern, recursive=True) if os.path.isfile(path))
+    return sorted(set(paths))
+
+
+def iter_documents(paths, txt_mode='file', text_field='text', id_field=None):
+    """Yield (doc_id, source, text) for every document in the input files"""
+    for path in paths:
+        if path.endswith('.jsonl'):
+            with open(path, encoding='utf-8') as f:
+                for lineno, line in enumerate(f, 1):
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    doc_id = record.get(id_field) if id_field else None
+                    yield str(doc_id) if doc_id is not None else f'{path}:{lineno}', path, record[text_field]
+        elif txt_mode == 'line':
+            with open(path, encoding='utf-8') as f:
+                for lineno, line in enumerate(f, 1):
+                    line = line.strip()
+                    if line:
+                        yield f'{path}:{lineno}', path, line
+        else:
+            with open(path, encoding='utf-8') as f:
+                yield path, path, f.read()
+
+
+def batched(documents, size, done=frozenset()):
+    """Group documents into lists of size, skipping ids already in the checkpoint"""
+    batch = []
+    for doc in documents:
+        if doc[0] in done:
+            continue
+        batch.append(doc)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def load_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, encoding='utf-8') as f:
+        return {line.rstrip('\n') for line in f if line.strip()}
+
+
+def init_worker(model, chunk_size, chunk_overlap):
+    """Load the model once per worker process"""
+    global _system
+    from ner_core import EntityRecognitionSystem
+    # No doc cache: every archived document is seen once
+    _system = EntityRecognitionSystem(model=model, cache_size=0, chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def process_batch(batch):
+    """Entity lists for one batch; long documents go through the chunked path"""
+    short = [i for i, (_, _, text) in enumerate(batch) if len(text) <= _system.chunker.max_chars]
+    entities = [None] * len(batch)
+    for i, ents in zip(short, _system.batch_engine.process([batch[i][2] for i in short], n_process=1)):
+        entities[i] = ents
+    for i, (_, _, text) in enumerate(batch):
+        if entities[i] is None:
+            entities[i] = [
+                {'text': text[start:end], 'label': label, 'start': start, 'end': end}
+                for start, end, label in _system.extract_entity_spans(text)
+            ]
+    return [(doc_id, source, ents) for (doc_id, source, _), ents in zip(batch, entities)]
+
+
+class JsonlWriter:
+    """One JSON object per document"""
+
+    def __init__(self, path):
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def write(self, results):
+        for doc_id, source, entities in results:
+            self._file.write(json.dumps({'id': doc_id, 'source': source, 'entities': entities}) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class CsvWriter:
+    """One row per entity"""
+
+    def __init__(self, path):
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'a', encoding='utf-8', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=CSV_FIELDS)
+        if new:
+            self._writer.writeheader()
+
+    def write(self, results):
+        for doc_id, source, entities in results:
+            for ent in entities:
+                self._writer.writerow({'id': doc_id, 'source': source, **ent})
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """
+    One row per entity, written as row groups into a new part file per run
+    The output path is a directory, so resumed runs add parts instead of rewriting files
+    """
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise SystemExit('Parquet output requires pyarrow (pip install pyarrow)')
+        os.makedirs(path, exist_ok=True)
+        self._pa = pa
+        self._schema = pa.schema([
+            ('id', pa.string()), ('source', pa.string()), ('text', pa.string()),
+            ('label', pa.string()), ('start', pa.int64()), ('end', pa.int64())
+        ])
+        part = f"part-{datetime.now().strftime('%Y%m%d%H%M%S')}-{os.getpid()}.parquet"
+        self._writer = pq.ParquetWriter(os.path.join(path, part), self._schema)
+
+    def write(self, results):
+        columns = {name: [] for name in CSV_FIELDS}
+        for doc_id, source, entities in results:
+            for ent in entities:
+                columns['id'].append(doc_id)
+                columns['source'].append(source)
+                for name in ('text', 'label', 'start', 'end'):
+                    columns[name].append(ent[name])
+        self._writer.write_table(self._pa.table(columns, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+WRITERS = {'jsonl': JsonlWriter, 'csv': CsvWriter, 'parquet': ParquetWriter}
+
+
+def output_format(args):
+    if args.format:
+        return args.format
+    ext = os.path.splitext(args.output)[1].lower().lstrip('.')
+    return ext if ext in WRITERS else 'jsonl'
+
+
+def run_pool(batches, workers, initargs, max_in_flight):
+    """
+    Yield (batch, results) in input order
+    At most max_in_flight batches are queued, so huge corpora are never read into memory at once
+    """
+    with multiprocessing.Pool(workers, initializer=init_worker, initargs=initargs) as pool:
+        pending = deque()
+        for batch in batches:
+            pending.append((batch, pool.apply_async(process_batch, (batch,))))
+            if len(pending) >= max_in_flight:
+                batch, result = pending.popleft()
+                yield batch, result.get()
+        while pending:
+            batch, result = pending.popleft()
+            yield batch, result.get()
+
+
+def run_inline(batches, initargs):
+    init_worker(*initargs)
+    for batch in batches:
+        yield batch, process_batch(batch)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Extract entities from a corpus using every core')
+    parser.add_argument('inputs', nargs='+', help='files, directories or glob patterns of .txt/.jsonl')
+    parser.add_argument('--output', required=True, help='output file (.jsonl/.csv) or directory (parquet)')
+    parser.add_argument('--format', choices=sorted(WRITERS), help='output format (default: from the extension)')
+    parser.add_argument('--checkpoint', help='file of completed document ids (default: <output>.checkpoint)')
+    parser.add_argument('--model', default='en_core_web_sm')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='worker processes (0 = run inline)')
+    parser.add_argument('--batch-size', type=int, default=64, help='documents per task sent to a worker')
+    parser.add_argument('--txt-mode', choices=['file', 'line'], default='file',
+                        help='treat each .txt file (default) or each non-empty line as a document')
+    parser.add_argument('--text-field', default='text', help='JSONL field holding the text')
+    parser.add_argument('--id-field', help='JSONL field holding the document id (default: path:line)')
+    parser.add_argument('--chunk-size', type=int, default=100000, help='characters per chunk for long documents')
+    parser.add_argument('--chunk-overlap', type=int, default=1000)
+    parser.add_argument('--index', help='also add documents to this entity index database (see entity_index.py)')
+    parser.add_argument('--report-every', type=float, default=10.0, help='seconds between progress lines')
+    args = parser.parse_args()
+
+    paths = expand_inputs(args.inputs)
+    if not paths:
+        parser.error('no input files matched')
+
+    checkpoint_path = args.checkpoint or args.output.rstrip('/\\') + '.checkpoint'
+    done = load_checkpoint(checkpoint_path)
+    if done:
+        print(f"Resuming: {len(done)} documents already processed", file=sys.stderr)
+
+    documents = iter_documents(paths, args.txt_mode, args.text_field, args.id_field)
+    batches = batched(documents, args.batch_size, done)
+    initargs = (args.model, args.chunk_size, args.chunk_overlap)
+    if args.workers > 0:
+        results = run_pool(batches, args.workers, initargs, max_in_flight=args.workers * 2)
+    else:
+        results = run_inline(batches, initargs)
+
+    print(f"Processing {len(paths)} files with {args.workers or 1} worker(s)", file=sys.stderr)
+    writer = WRITERS[output_format(args)](args.output)
+    index = None
+    if args.index:
+        from entity_index import EntityIndex
+        index = EntityIndex(args.index)
+    docs = entities = 0
+    start = last_report = time.perf_counter()
+    try:
+        with open(checkpoint_path, 'a', encoding='utf-8') as checkpoint:
+            for documents, batch in results:
+                writer.write(batch)
+                if index is not None:
+                    index.add_many((doc_id, text, ents) for (doc_id, _, text), (_, _, ents) in zip(documents, batch))
+                # Ids are checkpointed only after their records are written
+                checkpoint.write(''.join(doc_id + '\n' for doc_id, _, _ in batch))
+                checkpoint.flush()
+                docs += len(batch)
+                entities += sum(len(ents) for _, _, ents in batch)
+
+                now = time.perf_counter()
+                if now - last_report >= args.report_every:
+                    print(f"  {docs} docs, {entities} entities, {docs / (now - start):.1f} docs/s", file=sys.stderr)
+                    last_report = now
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    rate = docs / elapsed if elapsed else 0.0
+    print(f"Done: {docs} docs, {entities} entities in {elapsed:.1f}s ({rate:.1f} docs/s) -> {args.output}",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,19 +1,32 @@
+import os
+import tempfile
+import threading
+import time
 import unittest
 import json
-from app import app
+from unittest import mock
+
+# Keep job state, request logs and the entity index out of the committed database files
+TEST_DIR = tempfile.mkdtemp()
+os.environ.setdefault('NER_DB_PATH', os.path.join(TEST_DIR, 'ner_test.db'))
+os.environ.setdefault('NER_INDEX_PATH', os.path.join(TEST_DIR, 'ner_index.db'))
+
+import app as app_module
+from app import DEFAULT_TIER, app, load_model
+from ner_core import DocumentChunker
 
 class TestAPI(unittest.TestCase):
     def setUp(self):
         self.app = app.test_client()
         self.app.testing = True
-
+    
     def test_home(self):
         """Test the home page returns HTML"""
         response = self.app.get('/')
         self.assertEqual(response.status_code, 200)
         self.assertIn(b'<!DOCTYPE html>', response.data)
         self.assertIn(b'Entity Recognition System', response.data)
-
+    
     def test_extract_endpoint(self):
         """Test the extraction API endpoint"""
         payload = {"text": "Apple is looking at buying U.K. startup for $1 billion"}
@@ -33,13 +46,301 @@ class TestAPI(unittest.TestCase):
         self.assertIn("label", entity)
         self.assertIn("start", entity)
         self.assertIn("end", entity)
-
+    
     def test_extract_no_text(self):
         """Test error handling when no text provided"""
         response = self.app.post('/api/extract', 
                                  data=json.dumps({}),
                                  content_type='application/json')
         self.assertEqual(response.status_code, 400)
+    
+    def test_batch_endpoint(self):
+        """Test batch extraction keeps input order and offsets"""
+        texts = ["Apple is based in Cupertino.", "Barack Obama visited Paris."]
+        response = self.app.post('/api/batch',
+                                 data=json.dumps({"texts": texts}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        results = json.loads(response.data)['results']
+        
+        self.assertEqual(len(results), 2)
+        for text, result in zip(texts, results):
+            for entity in result['entities']:
+                self.assertEqual(text[entity['start']:entity['end']], entity['text'])
+    
+    def test_batch_columnar_format(self):
+        """Test the compact columnar batch response"""
+        texts = ["Apple is based in Cupertino.", "Nothing here.", "Barack Obama visited Paris."]
+        response = self.app.post('/api/batch',
+                                 data=json.dumps({"texts": texts, "format": "columnar"}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        columns = json.loads(response.data)['entities']
+        
+        self.assertEqual(len(columns['doc_offsets']), len(texts) + 1)
+        self.assertEqual(len(columns['start']), len(columns['end']))
+        for i, text_id in enumerate(columns['text']):
+            doc = next(d for d in range(len(texts)) if columns['doc_offsets'][d + 1] > i)
+            self.assertEqual(texts[doc][columns['start'][i]:columns['end'][i]], columns['texts'][text_id])
+    
+    def test_batch_invalid_texts(self):
+        """Test batch rejects non-string entries"""
+        response = self.app.post('/api/batch',
+                                 data=json.dumps({"texts": ["ok", 42]}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_batch_stream_endpoint(self):
+        """Test NDJSON streaming returns one line per input line, in order"""
+        body = '\n'.join([
+            json.dumps({"id": "first", "text": "Apple is based in Cupertino."}),
+            json.dumps("Barack Obama visited Paris."),
+            "not json"
+        ])
+        response = self.app.post('/api/batch/stream',
+                                 data=body,
+                                 content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        lines = [json.loads(line) for line in response.data.decode().splitlines()]
+        
+        self.assertEqual([line['index'] for line in lines], [0, 1, 2])
+        self.assertEqual(lines[0]['id'], "first")
+        self.assertIn("entities", lines[1])
+        self.assertIn("error", lines[2])
+    
+    def test_anonymize_endpoint(self):
+        """Test redaction of entities and sensitive patterns"""
+        payload = {"text": "Barack Obama emailed obama@example.com from Chicago."}
+        response = self.app.post('/api/anonymize',
+                                 data=json.dumps(payload),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        
+        self.assertNotIn("obama@example.com", data['anonymized_text'])
+        self.assertIn("[EMAIL]", data['anonymized_text'])
+        self.assertGreater(data['redactions'], 0)
+    
+    def test_anonymize_rejects_bad_options(self):
+        """Test malformed anonymize options are client errors"""
+        for payload in [{"text": 42}, {"text": "Hi.", "entity_types": "PERSON"},
+                        {"text": "Hi.", "pattern_types": [1]}, {"text": "Hi.", "model": "missing"}]:
+            response = self.app.post('/api/anonymize', data=json.dumps(payload), content_type='application/json')
+            self.assertEqual(response.status_code, 400, payload)
+    
+    def test_metrics_endpoint(self):
+        """Test Prometheus metrics reflect handled requests"""
+        self.app.post('/api/extract',
+                      data=json.dumps({"text": "Apple opened a store in Paris."}),
+                      content_type='application/json')
+        response = self.app.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        output = response.data.decode()
+        
+        self.assertIn('ner_requests_total{endpoint="/api/extract"', output)
+        self.assertIn('ner_stage_duration_seconds_count{endpoint="extract",stage="nlp"}', output)
+        self.assertIn('ner_memory_bytes{kind="process_rss"}', output)
+    
+    def test_health_reports_model_status(self):
+        """Test liveness answers without waiting for the model"""
+        response = self.app.get('/health')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.data)
+        self.assertEqual(data['status'], 'healthy')
+        self.assertIn(data['model_status'], ['not_loaded', 'loading', 'ready', 'error'])
+    
+    def test_ready_after_model_load(self):
+        """Test readiness turns green once the model is loaded"""
+        load_model()
+        response = self.app.get('/ready')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['status'], 'ready')
+    
+    def test_failed_model_load_backs_off(self):
+        """Test a failed load answers 503 at once and bad requests still get 400"""
+        failed = {'model_ready': threading.Event(), 'model_error': RuntimeError("no such model"),
+                  '_model_failed_at': time.monotonic(), '_loader_thread': None}
+        with mock.patch.multiple(app_module, **failed):
+            response = self.app.post('/api/extract', data=json.dumps({}), content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+            
+            started = time.monotonic()
+            response = self.app.post('/api/extract', data=json.dumps({"text": "Hi."}), content_type='application/json')
+            self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(json.loads(response.data)['status'], 'error')
+        self.assertGreater(int(response.headers['Retry-After']), 5)
+    
+    def test_extract_result_cache(self):
+        """Test repeated texts are served from the response cache"""
+        payload = json.dumps({"text": "Microsoft was founded in Albuquerque in 1975."})
+        first = self.app.post('/api/extract', data=payload, content_type='application/json')
+        second = self.app.post('/api/extract', data=payload, content_type='application/json')
+        
+        self.assertIn(first.headers.get('X-Cache'), ['HIT', 'MISS'])
+        self.assertEqual(second.headers.get('X-Cache'), 'HIT')
+        self.assertEqual(json.loads(first.data), json.loads(second.data))
+    
+    def test_async_job(self):
+        """Test submitting a job, polling it and downloading results"""
+        payload = json.dumps({"texts": ["Apple is based in California.", "Google was founded in 1998."]})
+        response = self.app.post('/api/jobs', data=payload, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        job_id = json.loads(response.data)['job_id']
+        
+        deadline = time.time() + 30
+        while time.time() < deadline:
+            status = json.loads(self.app.get(f'/api/jobs/{job_id}').data)
+            if status['status'] in ('done', 'failed'):
+                break
+            time.sleep(0.05)
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['processed'], 2)
+        
+        data = json.loads(self.app.get(f'/api/jobs/{job_id}/results').data)
+        self.assertEqual([r['index'] for r in data['results']], [0, 1])
+        lines = self.app.get(f'/api/jobs/{job_id}/results?format=ndjson').data.decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(self.app.get('/api/jobs/unknown').status_code, 404)
+        for query in ('limit=0', 'limit=100000', 'offset=-1'):
+            self.assertEqual(self.app.get(f'/api/jobs/{job_id}/results?{query}').status_code, 400, query)
+    
+    def test_job_rejects_long_texts(self):
+        """Test over-long texts are refused at submission instead of failing the job later"""
+        payload = json.dumps({"texts": ["Hi.", "x" * (app_module.MAX_TEXT_LENGTH + 1)]})
+        response = self.app.post('/api/jobs', data=payload, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("texts[1]", json.loads(response.data)['error'])
+    
+    def test_request_stats(self):
+        """Test /api/extract requests show up in the request log statistics"""
+        self.app.post('/api/extract', data=json.dumps({"text": "Google opened an office in Paris."}),
+                      content_type='application/json')
+        from app import request_logger
+        request_logger.flush()
+        
+        response = self.app.get('/api/stats?hours=1')
+        self.assertEqual(response.status_code, 200)
+        extract = json.loads(response.data)['endpoints']['/api/extract']
+        self.assertGreaterEqual(extract['requests'], 1)
+        self.assertIn('nlp', extract['stages'])
+    
+    def test_incremental_extract(self):
+        """Test doc_id sessions re-parse only edited paragraphs"""
+        text = "Apple is based in California.\n\nGoogle was founded in 1998."
+        first = json.loads(self.app.post('/api/extract', data=json.dumps({"text": text, "doc_id": "api-doc"}),
+                                         content_type='application/json').data)
+        self.assertEqual(first['incremental']['version'], 1)
+        session = first['incremental']['session']
+        
+        edited = text.replace("Google", "Microsoft")
+        payload = {"text": edited, "doc_id": "api-doc", "session": session}
+        second = json.loads(self.app.post('/api/extract', data=json.dumps(payload), content_type='application/json').data)
+        self.assertEqual(second['incremental']['reparsed_segments'], 1)
+        self.assertEqual(second['incremental']['doc_id'], "api-doc")
+        
+        payload = {"doc_id": "api-doc", "edits": [], "base_version": 1, "session": session}
+        response = self.app.post('/api/extract', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 409)
+    
+    def test_incremental_documents_are_scoped_to_their_session(self):
+        """Test another client can't read a document by guessing its doc_id"""
+        first = json.loads(self.app.post('/api/extract', data=json.dumps({"text": "Secret Apple memo.", "doc_id": "shared"}),
+                                         content_type='application/json').data)
+        for session in (None, "guessed-session"):
+            payload = {"doc_id": "shared", "edits": [], "base_version": 1, "session": session}
+            response = self.app.post('/api/extract', data=json.dumps(payload), content_type='application/json')
+            self.assertEqual(response.status_code, 409)
+            self.assertNotIn(b"Secret", response.data)
+        
+        payload = {"doc_id": "shared", "edits": [], "base_version": 1, "session": first['incremental']['session']}
+        response = self.app.post('/api/extract', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(json.loads(response.data)['total_entities'], first['total_entities'])
+    
+    def test_batch_summary(self):
+        """Test corpus-level statistics for a batch"""
+        payload = {"texts": ["Google is in California.", "Google hired Larry Page."], "summary": True}
+        response = self.app.post('/api/batch', data=json.dumps(payload), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        summary = json.loads(response.data)['summary']
+        entities = [ent for result in json.loads(response.data)['results'] for ent in result['entities']]
+        self.assertEqual(summary['total_entities'], len(entities))
+    
+    def test_entity_index(self):
+        """Test indexing documents and looking an entity up across them"""
+        documents = [{"id": "d1", "text": "Google opened an office in Paris."},
+                     {"id": "d2", "text": "Paris is far from California."}]
+        response = self.app.post('/api/index', data=json.dumps({"documents": documents}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.data)['indexed'], 2)
+        
+        data = json.loads(self.app.get('/api/index/search?entity=paris&window=5').data)
+        self.assertEqual(data['documents'], 2)
+        self.assertEqual([occ['doc_id'] for occ in data['occurrences']], ["d1", "d2"])
+        self.assertIn("Paris", data['occurrences'][0]['context'])
+        self.assertEqual(self.app.get('/api/index/search').status_code, 400)
+    
+    def test_relations_endpoint(self):
+        """Test relation extraction for one text and for a batch"""
+        response = self.app.post('/api/relations', data=json.dumps({"text": "Steve Jobs founded Apple."}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('relations', json.loads(response.data))
+        
+        response = self.app.post('/api/relations', data=json.dumps({"texts": ["Google hired Larry Page.", "Hi."]}),
+                                 content_type='application/json')
+        self.assertEqual(len(json.loads(response.data)['results']), 2)
+        response = self.app.post('/api/relations', data=json.dumps({}), content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+    
+    def test_model_tier_option(self):
+        """Responses name the tier that answered; unknown tiers are rejected"""
+        response = self.app.post('/api/extract', data=json.dumps({"text": "Google hired Larry Page."}),
+                                 content_type='application/json')
+        self.assertEqual(json.loads(response.data)['model'], DEFAULT_TIER)
+        
+        response = self.app.post('/api/batch', data=json.dumps({"texts": ["Hi."], "model": DEFAULT_TIER}),
+                                 content_type='application/json')
+        self.assertEqual(json.loads(response.data)['results'][0]['model'], DEFAULT_TIER)
+        
+        response = self.app.post('/api/extract', data=json.dumps({"text": "Hi.", "model": "no-such-tier"}),
+                                 content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.app.post('/api/batch/stream?model=no-such-tier', data='"Hi."\n').status_code, 400)
+        self.assertEqual(json.loads(self.app.get('/health').data)['default_tier'], DEFAULT_TIER)
+    
+    def test_rules_tier(self):
+        """The rule-based tier answers with the same schema and no model run"""
+        response = self.app.post('/api/extract', data=json.dumps({"text": "Mail ops@acme.com today", "model": "rules"}),
+                                 content_type='application/json')
+        data = json.loads(response.data)
+        self.assertEqual(data['model'], 'rules')
+        self.assertEqual(data['entities'], [{'text': 'ops@acme.com', 'label': 'EMAIL', 'start': 5, 'end': 17}])
+        
+        response = self.app.post('/api/batch', data=json.dumps({"texts": ["Call 555-123-4567"], "model": "rules"}),
+                                 content_type='application/json')
+        self.assertEqual(json.loads(response.data)['results'][0]['entities'][0]['label'], 'PHONE')
+    
+    def test_long_texts_are_chunked(self):
+        """Texts over the chunk size go through DocumentChunker with global offsets"""
+        text = "Google hired Larry Page in California. " * 20
+        chunker = DocumentChunker(max_chars=200, overlap=40)
+        with mock.patch.object(app_module, 'chunker', chunker), \
+                mock.patch.object(chunker, 'entity_spans', wraps=chunker.entity_spans) as entity_spans:
+            response = self.app.post('/api/extract', data=json.dumps({"text": text}),
+                                     content_type='application/json', headers={'Cache-Control': 'no-cache'})
+            data = json.loads(response.data)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(all(text[ent['start']:ent['end']] == ent['text'] for ent in data['entities']))
+            starts = [ent['start'] for ent in data['entities']]
+            self.assertEqual(starts, sorted(set(starts)))
+            
+            response = self.app.post('/api/anonymize', data=json.dumps({"text": text, "entity_types": ["ORG"]}),
+                                     content_type='application/json')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(entity_spans.call_count, 2)
+            self.assertNotIn("Google", json.loads(response.data)['anonymized_text'])
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,68 @@
+import os
+import tempfile
+import time
+import unittest
+from ner_cache import MemoryCache, SQLiteCache, TieredCache, build_cache, cache_key
+
+class TestCacheKey(unittest.TestCase):
+    def test_key_depends_on_text_model_and_options(self):
+        base = cache_key("Apple", "en_core_web_lg-3.7.1", {'endpoint': 'extract'})
+        self.assertEqual(base, cache_key("Apple", "en_core_web_lg-3.7.1", {'endpoint': 'extract'}))
+        self.assertNotEqual(base, cache_key("Apple.", "en_core_web_lg-3.7.1", {'endpoint': 'extract'}))
+        self.assertNotEqual(base, cache_key("Apple", "en_core_web_sm-3.7.1", {'endpoint': 'extract'}))
+        self.assertNotEqual(base, cache_key("Apple", "en_core_web_lg-3.7.1", {'endpoint': 'batch'}))
+
+class TestMemoryCache(unittest.TestCase):
+    def test_byte_budget_evicts_least_recently_used(self):
+        cache = MemoryCache(max_bytes=10)
+        cache.set("a", b"12345")
+        cache.set("b", b"12345")
+        cache.get("a")
+        cache.set("c", b"12345")
+        
+        self.assertEqual(cache.get("a"), b"12345")
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.stats()['bytes'], 10)
+    
+    def test_ttl_expiry(self):
+        cache = MemoryCache(ttl=0.01)
+        cache.set("a", b"value")
+        time.sleep(0.02)
+        self.assertIsNone(cache.get("a"))
+
+class TestSQLiteCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'cache.db')
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def test_entries_survive_reopen(self):
+        SQLiteCache(self.path).set("a", b'{"total_entities": 1}')
+        self.assertEqual(SQLiteCache(self.path).get("a"), b'{"total_entities": 1}')
+    
+    def test_connects_on_first_use(self):
+        cache = SQLiteCache(self.path)
+        self.assertFalse(os.path.exists(self.path))
+        
+        cache.set("a", b"value")
+        self.assertTrue(os.path.exists(self.path))
+    
+    def test_tiered_promotes_disk_hits(self):
+        SQLiteCache(self.path).set("a", b"value")
+        memory = MemoryCache()
+        cache = TieredCache([memory, SQLiteCache(self.path)])
+        
+        self.assertEqual(cache.get("a"), b"value")
+        self.assertEqual(memory.get("a"), b"value")
+    
+    def test_build_cache(self):
+        self.assertIsNone(build_cache('none', self.path))
+        self.assertIsInstance(build_cache('memory', self.path), MemoryCache)
+        self.assertIsInstance(build_cache('memory,sqlite', self.path), TieredCache)
+        with self.assertRaises(ValueError):
+            build_cache('redis', self.path)
+
+if __name__ == '__main__':
+    unittest.main()
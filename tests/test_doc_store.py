@@ -0,0 +1,56 @@
+import os
+import tempfile
+import unittest
+import spacy
+from doc_store import DocStore
+
+class TestDocStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.nlp = spacy.blank("en")
+        self.nlp.add_pipe("sentencizer")
+        self.nlp.add_pipe("entity_ruler").add_patterns([{"label": "ORG", "pattern": "Google"}])
+        self.store = DocStore(self.tmp.name, self.nlp, shard_size=2)
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def test_round_trip_through_shards(self):
+        for i in range(5):
+            self.store.put(f"doc-{i}", self.nlp(f"Google hired {i} people. Then more."), {"ner"})
+        self.assertEqual(self.store.stats()['pending'], 1)
+        self.store.flush()
+        self.assertEqual(self.store.stats()['shards'], 3)
+        
+        reopened = DocStore(self.tmp.name, self.nlp)
+        doc = reopened.get("doc-3")
+        self.assertEqual(doc.text, "Google hired 3 people. Then more.")
+        self.assertEqual([(ent.text, ent.label_) for ent in doc.ents], [("Google", "ORG")])
+        self.assertEqual(len(list(doc.sents)), 2)
+        self.assertEqual([doc_id for doc_id, _ in reopened.docs()], [f"doc-{i}" for i in range(5)])
+        self.assertEqual(len(reopened), 5)
+    
+    def test_context_manager_writes_pending_docs(self):
+        with DocStore(self.tmp.name, self.nlp) as store:
+            store.put("a", self.nlp("Google."), {"ner"})
+        self.assertEqual(DocStore(self.tmp.name, self.nlp).get("a").text, "Google.")
+    
+    def test_misses(self):
+        self.store.put("a", self.nlp("Google."), {"ner"})
+        self.store.flush()
+        self.assertIsNotNone(self.store.get("a", text="Google.", components=frozenset({"ner"})))
+        self.assertIsNone(self.store.get("a", text="Changed."))
+        self.assertIsNone(self.store.get("a", components=frozenset({"ner", "parser"})))
+        self.assertIsNone(self.store.get("missing"))
+    
+    def test_keyed_by_model_version(self):
+        self.store.put("a", self.nlp("Google."))
+        self.store.flush()
+        self.nlp.meta['version'] = "9.9.9"
+        other = DocStore(self.tmp.name, self.nlp)
+        self.assertNotIn("a", other)
+        self.assertNotEqual(other.directory, self.store.directory)
+        self.assertTrue(os.path.isdir(self.store.directory))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import tempfile
+import unittest
+from entity_index import EntityIndex, normalize
+
+class TestEntityIndex(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.index = EntityIndex(os.path.join(self.tmp.name, 'index.db'))
+        self.index.add_many([
+            ("a", "Acme Corp hired Jane Doe.", [(0, 9, "ORG"), (16, 24, "PERSON")]),
+            ("b", "Shares of ACME  CORP. fell.", [{"start": 10, "end": 21, "label": "ORG"}]),
+            ("c", "Acme Corp is a PERSON here.", [(0, 9, "PERSON")])
+        ])
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def test_normalize(self):
+        self.assertEqual(normalize("  ACME\n Corp. "), "acme corp")
+    
+    def test_lookup_across_documents_with_context(self):
+        occurrences = self.index.lookup("acme corp", label="ORG", window=6)
+        self.assertEqual([occ['doc_id'] for occ in occurrences], ["a", "b"])
+        self.assertEqual(occurrences[1]['text'], "ACME  CORP.")
+        self.assertEqual(occurrences[1]['context'], "es of ACME  CORP. fell.")
+        self.assertEqual(occurrences[1]['context_start'], 4)
+        self.assertEqual(self.index.count("Acme Corp"), {'mentions': 3, 'documents': 3})
+    
+    def test_readding_replaces_postings(self):
+        self.index.add("a", "Jane Doe left.", [(0, 8, "PERSON")])
+        self.assertEqual(self.index.count("acme corp", "ORG")['mentions'], 1)
+        self.assertEqual(self.index.lookup("jane doe")[0]['start'], 0)
+        
+        self.assertTrue(self.index.remove("b"))
+        self.assertEqual(self.index.count("acme corp", "ORG")['mentions'], 0)
+        self.assertFalse(self.index.remove("missing"))
+    
+    def test_prefix_search(self):
+        results = self.index.search("ac")
+        self.assertEqual(results[0], {'text': "Acme Corp", 'label': "ORG", 'mentions': 2})
+        self.assertEqual(len(self.index.search("ac", label="PERSON")), 1)
+        self.assertEqual(self.index.stats()['documents'], 3)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+from entity_linker import AliasTable, EntityLinker, build_alias_table
+
+KB_ROWS = [
+    ("Apple", "Q312", 0.9, "ORG"),
+    ("apple", "Q89", 0.1, ""),
+    ("Apple Inc.", "Q312", 1.0, "ORG"),
+    ("Paris", "Q90", 0.95, "GPE"),
+    ("Paris", "Q167646", 0.05, "PERSON"),
+    ("Zürich", "Q72", 1.0, "GPE"),
+]
+
+class TestAliasTable(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        source = os.path.join(self.tmp.name, 'kb.tsv')
+        with open(source, 'w', encoding='utf-8') as f:
+            for alias, kb_id, prior, label in KB_ROWS:
+                f.write(f"{alias}\t{kb_id}\t{prior}\t{label}\n")
+        self.path = os.path.join(self.tmp.name, 'kb.bin')
+        # Tiny runs exercise the external merge
+        self.count = build_alias_table(source, self.path, run_size=2)
+        self.table = AliasTable(self.path)
+    
+    def tearDown(self):
+        self.table.close()
+        self.tmp.cleanup()
+    
+    def test_normalized_lookup(self):
+        self.assertEqual(self.count, 4)
+        self.assertEqual(len(self.table), 4)
+        self.assertEqual([c['id'] for c in self.table.candidates("APPLE")], ["Q312", "Q89"])
+        self.assertEqual(self.table.candidates("zürich")[0]['id'], "Q72")
+        self.assertEqual(self.table.candidates("Berlin"), [])
+    
+    def test_prefix_and_batch_lookup(self):
+        self.assertEqual([key for key, _ in self.table.prefix("app")], ["apple", "apple inc"])
+        found = self.table.lookup_many(["Paris", "Apple Inc.", "Nowhere", "Paris"])
+        self.assertEqual(sorted(found), ["Apple Inc.", "Paris"])
+    
+    def test_linker_uses_entity_type(self):
+        linker = EntityLinker(self.table, url_template="https://www.wikidata.org/wiki/{id}")
+        entities = linker.link([
+            {"text": "Paris", "label": "GPE"},
+            {"text": "Paris", "label": "PERSON"},
+            {"text": "Apple", "label": "ORG"},
+            {"text": "Berlin", "label": "GPE"},
+            {"text": "1999", "label": "DATE"}
+        ])
+        self.assertEqual([ent.get('kb_id') for ent in entities], ["Q90", "Q167646", "Q312", None, None])
+        self.assertEqual(entities[0]['kb_url'], "https://www.wikidata.org/wiki/Q90")
+        self.assertNotIn('kb_id', entities[4])
+    
+    def test_rejects_other_files(self):
+        with self.assertRaises(ValueError):
+            AliasTable(os.path.join(os.path.dirname(self.path), 'kb.tsv'))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import time
+import unittest
+from ner_jobs import JobQueue, JobStore
+
+class FakeEngine:
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.calls = 0
+    
+    def process_tuples(self, pairs):
+        self.calls += 1
+        for text, context in pairs:
+            if text == self.fail_on:
+                raise RuntimeError("boom")
+            yield [{'text': text, 'label': 'ORG', 'start': 0, 'end': len(text)}], context
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'jobs.db')
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def test_run_processes_in_chunks_and_keeps_order(self):
+        engine = FakeEngine()
+        jobs = JobQueue(JobStore(self.path), lambda: engine, chunk_size=2)
+        job_id = jobs.store.create(["a", "b", "c", "d", "e"])
+        jobs.run(job_id)
+        
+        status = jobs.status(job_id)
+        self.assertEqual(status['status'], 'done')
+        self.assertEqual(status['processed'], 5)
+        self.assertEqual(status['progress'], 1.0)
+        self.assertEqual(engine.calls, 3)
+        results = jobs.results(job_id)
+        self.assertEqual([idx for idx, _ in results], [0, 1, 2, 3, 4])
+        self.assertEqual(results[2][1][0]['text'], "c")
+        self.assertEqual([idx for idx, _ in jobs.results(job_id, offset=3, limit=1)], [3])
+    
+    def test_background_worker(self):
+        jobs = JobQueue(JobStore(self.path), FakeEngine)
+        job_id = jobs.submit(["Apple", "Google"])
+        deadline = time.time() + 5
+        while jobs.status(job_id)['status'] != 'done' and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(jobs.status(job_id)['status'], 'done')
+        self.assertEqual(len(jobs.results(job_id)), 2)
+    
+    def test_failure_is_recorded(self):
+        jobs = JobQueue(JobStore(self.path), lambda: FakeEngine(fail_on="bad"), chunk_size=1)
+        job_id = jobs.store.create(["ok", "bad", "never"])
+        jobs.run(job_id)
+        
+        status = jobs.status(job_id)
+        self.assertEqual(status['status'], 'failed')
+        self.assertIn("boom", status['error'])
+        self.assertEqual(status['processed'], 1)
+    
+    def test_resume_after_restart(self):
+        store = JobStore(self.path)
+        job_id = store.create(["a", "b", "c"])
+        self.assertTrue(store.claim(job_id))
+        store.save_results(job_id, [(0, [])])
+        # Simulate the claiming process having died
+        store._connect().execute("UPDATE jobs SET owner = ? WHERE id = ?", (f'{os.uname().nodename}:999999999', job_id))
+        store._connect().commit()
+        
+        jobs = JobQueue(JobStore(self.path), FakeEngine)
+        self.assertEqual(jobs.store.resumable(), [job_id])
+        jobs.run(job_id)
+        self.assertEqual(jobs.status(job_id)['status'], 'done')
+        self.assertEqual(jobs.status(job_id)['processed'], 3)
+    
+    def test_claim_is_exclusive(self):
+        store = JobStore(self.path)
+        job_id = store.create(["a"])
+        self.assertTrue(store.claim(job_id))
+        self.assertFalse(JobStore(self.path).claim(job_id))
+        self.assertIsNone(store.get("missing"))
+
+if __name__ == '__main__':
+    unittest.main()
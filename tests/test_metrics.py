@@ -0,0 +1,55 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from ner_metrics import MetricsRegistry
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.metrics = MetricsRegistry()
+
+    def test_counter_and_gauge(self):
+        counter = self.metrics.counter('ner_test_total', 'Test counter')
+        gauge = self.metrics.gauge('ner_test_in_flight', 'Test gauge')
+        counter.inc(endpoint='/api/extract')
+        counter.inc(2, endpoint='/api/extract')
+        gauge.inc()
+        gauge.dec()
+        
+        output = self.metrics.render()
+        self.assertIn('# TYPE ner_test_total counter', output)
+        self.assertIn('ner_test_total{endpoint="/api/extract"} 3', output)
+        self.assertIn('ner_test_in_flight 0', output)
+
+    def test_histogram_buckets_are_cumulative(self):
+        histogram = self.metrics.histogram('ner_test_seconds', 'Test histogram', buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 5.0):
+            histogram.observe(value, stage='nlp')
+        
+        output = self.metrics.render()
+        self.assertIn('ner_test_seconds_bucket{stage="nlp",le="0.1"} 1', output)
+        self.assertIn('ner_test_seconds_bucket{stage="nlp",le="1.0"} 2', output)
+        self.assertIn('ner_test_seconds_bucket{stage="nlp",le="+Inf"} 3', output)
+        self.assertIn('ner_test_seconds_count{stage="nlp"} 3', output)
+
+    def test_shared_directory_merges_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            registries = [MetricsRegistry(directory), MetricsRegistry(directory)]
+            for registry, pid in zip(registries, [os.getppid(), os.getpid()]):
+                registry.counter('ner_test_total', 'Test counter').inc(2, endpoint='/api/extract')
+                registry.histogram('ner_test_seconds', 'Test histogram', buckets=(1.0,)).observe(0.5)
+                registry.gauge('ner_test_in_flight', 'Test gauge').set(1)
+                with mock.patch('os.getpid', return_value=pid):
+                    registry.publish()
+            
+            output = registries[1].render()
+            self.assertIn('ner_test_total{endpoint="/api/extract"} 4', output)
+            self.assertIn('ner_test_seconds_count 2', output)
+            self.assertIn(f'ner_test_in_flight{{pid="{os.getppid()}"}} 1', output)
+            self.assertIn(f'ner_test_in_flight{{pid="{os.getpid()}"}} 1', output)
+            
+            registries[1].remove_published()
+            self.assertEqual(os.listdir(directory), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,17 @@
+import os
+import re
+import tempfile
 import unittest
-from ner_core import AdvancedEntityExtractor
+from collections import Counter
+import spacy
+from spacy.language import Language
+from spacy.lookups import Lookups
+from spacy.tokens import Doc
+from doc_store import DocStore
+from ner_core import (AdvancedEntityExtractor, BatchEngine, CUSTOM_PATTERNS, DocCache, DocumentChunker,
+                      EntityAggregator, EntityCoverageCheck, EntityTable, IncrementalAnalyzer, MappedCorpus,
+                      ModelCascade, PatternMatcher, PipelineRegistry, Redactor, RelationExtractor,
+                      RulePipelines, utf8_byte_offsets)
 
 class TestNER(unittest.TestCase):
     def setUp(self):
@@ -7,7 +19,7 @@ class TestNER(unittest.TestCase):
             self.engine = AdvancedEntityExtractor()
         except Exception:
             self.engine = None
-
+    
     def test_processing(self):
         if not self.engine:
             self.skipTest("Spacy model not installed")
@@ -24,18 +36,570 @@ class TestNER(unittest.TestCase):
         
         self.assertIn("Google", texts)
         self.assertIn("ORG", labels)
-
+    
     def test_custom_patterns(self):
         """Test custom pattern extraction if available"""
         if not self.engine:
             self.skipTest("Engine not initialized")
-            
+        
         text = "Contact me at test@example.com"
         result = self.engine.extract_all(text)
         custom = result.get('custom_entities', {})
         
         self.assertIn('EMAIL', custom)
         self.assertIn('test@example.com', custom['EMAIL'])
+    
+    def test_parse_cache(self):
+        """Repeated analysis of one text parses it once"""
+        if not self.engine:
+            self.skipTest("Engine not initialized")
+        
+        text = "Google was founded by Larry Page in California."
+        self.engine.clear_cache()
+        before = self.engine.cache_stats()
+        self.engine.extract_entities(text)
+        self.engine.get_people(text)
+        self.engine.analyze_text(text)
+        stats = self.engine.cache_stats()
+        
+        self.assertEqual(stats['misses'] - before['misses'], 1)
+        self.assertEqual(stats['hits'] - before['hits'], 2)
+    
+    def test_rule_fast_path(self):
+        """rules=True returns the extract_entities schema without running the model"""
+        if not self.engine:
+            self.skipTest("Engine not initialized")
+        
+        self.engine.enable_rules().add_terms("ORG", ["Initech"])
+        entities = self.engine.extract_entities("Initech invoice, contact ap@initech.com", rules=True)
+        self.assertEqual([(e['text'], e['label']) for e in entities], [("Initech", "ORG"), ("ap@initech.com", "EMAIL")])
+        self.assertEqual(set(entities[0]), {'text', 'label', 'start', 'end', 'description'})
+        self.assertEqual(self.engine.batch_process(["Initech"], rules=True), [[{'text': "Initech", 'label': "ORG", 'start': 0, 'end': 7}]])
+    
+    def test_doc_store_reuses_parses(self):
+        """Stored parses are loaded by document id instead of re-running the model"""
+        if not self.engine:
+            self.skipTest("Engine not initialized")
+        
+        text = "Google was founded by Larry Page in California."
+        with tempfile.TemporaryDirectory() as tmp:
+            self.engine.open_doc_store(tmp)
+            self.assertEqual(self.engine.store_documents([("doc-1", text)]), 1)
+            self.assertEqual(self.engine.store_documents([("doc-1", text)]), 0)
+            
+            # The pipeline reports every component it runs; stored parses must not run any
+            runs = []
+            self.engine.pipelines.on_component = lambda name, seconds: runs.append(name)
+            try:
+                analysis = self.engine.analyze_text(None, doc_id="doc-1")
+                self.assertIn("Google", analysis['entities_by_type']['ORG'])
+                self.assertEqual(self.engine.get_entity_context(text, "Google", window=4, doc_id="doc-1"), ["Google was"])
+                self.assertIn("<mark", self.engine.visualize_entities(None, doc_id="doc-1"))
+                self.assertIsInstance(self.engine.extract_noun_phrases(text, doc_id="doc-1"), list)
+                self.assertEqual(runs, [])
+            finally:
+                self.engine.pipelines.on_component = None
+                self.engine.doc_store = None
+
+    def test_close_writes_buffered_parses(self):
+        """Parses stored by analyze_text are on disk after close()"""
+        if not self.engine:
+            self.skipTest("Engine not initialized")
+        
+        text = "Google was founded by Larry Page."
+        with tempfile.TemporaryDirectory() as tmp:
+            self.engine.open_doc_store(tmp)
+            self.engine.analyze_text(text, doc_id="doc-2")
+            self.engine.close()
+            self.assertIsNone(self.engine.doc_store)
+            
+            with DocStore(tmp, self.engine.nlp) as reopened:
+                self.assertEqual(reopened.get("doc-2", text).text, text)
+
+class TestDocCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = DocCache(maxsize=2)
+        cache.put("a", "doc-a")
+        cache.put("b", "doc-b")
+        self.assertEqual(cache.get("a"), "doc-a")
+        cache.put("c", "doc-c")
+        
+        # "b" was least recently used
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("c"), "doc-c")
+        stats = cache.stats()
+        self.assertEqual(stats['evictions'], 1)
+        self.assertEqual(stats['hits'], 2)
+        self.assertEqual(stats['misses'], 1)
+    
+    def test_disabled(self):
+        cache = DocCache(maxsize=0)
+        cache.put("a", "doc-a")
+        self.assertIsNone(cache.get("a"))
+    
+    def test_component_coverage(self):
+        """A parse made with fewer components does not satisfy a fuller request"""
+        cache = DocCache(maxsize=2)
+        cache.put("a", "ner-doc", frozenset({'ner'}))
+        self.assertEqual(cache.get("a", frozenset({'ner'})), "ner-doc")
+        self.assertIsNone(cache.get("a", frozenset({'ner', 'parser'})))
+
+class TestPipelineRegistry(unittest.TestCase):
+    def setUp(self):
+        self.nlp = spacy.blank("en")
+        self.nlp.add_pipe("sentencizer")
+        ruler = self.nlp.add_pipe("entity_ruler")
+        ruler.add_patterns([{"label": "ORG", "pattern": "Google"}])
+        self.pipelines = PipelineRegistry(self.nlp)
+    
+    def test_ner_task_skips_other_components(self):
+        self.assertEqual(self.pipelines.disabled('ner'), ['sentencizer'])
+        doc = self.pipelines("Google is here. It hires.", 'ner')
+        self.assertEqual([ent.text for ent in doc.ents], ["Google"])
+        self.assertFalse(doc.has_annotation("SENT_START"))
+    
+    def test_parse_task_keeps_sentences(self):
+        doc = self.pipelines("Google is here. It hires.", 'parse')
+        self.assertEqual(len(list(doc.sents)), 2)
+    
+    def test_component_timing_callback(self):
+        timings = []
+        pipelines = PipelineRegistry(self.nlp, on_component=lambda name, seconds: timings.append(name))
+        doc = pipelines("Google is here.", 'ner')
+        
+        self.assertEqual(timings, ['entity_ruler'])
+        self.assertEqual([ent.text for ent in doc.ents], ["Google"])
+    
+    def test_unknown_task(self):
+        with self.assertRaises(ValueError):
+            self.pipelines.disabled('translate')
+
+class TestPatternMatcher(unittest.TestCase):
+    def setUp(self):
+        self.matcher = PatternMatcher(CUSTOM_PATTERNS)
+    
+    def test_typed_matches_with_offsets(self):
+        text = "Mail test@example.com, SSN 123-45-6789 #launch"
+        matches = self.matcher.find_all(text)
+        
+        self.assertEqual([m['label'] for m in matches], ['EMAIL', 'SSN', 'HASHTAG'])
+        for m in matches:
+            self.assertEqual(text[m['start']:m['end']], m['text'])
+    
+    def test_group_lists_every_label(self):
+        grouped = self.matcher.group("nothing to see")
+        self.assertEqual(set(grouped), set(CUSTOM_PATTERNS))
+        self.assertFalse(any(grouped.values()))
+    
+    def test_group_keeps_overlapping_matches(self):
+        grouped = self.matcher.group("contact info@apple.com now")
+        self.assertEqual(grouped['EMAIL'], ['info@apple.com'])
+        self.assertEqual(grouped['MENTION'], ['@apple'])
+        
+        # Same as re.findall per pattern, which extract_custom_patterns has always returned
+        text = "Mail @jo at jo@x.io or https://x.io/?u=jo@x.io, call 555-123-4567 #now"
+        self.assertEqual(self.matcher.group(text),
+                         {label: re.findall(pattern, text) for label, pattern in CUSTOM_PATTERNS.items()})
+    
+    def test_add_pattern_at_runtime(self):
+        matcher = PatternMatcher(CUSTOM_PATTERNS, shard_size=4)
+        matcher.add('INVOICE', r'(?i)inv-\d+')
+        self.assertEqual(matcher.group("Paid inv-2041 today")['INVOICE'], ['inv-2041'])
+        self.assertEqual(len(matcher), len(CUSTOM_PATTERNS) + 1)
+    
+    def test_patterns_with_groups_keep_their_meaning(self):
+        matcher = PatternMatcher({'DUP': r'(\w)\1', **CUSTOM_PATTERNS})
+        matcher.add('ORDER', r'(?P<p1>ord)-(\d+)')
+        matcher.add('KEY', r'(?P<key>[a-z]+)=(?P=key)')
+        text = "Mail a@b.com about ord-77, x=x and moon"
+        
+        self.assertEqual(matcher.group(text)['DUP'], ['7', 'o'])
+        self.assertEqual(matcher.group(text)['ORDER'], [('ord', '77')])
+        self.assertEqual(matcher.group(text)['KEY'], ['x'])
+        self.assertEqual(matcher.group(text)['EMAIL'], ['a@b.com'])
+        matches = matcher.find_all(text)
+        self.assertEqual([(m['label'], m['text']) for m in matches],
+                         [('EMAIL', 'a@b.com'), ('ORDER', 'ord-77'), ('DUP', '77'), ('KEY', 'x=x'), ('DUP', 'oo')])
+
+class TestRedactor(unittest.TestCase):
+    def setUp(self):
+        self.redactor = Redactor()
+    
+    def test_merges_entities_and_patterns(self):
+        text = "Jane Doe wrote from jane@example.com about 123-45-6789."
+        entities = [(0, 8, 'PERSON')]
+        self.assertEqual(self.redactor.redact(text, entities),
+                         "[PERSON] wrote from [EMAIL] about [SSN].")
+    
+    def test_unrequested_patterns_do_not_hide_requested_ones(self):
+        text = "Reset link: https://acme.com/reset?user=jane.doe@example.com sent"
+        self.assertEqual(Redactor(PatternMatcher(CUSTOM_PATTERNS)).redact(text, []),
+                         "Reset link: https://acme.com/reset?user=[EMAIL] sent")
+    
+    def test_overlaps_keep_earliest_longest(self):
+        spans = [(0, 5, 'A'), (0, 10, 'B'), (8, 12, 'C'), (12, 14, 'D')]
+        self.assertEqual(Redactor.resolve_overlaps(spans), [(0, 10, 'B'), (12, 14, 'D')])
+    
+    def test_streamed_chunks_join_to_full_output(self):
+        text = "Jane Doe met John Roe. " * 50
+        entities = []
+        for i in range(50):
+            base = i * 23
+            entities += [(base, base + 8, 'PERSON'), (base + 13, base + 21, 'PERSON')]
+        chunks = list(self.redactor.iter_redact(text, entities, chunk_size=64))
+        
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), "[PERSON] met [PERSON]. " * 50)
+
+class TestDocumentChunker(unittest.TestCase):
+    def setUp(self):
+        nlp = spacy.blank("en")
+        ruler = nlp.add_pipe("entity_ruler")
+        ruler.add_patterns([
+            {"label": "ORG", "pattern": "Google"},
+            {"label": "PERSON", "pattern": [{"LOWER": "larry"}, {"LOWER": "page"}]}
+        ])
+        self.pipelines = PipelineRegistry(nlp)
+        self.text = " ".join(["Larry Page started Google.", "Nothing else happened.", "Then lunch."] * 40)
+    
+    def test_windows_cover_text_with_overlap(self):
+        chunker = DocumentChunker(max_chars=200, overlap=40)
+        windows = list(chunker.windows(self.text))
+        
+        self.assertGreater(len(windows), 1)
+        self.assertEqual(windows[0][0], 0)
+        self.assertEqual(windows[-1][1], len(self.text))
+        for (_, end, _, core_end), (start, _, core_start, _) in zip(windows, windows[1:]):
+            self.assertLess(start, end)
+            self.assertEqual(core_end, core_start)
+    
+    def test_chunked_entities_match_full_parse(self):
+        chunker = DocumentChunker(max_chars=200, overlap=40)
+        doc = self.pipelines(self.text, 'ner')
+        expected = [(ent.start_char, ent.end_char, ent.label_) for ent in doc.ents]
+        
+        self.assertEqual(chunker.entity_spans(self.pipelines, self.text), expected)
+    
+    def test_entities_across_chunk_ends_are_kept(self):
+        # Without sentence breaks the chunks end at a word, which can fall inside "Larry Page"
+        chunker = DocumentChunker(max_chars=60, overlap=11)
+        for padding in range(60):
+            text = "a " * padding + " ".join(["Larry Page met Google staff"] * 6)
+            expected = [(ent.start_char, ent.end_char, ent.label_) for ent in self.pipelines(text, 'ner').ents]
+            self.assertEqual(chunker.entity_spans(self.pipelines, text), expected, padding)
+    
+    def test_overlap_must_be_small(self):
+        with self.assertRaises(ValueError):
+            DocumentChunker(max_chars=100, overlap=50)
+
+class TestIncrementalAnalyzer(unittest.TestCase):
+    def setUp(self):
+        nlp = spacy.blank("en")
+        ruler = nlp.add_pipe("entity_ruler")
+        ruler.add_patterns([
+            {"label": "ORG", "pattern": "Google"},
+            {"label": "PERSON", "pattern": [{"LOWER": "larry"}, {"LOWER": "page"}]}
+        ])
+        self.pipelines = PipelineRegistry(nlp)
+        self.analyzer = IncrementalAnalyzer(self.pipelines, max_segment_chars=60)
+        self.text = "Larry Page started Google.\n\nNothing happened.\n\n" + "Google grew. " * 10
+    
+    def full_parse(self, text):
+        return [(ent.start_char, ent.end_char, ent.label_) for ent in self.pipelines(text, 'ner').ents]
+    
+    def spans(self, entities):
+        return [(ent['start'], ent['end'], ent['label']) for ent in entities]
+    
+    def test_segments_concatenate_to_text(self):
+        segments = self.analyzer.segments(self.text)
+        self.assertEqual("".join(segments), self.text)
+        self.assertTrue(all(len(segment) <= 60 for segment in segments))
+    
+    def test_only_changed_segments_are_reparsed(self):
+        _, _, info = self.analyzer.update("doc", text=self.text)
+        self.assertEqual(info['reparsed_segments'], info['segments'])
+        
+        edited = self.text.replace("Nothing happened.", "Larry Page left Google.")
+        text, entities, info = self.analyzer.update("doc", text=edited)
+        self.assertEqual(info['version'], 2)
+        self.assertEqual(info['reparsed_segments'], 1)
+        self.assertEqual(text, edited)
+        self.assertEqual(self.spans(entities), self.full_parse(edited))
+    
+    def test_edits_against_version(self):
+        self.analyzer.update("doc", text=self.text)
+        text, entities, _ = self.analyzer.update("doc", edits=[{"start": 0, "end": 10, "text": "Google"}], base_version=1)
+        self.assertTrue(text.startswith("Google started Google."))
+        self.assertEqual(self.spans(entities), self.full_parse(text))
+        
+        with self.assertRaises(KeyError):
+            self.analyzer.update("doc", edits=[], base_version=1)
+        with self.assertRaises(KeyError):
+            self.analyzer.update("unknown", edits=[])
+        with self.assertRaises(ValueError):
+            self.analyzer.update("doc", edits=[{"start": 10000}])
+    
+    def test_concurrent_update_wins_over_stale_edits(self):
+        self.analyzer.update("doc", text=self.text)
+        pipe = self.pipelines.pipe
+        
+        def pipe_with_concurrent_update(texts, **kwargs):
+            # Another request stores version 2 while this one is parsing
+            self.pipelines.pipe = pipe
+            self.analyzer.update("doc", text="Google.")
+            return pipe(texts, **kwargs)
+        
+        self.pipelines.pipe = pipe_with_concurrent_update
+        with self.assertRaises(KeyError):
+            self.analyzer.update("doc", edits=[{"start": 0, "end": 10, "text": "Google"}], base_version=1)
+        _, _, info = self.analyzer.update("doc", text="Google grew.")
+        self.assertEqual(info['version'], 3)
+
+class TestEntityAggregator(unittest.TestCase):
+    def setUp(self):
+        self.text = "Google hired Larry Page. Google moved to Paris. Paris loved Google."
+        self.spans = []
+        for name, label in [("Google", "ORG"), ("Larry Page", "PERSON"), ("Paris", "GPE")]:
+            start = self.text.find(name)
+            while start != -1:
+                self.spans.append((start, start + len(name), label))
+                start = self.text.find(name, start + 1)
+        self.spans.sort()
+    
+    def test_summary_matches_separate_passes(self):
+        summary = EntityAggregator().add_spans(self.text, self.spans).summary()
+        texts = [self.text[start:end] for start, end, _ in self.spans]
+        
+        self.assertEqual(summary['total_entities'], 6)
+        self.assertEqual(summary['entity_counts'], {'ORG': 3, 'PERSON': 1, 'GPE': 2})
+        self.assertEqual(summary['entities_by_type']['ORG'], ["Google"] * 3)
+        self.assertEqual(summary['most_common_entities'], Counter(texts).most_common(10))
+        self.assertEqual(summary['entity_types_found'], ['ORG', 'PERSON', 'GPE'])
+    
+    def test_unique_in_first_seen_order(self):
+        aggregator = EntityAggregator().add_entities([
+            {'text': 'Paris', 'label': 'GPE'}, {'text': 'Alps', 'label': 'LOC'},
+            {'text': 'Paris', 'label': 'GPE'}, {'text': 'Rome', 'label': 'GPE'}
+        ])
+        self.assertEqual(aggregator.unique('GPE'), ['Paris', 'Rome'])
+        self.assertEqual(aggregator.unique('GPE', 'LOC'), ['Paris', 'Alps', 'Rome'])
+        self.assertEqual(aggregator.unique('PERSON'), [])
+    
+    def test_merge_equals_single_aggregation(self):
+        half = len(self.spans) // 2
+        left = EntityAggregator().add_spans(self.text, self.spans[:half])
+        right = EntityAggregator().add_spans(self.text, self.spans[half:])
+        left += right
+        
+        whole = EntityAggregator().add_spans(self.text, self.spans)
+        self.assertEqual(left.summary(), whole.summary())
+        self.assertEqual(left.unique('GPE'), whole.unique('GPE'))
+        self.assertEqual(left.documents, 2)
+
+class TestMappedCorpus(unittest.TestCase):
+    def setUp(self):
+        nlp = spacy.blank("en")
+        ruler = nlp.add_pipe("entity_ruler")
+        ruler.add_patterns([{"label": "ORG", "pattern": "Google"}, {"label": "GPE", "pattern": "Zürich"}])
+        self.engine = BatchEngine(nlp, batch_size=2)
+        self.tmp = tempfile.TemporaryDirectory()
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def write(self, name, content):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(content)
+        return path
+    
+    def test_utf8_byte_offsets(self):
+        text = "Café in Zürich"
+        self.assertEqual(utf8_byte_offsets(text, [8, 0, 14]), [len("Café in ".encode()), 0, len(text.encode())])
+        self.assertEqual(utf8_byte_offsets("ascii", [1, 3]), [1, 3])
+    
+    def test_txt_entities_point_into_file(self):
+        path = self.write("corpus.txt", "Google in Zürich\r\n\nCafé near Google\nnothing")
+        corpus = MappedCorpus(path)
+        results = list(self.engine.process_corpus(corpus))
+        
+        self.assertEqual([r['index'] for r in results], [0, 1, 2])
+        entities = [ent for r in results for ent in r['entities']]
+        self.assertEqual([ent['text'] for ent in entities], ["Google", "Zürich", "Google"])
+        for ent in entities:
+            self.assertEqual(corpus.read(ent['byte_start'], ent['byte_end']).decode('utf-8'), ent['text'])
+    
+    def test_jsonl_records(self):
+        path = self.write("corpus.jsonl", '{"body": "Google"}\n\n{"body": "Z\\u00fcrich"}\n')
+        results = list(self.engine.process_corpus(MappedCorpus(path, text_field="body")))
+        self.assertEqual([[ent['text'] for ent in r['entities']] for r in results], [["Google"], ["Zürich"]])
+        self.assertEqual(results[1]['byte_start'], len('{"body": "Google"}\n\n'))
+
+class TestRelationExtractor(unittest.TestCase):
+    def setUp(self):
+        self.vocab = spacy.blank("en").vocab
+    
+    def test_conjoined_subjects_and_prepositional_objects(self):
+        doc = Doc(
+            self.vocab,
+            words=["Steve", "Jobs", "and", "Steve", "Wozniak", "founded", "Apple", "in", "California", "."],
+            heads=[1, 5, 1, 4, 1, 5, 5, 5, 7, 5],
+            deps=["compound", "nsubj", "cc", "compound", "conj", "ROOT", "dobj", "prep", "pobj", "punct"],
+            pos=["PROPN", "PROPN", "CCONJ", "PROPN", "PROPN", "VERB", "PROPN", "ADP", "PROPN", "PUNCT"],
+            ents=["B-PERSON", "I-PERSON", "O", "B-PERSON", "I-PERSON", "O", "B-ORG", "O", "B-GPE", "O"]
+        )
+        triples = [(t['subject']['text'], t['relation'], t['object']['text']) for t in RelationExtractor().relations(doc)]
+        self.assertEqual(triples, [
+            ("Steve Jobs", "founded", "Apple"), ("Steve Jobs", "founded in", "California"),
+            ("Steve Wozniak", "founded", "Apple"), ("Steve Wozniak", "founded in", "California")
+        ])
+    
+    def test_passive_and_negation_with_offsets(self):
+        doc = Doc(
+            self.vocab,
+            words=["Apple", "was", "not", "acquired", "by", "Google", "."],
+            heads=[3, 3, 3, 3, 3, 4, 3],
+            deps=["nsubjpass", "auxpass", "neg", "ROOT", "agent", "pobj", "punct"],
+            ents=["B-ORG", "O", "O", "O", "O", "B-ORG", "O"]
+        )
+        [triple] = RelationExtractor().relations(doc)
+        self.assertEqual(triple['subject'], {'text': "Google", 'label': "ORG", 'start': 26, 'end': 32})
+        self.assertEqual(triple['object']['start'], 0)
+        self.assertTrue(triple['negated'])
+        self.assertEqual(doc.text[triple['verb']['start']:triple['verb']['end']], "acquired")
+    
+    def test_unanchored_arguments(self):
+        doc = Doc(
+            self.vocab,
+            words=["Google", "bought", "a", "startup"],
+            heads=[1, 1, 3, 1],
+            deps=["nsubj", "ROOT", "det", "dobj"],
+            ents=["B-ORG", "O", "O", "O"]
+        )
+        self.assertEqual(RelationExtractor().relations(doc), [])
+        [triple] = RelationExtractor(require_entities=False).relations(doc)
+        self.assertEqual(triple['object'], {'text': "a startup", 'label': None, 'start': 14, 'end': 23})
+    
+    def test_parse_task_keeps_lemmas(self):
+        @Language.component("test_founded_parser")
+        def parser(doc):
+            for token, head, dep in zip(doc, [1, 1, 1], ["nsubj", "ROOT", "dobj"]):
+                token.head = doc[head]
+                token.dep_ = dep
+            return doc
+        
+        lookups = Lookups()
+        lookups.add_table("lemma_lookup", {"founded": "found"})
+        nlp = spacy.blank("en")
+        nlp.add_pipe("entity_ruler").add_patterns([
+            {"label": "ORG", "pattern": "Google"}, {"label": "ORG", "pattern": "YouTube"}
+        ])
+        nlp.add_pipe("test_founded_parser", name="parser")
+        nlp.add_pipe("lemmatizer", config={"mode": "lookup"}).initialize(lookups=lookups)
+        
+        extractor = RelationExtractor(pipelines=PipelineRegistry(nlp))
+        [triples] = list(extractor.process(["Google founded YouTube"]))
+        self.assertEqual([t['relation'] for t in triples], ["found"])
+
+class TestModelCascade(unittest.TestCase):
+    def setUp(self):
+        fast = spacy.blank("en")
+        fast.add_pipe("entity_ruler").add_patterns([{"label": "ORG", "pattern": "Google"}])
+        accurate = spacy.blank("en")
+        accurate.add_pipe("entity_ruler").add_patterns([
+            {"label": "ORG", "pattern": "Google"},
+            {"label": "PERSON", "pattern": [{"LOWER": "larry"}, {"LOWER": "page"}]}
+        ])
+        self.cascade = ModelCascade(PipelineRegistry(fast), PipelineRegistry(accurate))
+    
+    def test_coverage_check(self):
+        check = EntityCoverageCheck(max_uncovered=0.2)
+        nlp = self.cascade.fast.nlp
+        self.assertEqual(check.uncovered(nlp("The board met Google. Then it rained.")), (1, 0))
+        self.assertTrue(check(nlp("Nothing to see here.")))
+        self.assertFalse(check(nlp("Google hired Larry Page.")))
+    
+    def test_escalates_only_doubtful_texts(self):
+        texts = ["Google grew.", "Google hired Larry Page.", "It rained."]
+        docs = list(self.cascade.pipe(texts, task='ner', batch_size=2))
+        self.assertEqual([doc.user_data['model_tier'] for doc in docs], ["fast", "accurate", "fast"])
+        self.assertEqual([doc.text for doc in docs], texts)
+        self.assertIn("Larry Page", [ent.text for ent in docs[1].ents])
+        self.assertEqual(self.cascade.stats()['escalated'], 1)
+        
+        pairs = list(self.cascade.pipe([(text, i) for i, text in enumerate(texts)], task='ner', as_tuples=True))
+        self.assertEqual([i for _, i in pairs], [0, 1, 2])
+        self.assertEqual(self.cascade("Google spoke.", 'ner').user_data['model_tier'], "fast")
+        self.assertEqual(self.cascade("Google hired Larry Page.", 'ner').user_data['model_tier'], "accurate")
+    
+    def test_batch_engine_over_cascade(self):
+        engine = BatchEngine(self.cascade.nlp, pipelines=self.cascade)
+        results = list(engine.process(["Google hired Larry Page.", "Google grew."]))
+        self.assertEqual([ent['label'] for ent in results[0]], ["ORG", "PERSON"])
+        self.assertEqual(results[1][0]['text'], "Google")
+
+class TestRulePipelines(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.gazetteer = os.path.join(self.tmp.name, 'names.tsv')
+        with open(self.gazetteer, 'w', encoding='utf-8') as f:
+            f.write("# known names\nORG\tAcme Corp\nPERSON\tJane Doe\n")
+        self.rules = RulePipelines(self.gazetteer)
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def test_gazetteer_and_patterns(self):
+        doc = self.rules("Invoice from ACME corp to jane doe: billing@acme.com, 555-123-4567")
+        self.assertEqual([(ent.text, ent.label_) for ent in doc.ents], [
+            ("ACME corp", "ORG"), ("jane doe", "PERSON"), ("billing@acme.com", "EMAIL"), ("555-123-4567", "PHONE")
+        ])
+        self.assertEqual(self.rules.nlp.pipe_names, ["entity_ruler"])
+    
+    def write(self, name, content):
+        path = os.path.join(self.tmp.name, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return path
+    
+    def test_jsonl_gazetteer_and_version(self):
+        rules = RulePipelines(self.write('patterns.jsonl', '{"label": "GPE", "pattern": [{"LOWER": "paris"}]}\n'), patterns={})
+        before = rules.version
+        self.assertEqual([ent.label_ for ent in rules("Flights to Paris.").ents], ["GPE"])
+        rules.add_terms("ORG", ["Initech"])
+        self.assertNotEqual(rules.version, before)
+        with self.assertRaises(ValueError):
+            RulePipelines(self.write('bad.tsv', "ORG Acme\n"))
+    
+    def test_batch_engine_schema(self):
+        engine = BatchEngine(self.rules.nlp, pipelines=self.rules)
+        [entities] = engine.process(["Acme Corp: ops@acme.com"])
+        self.assertEqual(entities, [
+            {'text': "Acme Corp", 'label': "ORG", 'start': 0, 'end': 9},
+            {'text': "ops@acme.com", 'label': "EMAIL", 'start': 11, 'end': 23}
+        ])
+
+class TestEntityTable(unittest.TestCase):
+    def setUp(self):
+        nlp = spacy.blank("en")
+        ruler = nlp.add_pipe("entity_ruler")
+        ruler.add_patterns([{"label": "ORG", "pattern": "Google"}, {"label": "GPE", "pattern": "Paris"}])
+        self.table = EntityTable.from_docs(nlp.pipe(["Google and Google", "", "Paris"]))
+    
+    def test_interned_columns(self):
+        columns = self.table.to_columnar()
+        
+        self.assertEqual(columns['labels'], ['ORG', 'GPE'])
+        self.assertEqual(columns['texts'], ['Google', 'Paris'])
+        self.assertEqual(columns['text'], [0, 0, 1])
+        self.assertEqual(columns['start'], [0, 11, 0])
+        self.assertEqual(columns['doc_offsets'], [0, 2, 2, 3])
+    
+    def test_lazy_document_views(self):
+        self.assertEqual(self.table.num_docs, 3)
+        self.assertEqual(len(self.table.document(1)), 0)
+        self.assertEqual(self.table.document(2), [{'text': 'Paris', 'label': 'GPE', 'start': 0, 'end': 5}])
+        self.assertEqual(self.table.document(0)[-1]['start'], 11)
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,48 @@
+import os
+import tempfile
+import unittest
+from request_log import RequestLogger
+
+class TestRequestLogger(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.logger = RequestLogger(os.path.join(self.tmp.name, 'log.db'), batch_size=2, flush_interval=0.01)
+    
+    def tearDown(self):
+        self.tmp.cleanup()
+    
+    def test_batched_writes_and_stats(self):
+        self.logger.log(endpoint='/api/extract', status=200, latency_ms=10.0, num_texts=1, text_length=50,
+                        entity_count=3, cache='MISS', stages={'nlp': 8.0, 'serialize': 1.0})
+        self.logger.log(endpoint='/api/extract', status=200, latency_ms=2.0, num_texts=1, text_length=50,
+                        entity_count=3, cache='HIT')
+        self.logger.log(endpoint='/api/batch', status=400, latency_ms=1.0, num_texts=2, text_length=20,
+                        entity_count=0, stages={'nlp': 4.0})
+        self.logger.flush()
+        
+        stats = self.logger.stats()
+        extract = stats['endpoints']['/api/extract']
+        self.assertEqual(extract['requests'], 2)
+        self.assertEqual(extract['avg_latency_ms'], 6.0)
+        self.assertEqual(extract['entities'], 6)
+        self.assertEqual(extract['cache_hits'], 1)
+        self.assertEqual(extract['stages']['nlp']['avg_ms'], 8.0)
+        self.assertEqual(stats['endpoints']['/api/batch']['errors'], 1)
+        self.assertEqual(stats['logger']['written'], 3)
+    
+    def test_since_filters_old_records(self):
+        self.logger.log(endpoint='/api/extract', status=200, latency_ms=1.0, timestamp=100.0)
+        self.logger.flush()
+        self.assertEqual(self.logger.stats(since=200.0)['endpoints'], {})
+        self.assertIn('/api/extract', self.logger.stats()['endpoints'])
+    
+    def test_full_queue_drops_instead_of_blocking(self):
+        logger = RequestLogger(os.path.join(self.tmp.name, 'full.db'), max_queue=1)
+        # No writer thread, so nothing drains the queue
+        logger._ensure_writer = lambda: None
+        for _ in range(5):
+            logger.log(endpoint='/api/extract')
+        self.assertEqual(logger.dropped, 4)
+
+if __name__ == '__main__':
+    unittest.main()